@@ -8,6 +8,8 @@ from .factory_inventory_analysis_agent import FactoryInventoryAnalysisAgent # 
 from .social_inventory_analysis_agent import SocialInventoryAnalysisAgent   # 新增
 from .strategy_design_agent import StrategyDesignAgent
 from .orchestrator_agent import OrchestratorAgent
+from .scheduler import StageGraph, StageScheduler, ScheduleReport
+from .registry import AgentRegistry, agent_registry, get_orchestrator
 
 __all__ = [
     'BaseAgent',
@@ -18,5 +20,11 @@ __all__ = [
     'FactoryInventoryAnalysisAgent', # 新增
     'SocialInventoryAnalysisAgent',   # 新增
     'OrchestratorAgent',
-    'StrategyDesignAgent'
+    'StrategyDesignAgent',
+    'StageGraph',
+    'StageScheduler',
+    'ScheduleReport',
+    'AgentRegistry',
+    'agent_registry',
+    'get_orchestrator'
 ]
@@ -1,8 +1,10 @@
 # agents/base_agent.py
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from llm_clients.factory import LLMClientFactory
+from llm_clients.response_cache import ResponseCache, get_response_cache
 from config.manager import config_manager
+from utils.tracing import tracer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,6 +12,13 @@ logger = logging.getLogger(__name__)
 class BaseAgent(ABC):
     """所有Agent的基类，提供通用的LLM客户端管理功能"""
     
+    # Agent类型标识，用于选择响应缓存的TTL（见 settings.toml 的 [cache.ttl]）
+    agent_type: str = "default"
+    
+    # 使用的Prompt模板及格式化时传入的参数，服务启动时据此校验模板占位符
+    prompt_name: Optional[str] = None
+    prompt_args: tuple = ()
+    
     def __init__(self, llm_provider: Optional[str] = None):
         """
         初始化Agent
@@ -21,8 +30,9 @@ class BaseAgent(ABC):
         logger.info(f"初始化 Agent，使用LLM提供商: {self.llm_provider}")
         
         try:
-            self.llm_client = LLMClientFactory.create_client(self.llm_provider)
-            logger.info(f"成功为 Agent 创建LLM客户端: {self.llm_provider}")
+            # 同一提供商的所有Agent共享一个客户端实例
+            self.llm_client = LLMClientFactory.get_client(self.llm_provider, self.agent_type)
+            logger.info(f"成功为 Agent 获取LLM客户端: {self.llm_provider}")
         except Exception as e:
             logger.error(f"创建LLM客户端失败: {e}")
             raise
@@ -50,11 +60,74 @@ class BaseAgent(ABC):
         Returns:
             LLM的回复内容
         """
-        try:
-            return await self.llm_client.chat(messages, **kwargs)
-        except Exception as e:
-            logger.error(f"LLM对话时发生错误: {e}")
-            raise
+        with tracer.span("agent.chat", agent=self.agent_type, provider=self.llm_provider, stream=False) as span:
+            response_cache = get_response_cache()
+            cache_key = self._get_cache_key(response_cache, messages, **kwargs)
+            if cache_key is not None:
+                cached = await response_cache.get(cache_key)
+                span.set('cache_hit', cached is not None)
+                if cached is not None:
+                    logger.info(f"{self.agent_type} 命中LLM响应缓存")
+                    return cached
+            
+            try:
+                result = await self.llm_client.chat(messages, **kwargs)
+            except Exception as e:
+                logger.error(f"LLM对话时发生错误: {e}")
+                raise
+            
+            if cache_key is not None:
+                await response_cache.set(cache_key, result, response_cache.get_ttl(self.agent_type))
+            return result
+
+    async def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        使用LLM客户端进行流式对话，调用方可以在收到第一段文本时就开始处理
+        
+        命中响应缓存时一次性产出完整内容；流式输出完整结束后写入缓存。
+        
+        Args:
+            messages: 对话消息列表
+            **kwargs: 其他传递给LLM客户端的参数
+            
+        Yields:
+            增量回复文本片段
+        """
+        with tracer.span("agent.chat", agent=self.agent_type, provider=self.llm_provider, stream=True) as span:
+            response_cache = get_response_cache()
+            cache_key = self._get_cache_key(response_cache, messages, **kwargs)
+            if cache_key is not None:
+                cached = await response_cache.get(cache_key)
+                span.set('cache_hit', cached is not None)
+                if cached is not None:
+                    logger.info(f"{self.agent_type} 命中LLM响应缓存")
+                    yield cached
+                    return
+            
+            parts = []
+            try:
+                async for chunk in self.llm_client.chat_stream(messages, **kwargs):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                logger.error(f"LLM流式对话时发生错误: {e}")
+                raise
+            
+            if cache_key is not None:
+                await response_cache.set(cache_key, "".join(parts), response_cache.get_ttl(self.agent_type))
+
+    def _get_cache_key(self, response_cache: ResponseCache, messages: List[Dict[str, str]], **kwargs) -> Optional[str]:
+        """计算本次对话的响应缓存键，缓存未启用时返回 None"""
+        if not response_cache.enabled:
+            return None
+        return response_cache.make_key(
+            provider=self.llm_provider,
+            model=kwargs.get('model') or self.llm_client.model,
+            temperature=self.llm_client.temperature,
+            max_tokens=self.llm_client.max_tokens,
+            search_whitelist=kwargs.get('search_whitelist'),
+            messages=messages
+        )
 
     def _validate_commodity_name(self, commodity_name: str):
         """
@@ -1,6 +1,9 @@
 # agents/basis_analysis_agent.py
 from typing import List, Dict
+import asyncio
 from .base_agent import BaseAgent
+from analytics import timeseries_store
+from analytics.basis_features import compute_basis_features
 from utils.prompt_loader import prompt_loader
 import logging
 
@@ -9,6 +12,10 @@ logger = logging.getLogger(__name__)
 class BasisAnalysisAgent(BaseAgent):
     """基差分析Agent"""
     
+    agent_type = "basis"
+    prompt_name = "basis_analysis"
+    prompt_args = ("commodity_name", "content", "basis_features")
+    
     def __init__(self, llm_provider: str = None):
         super().__init__(llm_provider)
         logger.info(f"初始化基差分析Agent，使用LLM: {self.llm_provider}")
@@ -30,12 +37,14 @@ class BasisAnalysisAgent(BaseAgent):
         try:
             logger.info(f"开始基差分析，商品: {commodity_name}，内容长度: {len(content)}")
             
-            prompt = prompt_loader.format_prompt(
-                "basis_analysis", 
+            basis_features = await self._get_basis_features(commodity_name)
+            
+            messages = prompt_loader.build_messages(
+                self.prompt_name, 
                 commodity_name=commodity_name,
-                content=content
+                content=content,
+                basis_features=basis_features
             )
-            messages = [{"role": "user", "content": prompt}]
             
             result = await self.chat(messages)
             logger.info(f"{commodity_name} 基差分析完成")
@@ -44,3 +53,15 @@ class BasisAnalysisAgent(BaseAgent):
         except Exception as e:
             logger.error(f"{commodity_name} 基差分析失败: {e}")
             raise
+    
+    async def _get_basis_features(self, commodity_name: str) -> str:
+        """计算本地基差特征表，没有本地数据或计算失败时返回说明文字"""
+        try:
+            # memmap 读取可能触发磁盘IO，放到线程中执行
+            features = await asyncio.to_thread(compute_basis_features, timeseries_store, commodity_name)
+        except Exception as e:
+            logger.warning(f"{commodity_name} 基差特征计算失败: {e}")
+            features = None
+        if features is None:
+            return "无本地数据，请按数据要求自行检索。"
+        return features.to_table()
@@ -9,6 +9,10 @@ logger = logging.getLogger(__name__)
 class IndustryFundamentalsAgent(BaseAgent):
     """产业基本面分析Agent"""
     
+    agent_type = "industry"
+    prompt_name = "industry_fundamentals"
+    prompt_args = ("commodity_name", "content")
+    
     def __init__(self, llm_provider: str = None):
         super().__init__(llm_provider)
         logger.info(f"初始化产业基本面分析Agent，使用LLM: {self.llm_provider}")
@@ -30,12 +34,11 @@ class IndustryFundamentalsAgent(BaseAgent):
         try:
             logger.info(f"开始产业基本面分析，商品: {commodity_name}，内容长度: {len(content)}")
             
-            prompt = prompt_loader.format_prompt(
-                "industry_fundamentals", 
+            messages = prompt_loader.build_messages(
+                self.prompt_name, 
                 commodity_name=commodity_name,
                 content=content
             )
-            messages = [{"role": "user", "content": prompt}]
             
             result = await self.chat(messages)
             logger.info(f"{commodity_name} 产业基本面分析完成")
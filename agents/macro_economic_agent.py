@@ -8,6 +8,10 @@ logger = logging.getLogger(__name__)
 class MacroEconomicAgent(BaseAgent):
     """宏观经济分析Agent"""
     
+    agent_type = "macro"
+    prompt_name = "macro_economic"
+    prompt_args = ("commodity_name", "content")
+    
     def __init__(self, llm_provider: str = None):
         super().__init__(llm_provider)
         logger.info(f"初始化宏观经济分析Agent，使用LLM: {self.llm_provider}")
@@ -29,12 +33,11 @@ class MacroEconomicAgent(BaseAgent):
         try:
             logger.info(f"开始宏观经济分析，商品: {commodity_name}，内容长度: {len(content)}")
             
-            prompt = prompt_loader.format_prompt(
-                "macro_economic", 
+            messages = prompt_loader.build_messages(
+                self.prompt_name, 
                 commodity_name=commodity_name,
                 content=content
             )
-            messages = [{"role": "user", "content": prompt}]
             
             result = await self.chat(messages)
             logger.info(f"{commodity_name} 宏观经济分析完成")
@@ -1,5 +1,5 @@
 # agents/orchestrator_agent.py
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, AsyncIterator, Tuple, Callable, Awaitable
 from .base_agent import BaseAgent
 from .basis_analysis_agent import BasisAnalysisAgent
 from .macro_economic_agent import MacroEconomicAgent
@@ -8,16 +8,32 @@ from .price_analysis_agent import PriceAnalysisAgent
 from .factory_inventory_analysis_agent import FactoryInventoryAnalysisAgent # 新增
 from .social_inventory_analysis_agent import SocialInventoryAnalysisAgent   # 新增
 from .strategy_design_agent import StrategyDesignAgent
+from .scheduler import StageGraph, StageScheduler, ScheduleReport
+from config.manager import config_manager
+from utils.context_compressor import compress_sections
+from utils.deadline import DeadlineExceeded
 from utils.prompt_loader import prompt_loader
+from utils.tracing import tracer
 import asyncio
+from contextlib import aclosing
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+# 自定义阶段函数：(依赖阶段结果, 待分析内容, 商品名称) -> 阶段结果
+CustomStageFunc = Callable[[Dict[str, str], str, str], Awaitable[str]]
+
 class OrchestratorAgent(BaseAgent):
     """主控Agent，协调所有分析Agent"""
     
+    agent_type = "orchestrator"
+    prompt_name = "orchestrator"
+    prompt_args = (
+        "commodity_name", "basis_analysis", "macro_economic", "industry_fundamentals",
+        "price_analysis", "factory_inventory", "social_inventory", "strategy_design",
+    )
+    
     def __init__(self, llm_provider: str = None):
         super().__init__(llm_provider)
         logger.info(f"初始化主控Agent，使用LLM: {self.llm_provider}")
@@ -30,6 +46,10 @@ class OrchestratorAgent(BaseAgent):
         self.factory_agent = FactoryInventoryAnalysisAgent(llm_provider) 
         self.social_agent = SocialInventoryAnalysisAgent(llm_provider)   
         self.strategy_agent = StrategyDesignAgent(llm_provider)
+        
+        # 通过 register_stage 追加的自定义阶段：{名称: (阶段函数, 依赖列表)}
+        self._custom_stages: Dict[str, Tuple[CustomStageFunc, List[str]]] = {}
+        self.scheduler = StageScheduler()
     
     async def analyze(self, content: str, commodity_name: str, **kwargs) -> str:
         """
@@ -68,91 +88,219 @@ class OrchestratorAgent(BaseAgent):
         Returns:
             包含所有分析结果的字典
         """
+        collected = {}
+        async for name, result in self.comprehensive_analysis_stream(content, commodity_name, analysis_types):
+            collected[name] = result
+        
+        # 按固定顺序返回，避免输出顺序随完成先后变化
+        return {name: collected[name] for name in self.get_result_order() if name in collected}
+    
+    async def comprehensive_analysis_stream(
+        self,
+        content: str,
+        commodity_name: str,
+        analysis_types: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        执行综合分析，并按完成顺序逐个产出结果
+        
+        流水线由 build_stage_graph 构建的依赖图驱动：各维度分析并发执行，
+        综合分析与策略设计都只依赖各维度分析结果，因此二者同时进行。
+        调用方提前停止迭代时，未完成的阶段会被取消。
+        
+        Args:
+            content: 待分析的内容
+            commodity_name: 商品名称，如"豆粕"、"铜"
+            analysis_types: 要执行的分析类型列表，默认执行所有分析
+            
+        Yields:
+            (分析类型, 分析结果) 元组
+        """
         # 验证商品名称
         self._validate_commodity_name(commodity_name)
         
         # 默认执行所有分析
         if analysis_types is None:
-            analysis_types = ['basis', 'macro', 'industry', 'price', 'factory', 'social', 'strategy_design']
+            analysis_types = self.get_supported_analysis_types()
         
         logger.info(f"开始 {commodity_name} 综合分析，执行类型: {', '.join(analysis_types)}")
         
-        # 构建分析任务
-        tasks = []
-        task_names = []
+        graph = self.build_stage_graph(content, commodity_name, analysis_types)
+        report = ScheduleReport()
+        with tracer.span("orchestrator.analysis", commodity=commodity_name, analysis_types=list(analysis_types)) as span:
+            # 调用方提前停止迭代时立即关闭调度，等待被取消的阶段退出
+            async with aclosing(self.scheduler.run_iter(graph, report)) as stages:
+                async for name, result in stages:
+                    if isinstance(result, BaseException):
+                        logger.error(f"{commodity_name} {name}阶段失败: {result}")
+                        result = f"{name}阶段失败: {str(result)}"
+                    yield name, result
+            span.set('critical_path', report.critical_path())
         
-        if 'basis' in analysis_types:
-            tasks.append(self.basis_agent.analyze(content, commodity_name))
-            task_names.append('basis')
+        logger.info(f"{commodity_name} 综合分析关键路径: {report.summary()}")
+    
+    def build_stage_graph(
+        self,
+        content: str,
+        commodity_name: str,
+        analysis_types: List[str]
+    ) -> StageGraph:
+        """
+        构建综合分析的阶段依赖图
         
-        if 'macro' in analysis_types:
-            tasks.append(self.macro_agent.analyze(content, commodity_name))
-            task_names.append('macro')
+        - 各维度分析（basis/macro/...）：无依赖
+        - comprehensive：依赖全部已选维度分析
+        - strategy_design：依赖全部已选维度分析（与综合分析并行）
+        - register_stage 注册的自定义阶段：按注册时声明的依赖
         
-        if 'industry' in analysis_types:
-            tasks.append(self.industry_agent.analyze(content, commodity_name))
-            task_names.append('industry')
+        综合分析与策略设计的输入先经过上下文压缩（去重、按 [compression] 预算抽取关键结论）。
+        各阶段的时间预算来自 [timeouts.stages]；各维度分析还需在请求截止时间前
+        预留 synthesis_reserve 秒（最多占剩余时间的 synthesis_reserve_ratio），
+        保证综合分析与策略设计能基于已完成的部分结果运行，截止时间较短时各维度分析仍有时间执行。
         
-        if 'price' in analysis_types:
-            tasks.append(self.price_agent.analyze(content, commodity_name))
-            task_names.append('price')
+        Args:
+            content: 待分析的内容
+            commodity_name: 商品名称
+            analysis_types: 要执行的分析类型列表
+            
+        Returns:
+            阶段依赖图
+        """
+        graph = StageGraph()
+        agent_map = self._get_agent_map()
+        synthesis_reserve = config_manager.get('timeouts', 'synthesis_reserve', 0.0)
+        synthesis_reserve_ratio = config_manager.get('timeouts', 'synthesis_reserve_ratio', 0.5)
         
-        if 'factory' in analysis_types:
-            tasks.append(self.factory_agent.analyze(content, commodity_name))
-            task_names.append('factory')
+        analysis_names = [
+            name for name in agent_map
+            if name != 'strategy_design' and name in analysis_types
+        ]
+        for name in analysis_names:
+            graph.add_stage(
+                name,
+                self._make_analysis_stage(name, agent_map[name], content, commodity_name),
+                budget=self._get_stage_budget(name),
+                reserve=synthesis_reserve,
+                reserve_ratio=synthesis_reserve_ratio
+            )
         
-        if 'social' in analysis_types:
-            tasks.append(self.social_agent.analyze(content, commodity_name))
-            task_names.append('social')
+        async def comprehensive_stage(inputs: Dict[str, str]) -> str:
+            try:
+                inputs = compress_sections(self._mark_missing_results(inputs))
+                result = await self._generate_comprehensive_analysis(inputs, commodity_name)
+                logger.info(f"{commodity_name} 综合分析生成完成")
+                return result
+            except Exception as e:
+                logger.error(f"{commodity_name} 综合分析生成失败: {e}")
+                return f"综合分析生成失败: {str(e)}"
         
-        # if 'strategy_design' in analysis_types:
-        #     tasks.append(self.strategy_agent.analyze(commodity_name, content, market_analysis_report=analysis_results))
-        #     task_names.append('strategy_design')
+        async def strategy_stage(inputs: Dict[str, str]) -> str:
+            try:
+                inputs = compress_sections(self._mark_missing_results(inputs))
+                # 将各维度（压缩后）的分析报告作为输入
+                full_report = "\n\n".join(
+                    [f"===== {key.upper()} ANALYSIS =====\n{value}" for key, value in inputs.items()]
+                )
+                result = await self.strategy_agent.analyze(
+                    content=full_report, 
+                    commodity_name=commodity_name, 
+                    market_analysis_report=full_report
+                )
+                logger.info(f"{commodity_name} 结构化策略设计完成")
+                return result
+            except Exception as e:
+                logger.error(f"{commodity_name} 策略设计失败: {e}")
+                return f"策略设计失败: {str(e)}"
         
-        # 并行执行分析
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        graph.add_stage('comprehensive', comprehensive_stage, analysis_names,
+                        budget=self._get_stage_budget('comprehensive'))
+        graph.add_stage('strategy_design', strategy_stage, analysis_names,
+                        budget=self._get_stage_budget('strategy_design'))
         
-        # 处理结果
-        analysis_results = {}
-        for i, (name, result) in enumerate(zip(task_names, results)):
-            if isinstance(result, Exception):
-                logger.error(f"{commodity_name} {name}分析失败: {result}")
-                analysis_results[name] = f"分析失败: {str(result)}"
-            else:
-                analysis_results[name] = result
-                logger.info(f"{commodity_name} {name}分析完成")
+        for name, (func, deps) in self._custom_stages.items():
+            graph.add_stage(name, self._make_custom_stage(func, content, commodity_name), deps,
+                            budget=self._get_stage_budget(name))
         
-        # 生成综合分析
-        try:
-            comprehensive_result = await self._generate_comprehensive_analysis(
-                analysis_results, commodity_name
-            )
-            analysis_results['comprehensive'] = comprehensive_result
-            logger.info(f"{commodity_name} 综合分析生成完成")
-        except Exception as e:
-            logger.error(f"{commodity_name} 综合分析生成失败: {e}")
-            analysis_results['comprehensive'] = f"综合分析生成失败: {str(e)}"
+        return graph
+    
+    @staticmethod
+    def _get_stage_budget(name: str) -> Optional[float]:
+        """读取阶段的时间预算：[timeouts.stages] 中的同名项，缺省时使用其 default 项"""
+        budgets = config_manager.get('timeouts', 'stages', {}) or {}
+        return budgets.get(name, budgets.get('default'))
+    
+    @staticmethod
+    def _mark_missing_results(inputs: Dict[str, object]) -> Dict[str, str]:
+        """
+        将未完成（超时、被取消或异常）的依赖结果替换为缺失说明，其余结果原样保留
         
+        Args:
+            inputs: 调度器传入的依赖阶段结果，未完成的阶段为异常对象
+            
+        Returns:
+            全部为文本的结果字典
+        """
+        marked = {}
+        for name, result in inputs.items():
+            if isinstance(result, BaseException):
+                logger.warning(f"{name} 分析未完成，综合时标记为缺失: {result}")
+                result = f"【缺失】{name} 分析未完成（{type(result).__name__}: {result}），请勿据此维度下结论。"
+            marked[name] = result
+        return marked
+    
+    def register_stage(self, name: str, func: CustomStageFunc, deps: Optional[List[str]] = None):
+        """
+        注册自定义分析阶段，之后的每次综合分析都会按依赖关系调度它
+        
+        Args:
+            name: 阶段名称，不能与内置阶段重名
+            func: 异步阶段函数，参数为 (依赖阶段结果, 待分析内容, 商品名称)
+            deps: 依赖的阶段名称，如 ['basis', 'price'] 或 ['comprehensive']
+            
+        Raises:
+            ValueError: 阶段名称与已有阶段重复
+        """
+        if name in self.get_result_order() or name in self._custom_stages:
+            raise ValueError(f"阶段名称重复: {name}")
+        self._custom_stages[name] = (func, list(deps or []))
+    
+    def _make_analysis_stage(self, name: str, agent: BaseAgent, content: str, commodity_name: str):
+        """将单个维度的分析包装为阶段函数"""
+        async def stage(inputs: Dict[str, str]) -> str:
+            _, result = await self._run_analysis(name, agent, content, commodity_name)
+            return result
+        return stage
+    
+    def _make_custom_stage(self, func: CustomStageFunc, content: str, commodity_name: str):
+        """将自定义阶段函数适配为调度器的阶段函数"""
+        async def stage(inputs: Dict[str, str]) -> str:
+            return await func(inputs, content, commodity_name)
+        return stage
+    
+    async def _run_analysis(
+        self,
+        name: str,
+        agent: BaseAgent,
+        content: str,
+        commodity_name: str
+    ) -> Tuple[str, str]:
+        """
+        执行单个维度的分析，失败时返回错误说明而不是抛出异常
+        
+        超过截止时间的 DeadlineExceeded 会继续抛出，由综合分析标记为缺失项。
+        
+        Returns:
+            (分析类型, 分析结果或错误说明)
+        """
         try:
-            strategy_designer = StrategyDesignAgent(self.llm_provider)
-            # 将完整的分析报告作为输入
-            full_report = "\n\n".join(
-                [f"===== {key.upper()} ANALYSIS =====\n{value}" for key, value in analysis_results.items()]
-            )
-            # 修正调用：提供所有必需的参数
-            strategy_result = await strategy_designer.analyze(
-                content=full_report, 
-                commodity_name=commodity_name, 
-                market_analysis_report=full_report
-            )
-            analysis_results['strategy_design'] = strategy_result
-            logger.info(f"{commodity_name} 结构化策略设计完成")
+            result = await agent.analyze(content, commodity_name)
+            logger.info(f"{commodity_name} {name}分析完成")
+            return name, result
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            logger.error(f"{commodity_name} 策略设计失败: {e}")
-            analysis_results['strategy_design'] = f"策略设计失败: {str(e)}"
-        # ==================================================
-
-        return analysis_results
+            logger.error(f"{commodity_name} {name}分析失败: {e}")
+            return name, f"分析失败: {str(e)}"
     
     async def _generate_comprehensive_analysis(
         self, 
@@ -169,8 +317,8 @@ class OrchestratorAgent(BaseAgent):
         Returns:
             综合分析报告
         """
-        orchestrator_prompt = prompt_loader.format_prompt(
-            "orchestrator",
+        messages = prompt_loader.build_messages(
+            self.prompt_name,
             commodity_name=commodity_name,
             basis_analysis=analysis_results.get('basis', '未执行基差分析'),
             macro_economic=analysis_results.get('macro', '未执行宏观经济分析'),
@@ -180,8 +328,6 @@ class OrchestratorAgent(BaseAgent):
             social_inventory=analysis_results.get('social', '未执行社会库存分析'),
             strategy_design=analysis_results.get('strategy_design', '未执行策略设计')
         )
-        
-        messages = [{"role": "user", "content": orchestrator_prompt}]
         return await self.chat(messages)
     
     async def single_analysis(self, analysis_type: str, content: str, commodity_name: str) -> str:
@@ -196,7 +342,17 @@ class OrchestratorAgent(BaseAgent):
         Returns:
             分析结果
         """
-        agent_map = {
+        agent_map = self._get_agent_map()
+        
+        if analysis_type not in agent_map:
+            raise ValueError(f"不支持的分析类型: {analysis_type}")
+        
+        agent = agent_map[analysis_type]
+        return await agent.analyze(content, commodity_name)
+    
+    def _get_agent_map(self) -> Dict[str, BaseAgent]:
+        """分析类型到Agent的映射"""
+        return {
             'basis': self.basis_agent,
             'macro': self.macro_agent,
             'industry': self.industry_agent,
@@ -205,13 +361,19 @@ class OrchestratorAgent(BaseAgent):
             'social': self.social_agent,
             'strategy_design': self.strategy_agent,
         }
-        
-        if analysis_type not in agent_map:
-            raise ValueError(f"不支持的分析类型: {analysis_type}")
-        
-        agent = agent_map[analysis_type]
-        return await agent.analyze(content, commodity_name)
     
     def get_supported_analysis_types(self) -> List[str]:
         """获取支持的分析类型列表"""
         return ['basis', 'macro', 'industry', 'price', 'factory', 'social', 'strategy_design']
+    
+    def get_stage_names(self, analysis_types: List[str]) -> List[str]:
+        """获取一次综合分析将要执行的全部阶段名称"""
+        return [
+            name for name in self.get_result_order()
+            if name not in self.get_supported_analysis_types() or name in analysis_types or name == 'strategy_design'
+        ]
+    
+    def get_result_order(self) -> List[str]:
+        """综合分析结果的输出顺序：各维度分析、综合分析、策略设计、自定义阶段"""
+        builtin = ['basis', 'macro', 'industry', 'price', 'factory', 'social', 'comprehensive', 'strategy_design']
+        return builtin + list(self._custom_stages)
@@ -0,0 +1,107 @@
+# agents/registry.py
+from typing import Dict, List, Optional, Tuple
+from .base_agent import BaseAgent
+from .orchestrator_agent import OrchestratorAgent
+from llm_clients.factory import LLMClientFactory
+from config.manager import config_manager
+from utils.prompt_loader import prompt_loader
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AgentRegistry:
+    """
+    进程级Agent注册表
+
+    按LLM提供商缓存 OrchestratorAgent（连同其子Agent与共享的LLM客户端），
+    供并发的MCP工具调用复用。Agent本身不保存请求级状态，可安全地被并发调用；
+    仅当 config_manager.reload() 使该提供商的配置发生变化时才重建。
+    """
+
+    def __init__(self):
+        # {provider: (配置指纹, OrchestratorAgent)}
+        self._orchestrators: Dict[str, Tuple[str, OrchestratorAgent]] = {}
+        self._lock = threading.Lock()
+
+    def get_orchestrator(self, llm_provider: Optional[str] = None) -> OrchestratorAgent:
+        """
+        获取指定提供商的共享 OrchestratorAgent
+
+        Args:
+            llm_provider: LLM提供商，不提供时使用 [agents] default_llm
+
+        Returns:
+            共享的 OrchestratorAgent 实例
+        """
+        provider = llm_provider or config_manager.get('agents', 'default_llm', 'zhipu')
+        fingerprint = LLMClientFactory.get_config_fingerprint(provider)
+
+        entry = self._orchestrators.get(provider)
+        if entry and entry[0] == fingerprint:
+            return entry[1]
+
+        with self._lock:
+            entry = self._orchestrators.get(provider)
+            if entry and entry[0] == fingerprint:
+                return entry[1]
+
+            if entry:
+                logger.info(f"检测到提供商 {provider} 的配置变化，重建Agent")
+            else:
+                logger.info(f"为提供商 {provider} 构建共享Agent")
+            orchestrator = OrchestratorAgent(llm_provider=provider)
+            self._orchestrators[provider] = (fingerprint, orchestrator)
+            return orchestrator
+
+    def warm_up(self, providers: Optional[List[str]] = None):
+        """
+        预先构建Agent，通常在服务启动时调用
+
+        Args:
+            providers: 要预构建的提供商列表，默认只构建 [agents] default_llm
+        """
+        providers = providers or [config_manager.get('agents', 'default_llm', 'zhipu')]
+        for provider in providers:
+            try:
+                self.get_orchestrator(provider)
+            except Exception as e:
+                # 预热失败不影响启动，首次调用时会再次尝试并返回错误
+                logger.error(f"预构建提供商 {provider} 的Agent失败: {e}")
+
+    def validate_prompts(self):
+        """
+        校验所有Agent使用的Prompt模板，通常在服务启动时调用
+
+        向 prompt_loader 声明各Agent的 prompt_name 与 prompt_args，此后重载时
+        使用了未提供参数的模板不会被替换上线。
+
+        Raises:
+            ValueError: 模板不存在或使用了Agent未提供的占位符
+        """
+        pending = list(BaseAgent.__subclasses__())
+        while pending:
+            agent_class = pending.pop()
+            pending.extend(agent_class.__subclasses__())
+            if agent_class.prompt_name:
+                prompt_loader.require(agent_class.prompt_name, agent_class.prompt_args)
+
+        problems = prompt_loader.validate()
+        if problems:
+            raise ValueError("Prompt模板校验失败:\n" + "\n".join(problems))
+        logger.info("Prompt模板校验通过")
+
+    def clear(self):
+        """清空所有缓存的Agent"""
+        with self._lock:
+            self._orchestrators.clear()
+
+
+# 创建全局Agent注册表实例
+agent_registry = AgentRegistry()
+
+
+# 便捷函数
+def get_orchestrator(llm_provider: Optional[str] = None) -> OrchestratorAgent:
+    """便捷函数：获取共享的 OrchestratorAgent"""
+    return agent_registry.get_orchestrator(llm_provider)
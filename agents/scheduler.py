@@ -0,0 +1,264 @@
+# agents/scheduler.py
+"""
+分析阶段调度器
+以有向无环图描述分析流水线：节点是阶段（通常对应一个Agent），边是输入依赖。
+每个阶段在其全部依赖完成后立即启动，相互独立的阶段并发执行，并在结束后给出关键路径。
+阶段可设置时间预算，超出预算或请求截止时间（见 utils.deadline）时被取消。
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+from utils.deadline import DeadlineExceeded, deadline_scope, remaining
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 阶段函数：接收依赖阶段的结果 {依赖名: 结果}，返回本阶段结果
+StageFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class Stage:
+    """流水线中的一个阶段"""
+    name: str
+    func: StageFunc
+    deps: Tuple[str, ...] = ()
+    budget: Optional[float] = None     # 时间预算（秒），None 表示只受请求截止时间约束
+    reserve: float = 0.0               # 需在请求截止时间前预留给后续阶段的秒数
+    reserve_ratio: float = 0.5         # 预留最多占剩余时间的比例，避免截止时间较短时预留吃掉全部时间
+
+    def get_timeout(self) -> Optional[float]:
+        """
+        本阶段实际可用的时间：预算与（截止时间 - 预留）中较小者
+
+        预留取 reserve 与 reserve_ratio × 剩余时间 中较小者，
+        例如截止时间 60s、reserve 90s、比例 0.5 时，本阶段可用 30s。
+        """
+        left = remaining()
+        if left is not None and self.reserve > 0:
+            left -= min(self.reserve, left * self.reserve_ratio)
+        if self.budget is None:
+            return left
+        return self.budget if left is None else min(self.budget, left)
+
+
+@dataclass
+class StageRecord:
+    """单个阶段的执行记录（时间为事件循环时钟，单位秒）"""
+    name: str
+    deps: Tuple[str, ...] = ()
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class StageGraph:
+    """阶段依赖图"""
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+
+    def add_stage(
+        self,
+        name: str,
+        func: StageFunc,
+        deps: Optional[List[str]] = None,
+        budget: Optional[float] = None,
+        reserve: float = 0.0,
+        reserve_ratio: float = 0.5
+    ) -> "StageGraph":
+        """
+        添加阶段
+
+        Args:
+            name: 阶段名称，在图中唯一
+            func: 阶段函数，参数为依赖阶段结果组成的字典
+            deps: 依赖的阶段名称列表
+            budget: 时间预算（秒），为空或不大于 0 表示不单独限制
+            reserve: 需在请求截止时间前预留给后续阶段的秒数
+            reserve_ratio: 预留最多占剩余时间的比例
+
+        Returns:
+            图本身，便于链式调用
+
+        Raises:
+            ValueError: 阶段名称重复
+        """
+        if name in self.stages:
+            raise ValueError(f"阶段名称重复: {name}")
+        self.stages[name] = Stage(
+            name=name,
+            func=func,
+            deps=tuple(deps or ()),
+            budget=budget if budget and budget > 0 else None,
+            reserve=reserve,
+            reserve_ratio=reserve_ratio
+        )
+        return self
+
+    def topological_order(self) -> List[str]:
+        """
+        校验依赖图并返回一个拓扑序
+
+        Raises:
+            ValueError: 存在未定义的依赖或循环依赖
+        """
+        for stage in self.stages.values():
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"阶段 {stage.name} 依赖未定义的阶段: {', '.join(missing)}")
+
+        remaining = {name: set(stage.deps) for name, stage in self.stages.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"阶段之间存在循环依赖: {', '.join(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+
+class ScheduleReport:
+    """一次调度的执行报告"""
+
+    def __init__(self):
+        self.records: Dict[str, StageRecord] = {}
+
+    def critical_path(self) -> List[str]:
+        """
+        计算实际执行的关键路径
+
+        从最后完成的阶段出发，沿“最后完成的依赖”向前回溯，
+        得到决定整体耗时的阶段链。
+
+        Returns:
+            按执行先后排列的阶段名称列表
+        """
+        finished = [r for r in self.records.values() if r.finished_at is not None]
+        if not finished:
+            return []
+
+        path = []
+        current = max(finished, key=lambda r: r.finished_at)
+        while current is not None:
+            path.append(current.name)
+            dep_records = [
+                self.records[dep] for dep in current.deps
+                if dep in self.records and self.records[dep].finished_at is not None
+            ]
+            current = max(dep_records, key=lambda r: r.finished_at) if dep_records else None
+        return list(reversed(path))
+
+    def summary(self) -> str:
+        """生成关键路径摘要，如 "macro(12.3s) -> strategy_design(8.1s)，总计 20.4s" """
+        path = self.critical_path()
+        if not path:
+            return "无已完成阶段"
+        first = self.records[path[0]]
+        last = self.records[path[-1]]
+        total = (last.finished_at or 0.0) - (first.started_at or 0.0)
+        stages = " -> ".join(f"{name}({self.records[name].duration:.1f}s)" for name in path)
+        return f"{stages}，总计 {total:.1f}s"
+
+
+class StageScheduler:
+    """按依赖关系调度阶段，每个阶段在依赖就绪后立即启动"""
+
+    @staticmethod
+    async def _run_stage(stage: Stage, inputs: Dict[str, Any]) -> Any:
+        """
+        在时间预算内执行阶段，预算同时作为阶段内所有请求的截止时间
+
+        Raises:
+            DeadlineExceeded: 阶段超出时间预算或请求截止时间
+        """
+        timeout = stage.get_timeout()
+        with deadline_scope(timeout), tracer.span(f"stage.{stage.name}", stage=stage.name, budget=timeout):
+            try:
+                async with asyncio.timeout(timeout) as scope:
+                    return await stage.func(inputs)
+            except TimeoutError:
+                if scope.expired():
+                    raise DeadlineExceeded(f"阶段 {stage.name} 未在 {timeout:.1f}s 内完成") from None
+                raise
+
+    async def run_iter(
+        self,
+        graph: StageGraph,
+        report: Optional[ScheduleReport] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        执行依赖图，按完成顺序产出每个阶段的结果
+
+        阶段抛出的异常不会中断调度，而是作为该阶段的结果产出并传递给依赖它的阶段；
+        超时的阶段以 DeadlineExceeded 作为结果。调用方提前停止迭代时，仍在运行的阶段会被取消。
+
+        Args:
+            graph: 阶段依赖图
+            report: 可选，用于记录每个阶段的起止时间
+
+        Yields:
+            (阶段名称, 阶段结果或异常)
+        """
+        graph.topological_order()
+        report = report if report is not None else ScheduleReport()
+        loop = asyncio.get_running_loop()
+
+        waiting = {name: set(stage.deps) for name, stage in graph.stages.items()}
+        results: Dict[str, Any] = {}
+        running: Dict[asyncio.Future, str] = {}
+
+        def start_ready_stages():
+            for name in [n for n, deps in waiting.items() if not deps]:
+                del waiting[name]
+                stage = graph.stages[name]
+                inputs = {dep: results[dep] for dep in stage.deps}
+                report.records[name] = StageRecord(name=name, deps=stage.deps, started_at=loop.time())
+                running[asyncio.ensure_future(self._run_stage(stage, inputs))] = name
+
+        start_ready_stages()
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                completed = []
+                for task in done:
+                    name = running.pop(task)
+                    record = report.records[name]
+                    record.finished_at = loop.time()
+                    if task.cancelled():
+                        result = asyncio.CancelledError(f"阶段 {name} 被取消")
+                    elif task.exception() is not None:
+                        result = task.exception()
+                    else:
+                        result = task.result()
+                    if isinstance(result, BaseException):
+                        record.error = f"{type(result).__name__}: {result}"
+                    results[name] = result
+                    completed.append((record.finished_at, name))
+                    for deps in waiting.values():
+                        deps.discard(name)
+
+                # 先启动新就绪的阶段，再把结果交给调用方
+                start_ready_stages()
+                for _, name in sorted(completed):
+                    yield name, results[name]
+        finally:
+            # 调用方提前停止迭代或截止时间到达时取消仍在运行的阶段，并等待其退出，
+            # 确保阶段内的LLM调用与限流槽位在生成器结束前已经释放
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
@@ -1,4 +1,8 @@
+import asyncio
 from .base_agent import BaseAgent
+from analytics import timeseries_store
+from analytics.inventory_features import describe_inventory
+from data_service import get_social_inventory_data, format_data_block, SOCIAL_INVENTORY
 from utils.prompt_loader import prompt_loader
 import logging
 
@@ -7,6 +11,10 @@ logger = logging.getLogger(__name__)
 class SocialInventoryAnalysisAgent(BaseAgent):
     """社会库存分析Agent"""
     
+    agent_type = "social"
+    prompt_name = "social_inventory_analysis"
+    prompt_args = ("commodity_name", "analysis_time", "social_inventory_data", "inventory_features")
+    
     def __init__(self, llm_provider: str = None):
         super().__init__(llm_provider)
         logger.info(f"初始化社会库存分析Agent，使用LLM: {self.llm_provider}")
@@ -20,18 +28,48 @@ class SocialInventoryAnalysisAgent(BaseAgent):
             
             logger.info(f"开始社会库存分析，商品: {commodity_name}")
             
-            prompt = prompt_loader.format_prompt(
-                "social_inventory_analysis", 
+            # 优先使用数据服务的结构化数据，有数据时不再联网搜索
+            inventory_data = content
+            search_whitelist = ["财经网站", "行业资讯网", "期货公司报告"]
+            data = await self._get_structured_data(commodity_name)
+            if data:
+                inventory_data = format_data_block(data, content)
+                search_whitelist = None
+            inventory_features = await self._get_inventory_features(commodity_name, data)
+            
+            messages = prompt_loader.build_messages(
+                self.prompt_name, 
                 commodity_name=commodity_name,
                 analysis_time=analysis_time,
-                social_inventory_data=content
+                social_inventory_data=inventory_data,
+                inventory_features=inventory_features
             )
-            messages = [{"role": "user", "content": prompt}]
             
-            result = await self.chat(messages, search_whitelist=["财经网站", "行业资讯网", "期货公司报告"]) # 允许搜索
+            result = await self.chat(messages, search_whitelist=search_whitelist)
             logger.info(f"{commodity_name} 社会库存分析完成")
             
             return result
         except Exception as e:
             logger.error(f"{commodity_name} 社会库存分析失败: {e}")
             raise
+    
+    async def _get_structured_data(self, commodity_name: str):
+        """从数据服务获取社会库存数据，获取失败或没有数据时返回 None"""
+        try:
+            return await get_social_inventory_data(commodity_name)
+        except Exception as e:
+            logger.warning(f"{commodity_name} 社会库存数据获取失败，改为联网搜索: {e}")
+            return None
+    
+    async def _get_inventory_features(self, commodity_name: str, data) -> str:
+        """计算本地社会库存特征（周度变化、季节性、可用天数、分项结构），没有数据时返回说明文字"""
+        snapshot = data.get('main_warehouses') if data else None
+        try:
+            # memmap 读取可能触发磁盘IO，放到线程中执行
+            text = await asyncio.to_thread(
+                describe_inventory, timeseries_store, SOCIAL_INVENTORY, commodity_name, snapshot
+            )
+        except Exception as e:
+            logger.warning(f"{commodity_name} 社会库存特征计算失败: {e}")
+            text = None
+        return text or "无本地数据"
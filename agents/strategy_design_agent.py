@@ -8,6 +8,10 @@ logger = logging.getLogger(__name__)
 class StrategyDesignAgent(BaseAgent):
     """策略设计Agent，专门生成结构化的期权策略"""
     
+    agent_type = "strategy_design"
+    prompt_name = "strategy_design"
+    prompt_args = ("commodity_name", "design_time", "market_analysis_report")
+    
     def __init__(self, llm_provider: str = None):
         super().__init__(llm_provider)
         logger.info(f"初始化策略设计Agent，使用LLM: {self.llm_provider}")
@@ -33,13 +37,12 @@ class StrategyDesignAgent(BaseAgent):
             
             market_analysis_report = content
 
-            prompt = prompt_loader.format_prompt(
-                "strategy_design", 
+            messages = prompt_loader.build_messages(
+                self.prompt_name, 
                 commodity_name=commodity_name,
                 design_time=design_time,
                 market_analysis_report=market_analysis_report
             )
-            messages = [{"role": "user", "content": prompt}]
             
             # 策略设计需要精确，可以关闭搜索，或只允许搜索金融术语
             result = await self.chat(messages, search_whitelist=["期权术语", "金融百科"])
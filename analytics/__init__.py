@@ -0,0 +1,25 @@
+# analytics/__init__.py
+"""
+行情与库存数据分析
+本地时间序列存储，以及基于 NumPy 的向量化特征计算
+"""
+
+from .timeseries_store import TimeSeriesStore, to_day, to_days
+from .basis_features import BasisFeatureEngine, BasisFeatures, compute_basis_features
+from .inventory_features import InventoryFeatureEngine, InventoryFeatures, describe_inventory
+
+# 创建全局时间序列存储实例
+timeseries_store = TimeSeriesStore.from_config()
+
+__all__ = [
+    'BasisFeatureEngine',
+    'BasisFeatures',
+    'compute_basis_features',
+    'InventoryFeatureEngine',
+    'InventoryFeatures',
+    'describe_inventory',
+    'TimeSeriesStore',
+    'timeseries_store',
+    'to_day',
+    'to_days',
+]
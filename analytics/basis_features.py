@@ -0,0 +1,258 @@
+# analytics/basis_features.py
+"""
+基差与价差特征
+从时间序列存储中读取现货价格与某商品全部期货合约的收盘价，
+对齐为 合约 × 日期 矩阵后一次性向量化计算：
+- 各合约基差（现货 - 期货）、基差率、最新基差在历史中的分位数、N日变化
+- 相邻合约的跨期价差及其历史分位数
+- 近月连续基差的季节性Z值（与往年同月比较）
+结果可格式化为紧凑的表格，直接放入基差分析的Prompt
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config.manager import config_manager
+from .timeseries_store import TimeSeriesStore
+
+logger = logging.getLogger(__name__)
+
+# 现货价格所在的合约名与字段名，以及期货合约的价格字段
+SPOT_CONTRACT = "spot"
+SPOT_FIELD = "price"
+FUTURES_FIELD = "close"
+
+
+@dataclass
+class ContractBasis:
+    """单个合约的基差特征"""
+    contract: str
+    futures_price: float
+    basis: float
+    basis_rate: float
+    percentile: float                 # 最新基差在回看区间内的分位数（0-100）
+    change: Optional[float]           # 最近 N 个交易日的基差变化
+
+
+@dataclass
+class CalendarSpread:
+    """相邻合约的跨期价差（近月 - 远月）"""
+    near: str
+    far: str
+    spread: float
+    percentile: float
+
+
+@dataclass
+class BasisFeatures:
+    """一个商品的基差特征汇总"""
+    commodity: str
+    as_of: str
+    spot_price: float
+    contracts: List[ContractBasis] = field(default_factory=list)
+    spreads: List[CalendarSpread] = field(default_factory=list)
+    nearby_basis: Optional[float] = None
+    seasonal_zscore: Optional[float] = None
+    seasonal_years: int = 0
+    change_window: int = 20
+
+    def to_table(self) -> str:
+        """格式化为紧凑的Markdown表格"""
+        lines = [
+            f"数据截至 {self.as_of}，现货价 {self.spot_price:.2f}（基差 = 现货 - 期货）",
+            "",
+            f"| 合约 | 期货价 | 基差 | 基差率 | 历史分位 | {self.change_window}日变化 |",
+            "|---|---|---|---|---|---|",
+        ]
+        for item in self.contracts:
+            change = "-" if item.change is None else f"{item.change:+.2f}"
+            lines.append(
+                f"| {item.contract} | {item.futures_price:.2f} | {item.basis:+.2f} | "
+                f"{item.basis_rate:+.2%} | {item.percentile:.0f}% | {change} |"
+            )
+        if self.spreads:
+            lines += ["", "| 跨期价差 | 最新 | 历史分位 |", "|---|---|---|"]
+            for spread in self.spreads:
+                lines.append(f"| {spread.near}-{spread.far} | {spread.spread:+.2f} | {spread.percentile:.0f}% |")
+        if self.nearby_basis is not None:
+            seasonal = (
+                f"，季节性Z值 {self.seasonal_zscore:+.2f}（对比往年同月，{self.seasonal_years} 年样本）"
+                if self.seasonal_zscore is not None else "，同月历史样本不足，无季节性Z值"
+            )
+            lines += ["", f"近月连续基差 {self.nearby_basis:+.2f}{seasonal}"]
+        return "\n".join(lines)
+
+
+def _percentile_of_last(matrix: np.ndarray) -> np.ndarray:
+    """每行最新有效值在该行全部有效值中的分位数（0-100），行内无有效值时为 NaN"""
+    valid = ~np.isnan(matrix)
+    # 每行最后一个有效值
+    last_index = matrix.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    last = matrix[np.arange(matrix.shape[0]), last_index]
+    with np.errstate(invalid='ignore'):
+        below = np.sum(valid & (matrix <= last[:, None]), axis=1)
+        counts = valid.sum(axis=1)
+        return np.where(counts > 0, below / np.maximum(counts, 1) * 100.0, np.nan)
+
+
+class BasisFeatureEngine:
+    """基差特征计算引擎"""
+
+    def __init__(self, store: TimeSeriesStore, lookback_years: float = 5, change_window: int = 20):
+        """
+        Args:
+            store: 时间序列存储
+            lookback_years: 计算分位数与季节性的回看年数
+            change_window: 基差变化的交易日窗口
+        """
+        self.store = store
+        self.lookback_years = lookback_years
+        self.change_window = change_window
+
+    @classmethod
+    def from_config(cls, store: TimeSeriesStore) -> "BasisFeatureEngine":
+        """根据 settings.toml 的 [features] 节创建引擎"""
+        options = config_manager.get('features', default={})
+        return cls(
+            store=store,
+            lookback_years=options.get('lookback_years', 5),
+            change_window=options.get('change_window', 20),
+        )
+
+    def load_matrix(
+        self,
+        commodity: str,
+        contracts: List[str],
+        field_name: str,
+        axis: np.ndarray
+    ) -> np.ndarray:
+        """
+        将多个合约的序列对齐到同一日期轴
+
+        Args:
+            commodity: 商品名称
+            contracts: 合约列表
+            field_name: 字段名称
+            axis: 日期轴（datetime64[D]，升序）
+
+        Returns:
+            合约 × 日期 的矩阵，缺失处为 NaN
+        """
+        matrix = np.full((len(contracts), len(axis)), np.nan)
+        if len(axis) == 0:
+            return matrix
+        for row, contract in enumerate(contracts):
+            dates, values = self.store.read(commodity, contract, field_name, axis[0], axis[-1])
+            positions = np.searchsorted(axis, dates)
+            inside = positions < len(axis)
+            matched = inside.copy()
+            matched[inside] = axis[positions[inside]] == dates[inside]
+            matrix[row, positions[matched]] = values[matched]
+        return matrix
+
+    def compute(self, commodity: str) -> Optional[BasisFeatures]:
+        """
+        计算商品的基差特征
+
+        Args:
+            commodity: 商品名称
+
+        Returns:
+            基差特征，缺少现货或期货数据时为 None
+        """
+        latest_dates, _ = self.store.latest(commodity, SPOT_CONTRACT, SPOT_FIELD, 1)
+        if len(latest_dates) == 0:
+            return None
+        start = latest_dates[-1] - np.timedelta64(int(self.lookback_years * 365.25), 'D')
+        axis, spot = self.store.read(commodity, SPOT_CONTRACT, SPOT_FIELD, start=start)
+        axis = np.asarray(axis)
+        spot = np.asarray(spot, dtype=np.float64)
+
+        # 合约代码中的年月使字典序与到期顺序一致（如 M2505 < M2509 < M2601）
+        contracts = sorted(c for c in self.store.list_contracts(commodity) if c != SPOT_CONTRACT)
+        if not contracts:
+            return None
+        futures = self.load_matrix(commodity, contracts, FUTURES_FIELD, axis)
+
+        # 以现货与期货都有报价的最后一个交易日为基准（现货往往先于期货更新，
+        # 直接取现货最新日期会导致所有合约都被视为已到期）
+        complete = ~np.isnan(spot) & (~np.isnan(futures)).any(axis=0)
+        if not complete.any():
+            return None
+        end = int(np.flatnonzero(complete)[-1]) + 1
+        axis, spot, futures = axis[:end], spot[:end], futures[:, :end]
+
+        basis = spot[None, :] - futures
+        with np.errstate(divide='ignore', invalid='ignore'):
+            basis_rate = basis / futures
+
+        # 只保留在最新交易日仍有报价的合约（未到期合约）
+        active = ~np.isnan(futures[:, -1])
+        if not active.any():
+            return None
+        percentiles = _percentile_of_last(basis)
+
+        # 最近 N 个交易日的基差变化
+        window = self.change_window
+        change = np.full(len(contracts), np.nan)
+        if len(axis) > window:
+            change = basis[:, -1] - basis[:, -1 - window]
+
+        features = BasisFeatures(
+            commodity=commodity,
+            as_of=str(axis[-1]),
+            spot_price=float(spot[-1]),
+            change_window=window,
+        )
+        for row in np.flatnonzero(active):
+            features.contracts.append(ContractBasis(
+                contract=contracts[row],
+                futures_price=float(futures[row, -1]),
+                basis=float(basis[row, -1]),
+                basis_rate=float(basis_rate[row, -1]),
+                percentile=float(percentiles[row]),
+                change=None if np.isnan(change[row]) else float(change[row]),
+            ))
+
+        # 相邻未到期合约的跨期价差
+        active_rows = np.flatnonzero(active)
+        if len(active_rows) > 1:
+            spreads = futures[active_rows[:-1]] - futures[active_rows[1:]]
+            spread_percentiles = _percentile_of_last(spreads)
+            for i, (near, far) in enumerate(zip(active_rows[:-1], active_rows[1:])):
+                features.spreads.append(CalendarSpread(
+                    near=contracts[near],
+                    far=contracts[far],
+                    spread=float(spreads[i, -1]),
+                    percentile=float(spread_percentiles[i]),
+                ))
+
+        # 近月连续基差：每个交易日取第一个有报价的合约
+        has_quote = ~np.isnan(futures)
+        quoted_days = has_quote.any(axis=0)
+        nearby_row = np.argmax(has_quote, axis=0)
+        nearby = np.where(quoted_days, basis[nearby_row, np.arange(len(axis))], np.nan)
+        features.nearby_basis = float(nearby[-1])
+        features.seasonal_zscore, features.seasonal_years = self._seasonal_zscore(axis, nearby)
+        return features
+
+    @staticmethod
+    def _seasonal_zscore(axis: np.ndarray, series: np.ndarray) -> Tuple[Optional[float], int]:
+        """最新值相对往年同月数值的Z值，返回 (Z值, 参与比较的年数)"""
+        months = axis.astype('datetime64[M]').astype(np.int64)
+        month_of_year = months % 12
+        year = months // 12
+        same_month = (month_of_year == month_of_year[-1]) & (year < year[-1]) & ~np.isnan(series)
+        history = series[same_month]
+        years = len(np.unique(year[same_month]))
+        if years < 2 or history.std() == 0:
+            return None, years
+        return float((series[-1] - history.mean()) / history.std()), years
+
+
+def compute_basis_features(store: TimeSeriesStore, commodity: str) -> Optional[BasisFeatures]:
+    """使用当前配置计算商品的基差特征（便捷函数）"""
+    return BasisFeatureEngine.from_config(store).compute(commodity)
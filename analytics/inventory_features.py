@@ -0,0 +1,351 @@
+# analytics/inventory_features.py
+"""
+库存特征
+从时间序列存储中读取库存周度数据（合约名为数据集名称，如 "social_inventory"），
+多个商品对齐为 商品 × 周 矩阵后一次性向量化计算：
+- 最新库存、周度变化、4周变化
+- 季节性：与往年同期（前后若干周）比较的均值、Z值与分位数
+- 可用天数：库存 / 日均消费量（需要 daily_consumption 字段）
+- 分项结构：仓库/工厂等分项的占比、周度变化与集中度
+
+存储约定（均在 {商品}/{数据集}/ 下）：
+- total：总库存
+- daily_consumption：日均消费量（可选，与库存同单位）
+- 其余字段视为分项（如仓库、港口、工厂名称）
+"""
+
+import logging
+import warnings
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config.manager import config_manager
+from .timeseries_store import TimeSeriesStore
+
+logger = logging.getLogger(__name__)
+
+TOTAL_FIELD = "total"
+CONSUMPTION_FIELD = "daily_consumption"
+
+# 1970-01-01 为周四，加 3 天后按 7 天取整得到以周一为起点的周序号
+_WEEK_OFFSET = 3
+WEEKS_PER_YEAR = 52
+
+
+@dataclass
+class ComponentShare:
+    """库存分项（仓库、港口、工厂等）"""
+    name: str
+    value: float
+    share: float
+    weekly_change: Optional[float] = None
+
+
+@dataclass
+class InventoryFeatures:
+    """一个商品某个库存数据集的特征汇总"""
+    commodity: str
+    dataset: str
+    as_of: str
+    latest: float
+    weekly_change: Optional[float] = None
+    weekly_change_pct: Optional[float] = None
+    change_4w: Optional[float] = None
+    seasonal_mean: Optional[float] = None
+    seasonal_zscore: Optional[float] = None
+    seasonal_percentile: Optional[float] = None
+    seasonal_years: int = 0
+    days_of_cover: Optional[float] = None
+    components: List[ComponentShare] = field(default_factory=list)
+
+    def to_table(self) -> str:
+        """格式化为紧凑的Markdown表格"""
+        rows = [("最新库存", f"{self.latest:,.2f}")]
+        if self.weekly_change is not None:
+            pct = f"（{self.weekly_change_pct:+.2%}）" if self.weekly_change_pct is not None else ""
+            rows.append(("周度变化", f"{self.weekly_change:+,.2f}{pct}"))
+        if self.change_4w is not None:
+            rows.append(("4周变化", f"{self.change_4w:+,.2f}"))
+        if self.seasonal_mean is not None:
+            rows.append(("往年同期均值", f"{self.seasonal_mean:,.2f}（{self.seasonal_years} 年样本）"))
+        if self.seasonal_zscore is not None:
+            rows.append(("季节性Z值", f"{self.seasonal_zscore:+.2f}"))
+        if self.seasonal_percentile is not None:
+            rows.append(("同期分位", f"{self.seasonal_percentile:.0f}%"))
+        if self.days_of_cover is not None:
+            rows.append(("可用天数", f"{self.days_of_cover:.1f} 天"))
+
+        lines = [f"数据截至 {self.as_of}", "", "| 指标 | 数值 |", "|---|---|"]
+        lines += [f"| {name} | {value} |" for name, value in rows]
+        if self.components:
+            lines += ["", format_components(self.components)]
+        return "\n".join(lines)
+
+
+def summarize_components(values: Dict[str, Any]) -> List[ComponentShare]:
+    """
+    根据分项快照（如数据服务返回的 main_warehouses）计算占比
+
+    Args:
+        values: {分项名称: 数值}，非数值项会被忽略
+
+    Returns:
+        按数值降序排列的分项列表
+    """
+    numeric = {
+        name: float(value) for name, value in values.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+    if not numeric:
+        return []
+    names = list(numeric)
+    amounts = np.fromiter(numeric.values(), dtype=np.float64, count=len(numeric))
+    total = amounts.sum()
+    shares = amounts / total if total else np.zeros_like(amounts)
+    order = np.argsort(-amounts, kind='stable')
+    return [ComponentShare(names[i], float(amounts[i]), float(shares[i])) for i in order]
+
+
+def format_components(components: List[ComponentShare], top: int = 3) -> str:
+    """将分项格式化为表格，并附前几名的集中度"""
+    lines = ["| 分项 | 库存 | 占比 | 周度变化 |", "|---|---|---|---|"]
+    for item in components:
+        change = "-" if item.weekly_change is None else f"{item.weekly_change:+,.2f}"
+        lines.append(f"| {item.name} | {item.value:,.2f} | {item.share:.1%} | {change} |")
+    if len(components) > top:
+        lines.append(f"前{top}名集中度 {sum(item.share for item in components[:top]):.1%}")
+    return "\n".join(lines)
+
+
+def _week_index(dates: np.ndarray) -> np.ndarray:
+    """datetime64[D] 日期 -> 周序号"""
+    return (dates.astype(np.int64) + _WEEK_OFFSET) // 7
+
+
+def _week_start(weeks: np.ndarray) -> np.ndarray:
+    """周序号 -> 该周周一的日期"""
+    return (weeks * 7 - _WEEK_OFFSET).astype('datetime64[D]')
+
+
+def _last_valid_index(matrix: np.ndarray) -> np.ndarray:
+    """每行最后一个有效值的列下标（整行无效时为 -1）"""
+    valid = ~np.isnan(matrix)
+    index = matrix.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return np.where(valid.any(axis=1), index, -1)
+
+
+def _take(matrix: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """按行取指定列，下标越界处为 NaN"""
+    inside = (index >= 0) & (index < matrix.shape[1])
+    out = np.full(matrix.shape[0], np.nan)
+    rows = np.flatnonzero(inside)
+    out[rows] = matrix[rows, index[rows]]
+    return out
+
+
+class InventoryFeatureEngine:
+    """库存特征计算引擎"""
+
+    def __init__(self, store: TimeSeriesStore, lookback_years: float = 5, seasonal_window_weeks: int = 2):
+        """
+        Args:
+            store: 时间序列存储
+            lookback_years: 季节性比较的回看年数
+            seasonal_window_weeks: 往年同期的范围（前后各若干周）
+        """
+        self.store = store
+        self.lookback_years = lookback_years
+        self.seasonal_window_weeks = seasonal_window_weeks
+
+    @classmethod
+    def from_config(cls, store: TimeSeriesStore) -> "InventoryFeatureEngine":
+        """根据 settings.toml 的 [features] 节创建引擎"""
+        options = config_manager.get('features', default={})
+        return cls(
+            store=store,
+            lookback_years=options.get('lookback_years', 5),
+            seasonal_window_weeks=options.get('seasonal_window_weeks', 2),
+        )
+
+    def load_weekly(
+        self,
+        series: List[Tuple[str, str, str]],
+        first_week: int,
+        last_week: int
+    ) -> np.ndarray:
+        """
+        将多条序列按周对齐（同一周有多个数据点时取最后一个）
+
+        Args:
+            series: [(商品, 数据集, 字段)]
+            first_week: 起始周序号
+            last_week: 结束周序号（含）
+
+        Returns:
+            序列 × 周 的矩阵，缺失处为 NaN
+        """
+        matrix = np.full((len(series), last_week - first_week + 1), np.nan)
+        start = _week_start(np.array([first_week]))[0]
+        for row, (commodity, dataset, field_name) in enumerate(series):
+            dates, values = self.store.read(commodity, dataset, field_name, start=start)
+            if len(dates) == 0:
+                continue
+            weeks = _week_index(dates)
+            last_in_week = np.append(weeks[1:] != weeks[:-1], True)
+            weeks, values = weeks[last_in_week], values[last_in_week]
+            keep = weeks <= last_week
+            matrix[row, weeks[keep] - first_week] = values[keep]
+        return matrix
+
+    def compute_many(self, dataset: str, commodities: List[str]) -> Dict[str, Optional[InventoryFeatures]]:
+        """
+        批量计算多个商品的库存特征
+
+        Args:
+            dataset: 数据集名称，如 "social_inventory"
+            commodities: 商品名称列表
+
+        Returns:
+            {商品名称: 库存特征}，没有总库存数据的商品为 None
+        """
+        results: Dict[str, Optional[InventoryFeatures]] = {name: None for name in commodities}
+        # 以各商品最新数据的最晚一周为对齐终点
+        latest_weeks = []
+        for commodity in commodities:
+            dates, _ = self.store.latest(commodity, dataset, TOTAL_FIELD, 1)
+            latest_weeks.append(int(_week_index(dates)[-1]) if len(dates) else None)
+        available = [i for i, week in enumerate(latest_weeks) if week is not None]
+        if not available:
+            return results
+
+        names = [commodities[i] for i in available]
+        last_week = max(latest_weeks[i] for i in available)
+        first_week = last_week - int(self.lookback_years * WEEKS_PER_YEAR) - self.seasonal_window_weeks
+        total = self.load_weekly([(name, dataset, TOTAL_FIELD) for name in names], first_week, last_week)
+        consumption = self.load_weekly([(name, dataset, CONSUMPTION_FIELD) for name in names], first_week, last_week)
+
+        rows = np.arange(len(names))
+        latest_index = _last_valid_index(total)
+        latest = total[rows, latest_index]
+        previous = _take(total, latest_index - 1)
+        weekly_change = latest - previous
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weekly_change_pct = weekly_change / previous
+        change_4w = latest - _take(total, latest_index - 4)
+
+        # 往年同期：周次相差不超过窗口（跨年循环比较）且年份更早
+        weeks = np.arange(first_week, last_week + 1)
+        week_dates = _week_start(weeks)
+        years = week_dates.astype('datetime64[Y]').astype(np.int64)
+        week_of_year = (week_dates - week_dates.astype('datetime64[Y]')).astype(np.int64) // 7
+        distance = np.abs(week_of_year[None, :] - week_of_year[latest_index][:, None])
+        distance = np.minimum(distance, WEEKS_PER_YEAR - distance)
+        same_period = (
+            (distance <= self.seasonal_window_weeks)
+            & (years[None, :] < years[latest_index][:, None])
+            & ~np.isnan(total)
+        )
+        history = np.where(same_period, total, np.nan)
+        counts = same_period.sum(axis=1)
+        # 每行参与比较的不同年份数
+        year_ids = years - years.min()
+        present = np.zeros((len(names), int(year_ids.max()) + 1), dtype=bool)
+        hit_rows, hit_cols = np.nonzero(same_period)
+        present[hit_rows, year_ids[hit_cols]] = True
+        history_years = present.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            # 没有往年同期数据的行会触发 "Mean of empty slice" 警告，结果为 NaN 即可
+            warnings.simplefilter('ignore', RuntimeWarning)
+            seasonal_mean = np.nanmean(history, axis=1)
+            seasonal_std = np.nanstd(history, axis=1)
+            zscore = (latest - seasonal_mean) / seasonal_std
+            percentile = np.sum(same_period & (total <= latest[:, None]), axis=1) / counts * 100.0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            days_of_cover = latest / _take(consumption, _last_valid_index(consumption))
+
+        def _value(array: np.ndarray, row: int) -> Optional[float]:
+            value = array[row]
+            return None if not np.isfinite(value) else float(value)
+
+        for row, name in enumerate(names):
+            has_history = history_years[row] >= 2
+            results[name] = InventoryFeatures(
+                commodity=name,
+                dataset=dataset,
+                as_of=str(self.store.latest(name, dataset, TOTAL_FIELD, 1)[0][-1]),
+                latest=float(latest[row]),
+                weekly_change=_value(weekly_change, row),
+                weekly_change_pct=_value(weekly_change_pct, row),
+                change_4w=_value(change_4w, row),
+                seasonal_mean=_value(seasonal_mean, row) if has_history else None,
+                seasonal_zscore=_value(zscore, row) if has_history else None,
+                seasonal_percentile=_value(percentile, row) if has_history else None,
+                seasonal_years=int(history_years[row]),
+                days_of_cover=_value(days_of_cover, row) if days_of_cover[row] > 0 else None,
+                components=self._components(name, dataset, int(latest_index[row]) + first_week, first_week),
+            )
+        return results
+
+    def _components(self, commodity: str, dataset: str, week: int, first_week: int) -> List[ComponentShare]:
+        """计算指定周的分项占比与周度变化"""
+        names = [
+            name for name in self.store.list_fields(commodity, dataset)
+            if name not in (TOTAL_FIELD, CONSUMPTION_FIELD)
+        ]
+        if not names:
+            return []
+        matrix = self.load_weekly([(commodity, dataset, name) for name in names], max(first_week, week - 1), week)
+        current = matrix[:, -1]
+        change = current - matrix[:, 0] if matrix.shape[1] > 1 else np.full(len(names), np.nan)
+        reported = ~np.isnan(current)
+        if not reported.any():
+            return []
+        total = current[reported].sum()
+        order = [i for i in np.argsort(-np.nan_to_num(current, nan=-np.inf), kind='stable') if reported[i]]
+        return [
+            ComponentShare(
+                name=names[i],
+                value=float(current[i]),
+                share=float(current[i] / total) if total else 0.0,
+                weekly_change=None if np.isnan(change[i]) else float(change[i]),
+            )
+            for i in order
+        ]
+
+    def compute(self, dataset: str, commodity: str) -> Optional[InventoryFeatures]:
+        """计算单个商品的库存特征，没有数据时为 None"""
+        return self.compute_many(dataset, [commodity])[commodity]
+
+
+def describe_inventory(
+    store: TimeSeriesStore,
+    dataset: str,
+    commodity: str,
+    snapshot_components: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    生成放入Prompt的库存特征文本（便捷函数）
+
+    优先使用本地历史数据；没有历史数据时，若提供了分项快照则只输出分项结构。
+
+    Args:
+        store: 时间序列存储
+        dataset: 数据集名称
+        commodity: 商品名称
+        snapshot_components: 分项快照，如数据服务返回的 main_warehouses（社会库存）或 factories（工厂库存）
+
+    Returns:
+        特征文本，没有任何可用数据时为 None
+    """
+    features = InventoryFeatureEngine.from_config(store).compute(dataset, commodity)
+    if features is not None:
+        if not features.components and snapshot_components:
+            features.components = summarize_components(snapshot_components)
+        return features.to_table()
+    components = summarize_components(snapshot_components or {})
+    if components:
+        return "无本地历史数据，仅有最新分项快照：\n\n" + format_components(components)
+    return None
@@ -0,0 +1,192 @@
+# analytics/timeseries_store.py
+"""
+本地列式时间序列存储
+按 商品/合约/字段 组织，每个序列一个目录，包含两列定长二进制文件：
+- dates.i8：日期（自 1970-01-01 起的天数，int64，严格递增）
+- values.f8：数值（float64）
+只追加写入；读取时以 NumPy memmap 映射文件，区间查询用二分定位后直接切片（不复制数据）
+"""
+
+import logging
+import os
+import re
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from config.manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+DateLike = Union[str, date, datetime, np.datetime64]
+
+DATES_FILE = "dates.i8"
+VALUES_FILE = "values.f8"
+
+# 路径中不允许出现的字符
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def to_day(value: DateLike) -> int:
+    """将日期转换为自 1970-01-01 起的天数"""
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+def to_days(values: Iterable[DateLike]) -> np.ndarray:
+    """将一组日期转换为天数数组（int64）"""
+    return np.asarray(values, dtype='datetime64[D]').astype(np.int64)
+
+
+class TimeSeriesStore:
+    """基于 memmap 的只追加时间序列存储"""
+
+    def __init__(self, root: str = "data/timeseries"):
+        """
+        Args:
+            root: 存储根目录
+        """
+        self.root = root
+        # 已映射的列：{文件路径: (映射时的文件大小, memmap)}
+        self._maps: Dict[str, Tuple[int, np.memmap]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "TimeSeriesStore":
+        """根据 settings.toml 的 [timeseries] 节创建存储"""
+        return cls(root=config_manager.get('timeseries', 'path', 'data/timeseries'))
+
+    def _series_dir(self, commodity: str, contract: str, field: str) -> str:
+        parts = [_UNSAFE_CHARS.sub('_', part.strip()) for part in (commodity, contract, field)]
+        if not all(parts):
+            raise ValueError(f"商品、合约与字段名称不能为空: {commodity}/{contract}/{field}")
+        return os.path.join(self.root, *parts)
+
+    def _map(self, path: str, dtype: str) -> np.ndarray:
+        """映射一列文件，文件追加后自动重新映射"""
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size == 0:
+            return np.empty(0, dtype=dtype)
+        cached = self._maps.get(path)
+        if cached and cached[0] == size:
+            return cached[1]
+        mapped = np.memmap(path, dtype=dtype, mode='r')
+        self._maps[path] = (size, mapped)
+        return mapped
+
+    def _columns(self, commodity: str, contract: str, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        series_dir = self._series_dir(commodity, contract, field)
+        dates = self._map(os.path.join(series_dir, DATES_FILE), 'i8')
+        values = self._map(os.path.join(series_dir, VALUES_FILE), 'f8')
+        # 写入顺序为先数值后日期，以较短的一列为准，避免读到写了一半的数据
+        length = min(len(dates), len(values))
+        return dates[:length], values[:length]
+
+    def append(
+        self,
+        commodity: str,
+        contract: str,
+        field: str,
+        dates: Iterable[DateLike],
+        values: Iterable[float],
+        skip_existing: bool = True
+    ) -> int:
+        """
+        追加数据点
+
+        Args:
+            commodity: 商品名称，如 "豆粕"
+            contract: 合约，如 "M2505"，现货使用 "spot"
+            field: 字段，如 "close"、"inventory"
+            dates: 日期序列，必须严格递增
+            values: 与日期一一对应的数值
+            skip_existing: 为 True 时丢弃不晚于已有最后日期的数据点（便于重复执行每日更新），
+                否则抛出异常
+
+        Returns:
+            实际写入的数据点数
+
+        Raises:
+            ValueError: 日期与数值长度不一致、日期未严格递增，或 skip_existing 为 False 时出现旧日期
+        """
+        new_dates = to_days(dates)
+        new_values = np.asarray(values, dtype=np.float64)
+        if new_dates.shape != new_values.shape or new_dates.ndim != 1:
+            raise ValueError(f"日期与数值长度不一致: {new_dates.shape} vs {new_values.shape}")
+        if len(new_dates) > 1 and np.any(np.diff(new_dates) <= 0):
+            raise ValueError("追加的日期必须严格递增")
+
+        with self._lock:
+            existing_dates, _ = self._columns(commodity, contract, field)
+            if len(existing_dates) and len(new_dates):
+                last_day = existing_dates[-1]
+                stale = new_dates <= last_day
+                if stale.any():
+                    if not skip_existing:
+                        raise ValueError(
+                            f"{commodity}/{contract}/{field} 只能追加晚于 {np.datetime64(int(last_day), 'D')} 的数据"
+                        )
+                    new_dates, new_values = new_dates[~stale], new_values[~stale]
+            if len(new_dates) == 0:
+                return 0
+
+            series_dir = self._series_dir(commodity, contract, field)
+            os.makedirs(series_dir, exist_ok=True)
+            with open(os.path.join(series_dir, VALUES_FILE), 'ab') as f:
+                f.write(new_values.tobytes())
+            with open(os.path.join(series_dir, DATES_FILE), 'ab') as f:
+                f.write(new_dates.tobytes())
+        return len(new_dates)
+
+    def read(
+        self,
+        commodity: str,
+        contract: str,
+        field: str,
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        读取日期区间 [start, end] 内的数据
+
+        Returns:
+            (日期数组 datetime64[D], 数值数组)，数值为 memmap 的只读切片
+        """
+        dates, values = self._columns(commodity, contract, field)
+        lo = 0 if start is None else int(np.searchsorted(dates, to_day(start), side='left'))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, to_day(end), side='right'))
+        return dates[lo:hi].view('datetime64[D]'), values[lo:hi]
+
+    def latest(self, commodity: str, contract: str, field: str, n: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        读取最近 n 个数据点
+
+        Returns:
+            (日期数组 datetime64[D], 数值数组)，按日期升序
+        """
+        dates, values = self._columns(commodity, contract, field)
+        start = max(0, len(dates) - n)
+        return dates[start:].view('datetime64[D]'), values[start:]
+
+    def list_commodities(self) -> List[str]:
+        """列出已有数据的商品"""
+        return self._list_dir(self.root)
+
+    def list_contracts(self, commodity: str) -> List[str]:
+        """列出商品下已有数据的合约"""
+        return self._list_dir(os.path.join(self.root, _UNSAFE_CHARS.sub('_', commodity.strip())))
+
+    def list_fields(self, commodity: str, contract: str) -> List[str]:
+        """列出合约下已有数据的字段"""
+        return self._list_dir(os.path.join(
+            self.root,
+            _UNSAFE_CHARS.sub('_', commodity.strip()),
+            _UNSAFE_CHARS.sub('_', contract.strip())
+        ))
+
+    @staticmethod
+    def _list_dir(path: str) -> List[str]:
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
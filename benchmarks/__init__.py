@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+"""
+基准测试
+本地模拟 LLM 服务（mock_llm_server）与端到端基准测试脚本（run_benchmark）
+"""
@@ -0,0 +1,330 @@
+# benchmarks/mock_llm_server.py
+"""
+离线 LLM 模拟服务
+在本地用 aiohttp 模拟智谱、DeepSeek、Gemini 的接口格式（含流式 SSE），
+可配置延迟分布、错误率与流式输出节奏，供基准测试与离线联调使用，不消耗真实额度。
+
+路径（base_url 见 MockLLMServer.base_url）：
+- 智谱:     POST /zhipu/chat/completions
+- DeepSeek: POST /deepseek/chat/completions
+- Gemini:   POST /gemini/v1beta/models/{model}:generateContent
+            POST /gemini/v1beta/models/{model}:streamGenerateContent?alt=sse
+
+单独运行：
+    python -m benchmarks.mock_llm_server --port 8900 --latency 0.5 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from utils.token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+ZHIPU = "zhipu"
+DEEPSEEK = "deepseek"
+GEMINI = "gemini"
+PROVIDERS = (ZHIPU, DEEPSEEK, GEMINI)
+
+
+@dataclass
+class LatencyModel:
+    """首个Token前的延迟分布"""
+    distribution: str = "lognormal"   # fixed / uniform / lognormal
+    median: float = 0.5               # 中位延迟（秒）
+    spread: float = 0.3               # uniform 为上下浮动范围（秒），lognormal 为 sigma
+
+    def sample(self, rng: random.Random) -> float:
+        """采样一次延迟（秒）"""
+        if self.distribution == "fixed":
+            return self.median
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(self.median - self.spread, self.median + self.spread))
+        if self.distribution == "lognormal":
+            return self.median * rng.lognormvariate(0.0, self.spread)
+        raise ValueError(f"不支持的延迟分布: {self.distribution}")
+
+
+@dataclass
+class MockProfile:
+    """一个模拟提供商的行为"""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0                          # 返回错误的概率
+    error_statuses: Tuple[int, ...] = (500, 503, 429)
+    response_chars: int = 400                        # 回复长度（字符）
+    stream_chunks: int = 8                           # 流式回复的分段数
+    chunk_interval: float = 0.02                     # 流式分段之间的间隔（秒）
+
+
+class MockLLMServer:
+    """本地模拟 LLM 服务"""
+
+    def __init__(
+        self,
+        profile: Optional[MockProfile] = None,
+        profiles: Optional[Dict[str, MockProfile]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            profile: 所有提供商默认使用的行为
+            profiles: 按提供商覆盖的行为，键为 zhipu / deepseek / gemini
+            host: 监听地址
+            port: 监听端口，0 表示随机分配
+            seed: 随机数种子，便于复现
+        """
+        self.default_profile = profile or MockProfile()
+        self.profiles = profiles or {}
+        self.host = host
+        self.port = port
+        self._rng = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        # 已见过的系统前缀，用于模拟提供商的前缀缓存
+        self._seen_prefixes: set = set()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.reset_stats()
+
+        self.app = web.Application()
+        self.app.router.add_post('/{provider:zhipu|deepseek}/chat/completions', self._handle_openai)
+        self.app.router.add_post('/gemini/v1beta/models/{target}', self._handle_gemini)
+
+    def profile_for(self, provider: str) -> MockProfile:
+        return self.profiles.get(provider, self.default_profile)
+
+    def base_url(self, provider: str) -> str:
+        """提供商客户端应使用的 base_url"""
+        root = f"http://{self.host}:{self.port}"
+        return f"{root}/gemini/v1beta" if provider == GEMINI else f"{root}/{provider}"
+
+    @property
+    def total_requests(self) -> int:
+        """收到的请求总数（含返回错误的请求）"""
+        return sum(item['requests'] for item in self.stats.values())
+
+    def reset_stats(self):
+        """清空请求统计与模拟的前缀缓存"""
+        self.stats = {provider: {'requests': 0, 'streams': 0, 'errors': 0} for provider in PROVIDERS}
+        self._seen_prefixes.clear()
+
+    async def start(self):
+        """启动服务，port 为 0 时启动后更新为实际端口"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+        logger.info(f"模拟LLM服务已启动: http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockLLMServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    # ------------------------------------------------------------------
+    # 公共行为
+    # ------------------------------------------------------------------
+
+    async def _simulate(self, provider: str, stream: bool) -> Tuple[MockProfile, Optional[web.Response]]:
+        """计数、模拟延迟，按错误率返回错误响应（不出错时为 None）"""
+        profile = self.profile_for(provider)
+        stats = self.stats[provider]
+        stats['requests'] += 1
+        if stream:
+            stats['streams'] += 1
+        await asyncio.sleep(profile.latency.sample(self._rng))
+        if profile.error_rate > 0 and self._rng.random() < profile.error_rate:
+            stats['errors'] += 1
+            status = self._rng.choice(profile.error_statuses)
+            body = json.dumps({"error": {"code": status, "message": "模拟错误"}}, ensure_ascii=False)
+            return profile, web.Response(status=status, text=body, content_type='application/json')
+        return profile, None
+
+    def _usage(self, system: str, prompt: str, reply: str) -> Tuple[int, int, int]:
+        """估算 (输入Token, 输出Token, 命中前缀缓存的Token)，同一系统前缀第二次出现起视为命中"""
+        prompt_tokens = estimate_tokens(system) + estimate_tokens(prompt)
+        cached = 0
+        if system:
+            digest = hashlib.sha1(system.encode('utf-8')).hexdigest()
+            if digest in self._seen_prefixes:
+                cached = estimate_tokens(system)
+            self._seen_prefixes.add(digest)
+        return prompt_tokens, estimate_tokens(reply), cached
+
+    @staticmethod
+    def _reply_text(profile: MockProfile, prompt: str) -> str:
+        head = f"【模拟回复】收到 {len(prompt)} 字符的输入。"
+        filler = "这是离线模拟服务生成的分析文本。"
+        text = head
+        while len(text) < profile.response_chars:
+            text += filler
+        return text[:max(profile.response_chars, len(head))]
+
+    @staticmethod
+    def _split(text: str, parts: int) -> List[str]:
+        size = max(1, -(-len(text) // max(1, parts)))
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    @staticmethod
+    async def _open_sse(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        return response
+
+    @staticmethod
+    async def _send_event(response: web.StreamResponse, data: Any):
+        payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+        await response.write(f"data: {payload}\n\n".encode('utf-8'))
+
+    # ------------------------------------------------------------------
+    # 智谱 / DeepSeek（OpenAI 兼容格式）
+    # ------------------------------------------------------------------
+
+    async def _handle_openai(self, request: web.Request) -> web.StreamResponse:
+        provider = request.match_info['provider']
+        body = await request.json()
+        stream = bool(body.get('stream'))
+        profile, error = await self._simulate(provider, stream)
+        if error is not None:
+            return error
+
+        messages = body.get('messages') or []
+        system = "\n".join(m.get('content', '') for m in messages if m.get('role') == 'system')
+        prompt = "\n".join(m.get('content', '') for m in messages if m.get('role') != 'system')
+        reply = self._reply_text(profile, prompt)
+        usage = self._openai_usage(provider, *self._usage(system, prompt, reply))
+        model = body.get('model', 'mock')
+
+        if not stream:
+            return web.json_response({
+                "id": "mock",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = await self._open_sse(request)
+        for piece in self._split(reply, profile.stream_chunks):
+            await asyncio.sleep(profile.chunk_interval)
+            await self._send_event(response, {
+                "id": "mock", "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}}],
+            })
+        final = {"id": "mock", "model": model, "choices": []}
+        # 智谱默认在最后一个事件返回用量；DeepSeek 需要 stream_options.include_usage
+        if provider == ZHIPU or (body.get('stream_options') or {}).get('include_usage'):
+            final["usage"] = usage
+        await self._send_event(response, final)
+        await self._send_event(response, "[DONE]")
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def _openai_usage(provider: str, prompt_tokens: int, completion_tokens: int, cached: int) -> Dict[str, Any]:
+        usage: Dict[str, Any] = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if provider == DEEPSEEK:
+            usage["prompt_cache_hit_tokens"] = cached
+            usage["prompt_cache_miss_tokens"] = prompt_tokens - cached
+        else:
+            usage["prompt_tokens_details"] = {"cached_tokens": cached}
+        return usage
+
+    # ------------------------------------------------------------------
+    # Gemini
+    # ------------------------------------------------------------------
+
+    async def _handle_gemini(self, request: web.Request) -> web.StreamResponse:
+        model, _, method = request.match_info['target'].partition(':')
+        if method not in ('generateContent', 'streamGenerateContent'):
+            raise web.HTTPNotFound(text=f"未知方法: {method}")
+        stream = method == 'streamGenerateContent'
+        body = await request.json()
+        profile, error = await self._simulate(GEMINI, stream)
+        if error is not None:
+            return error
+
+        system = "\n".join(
+            part.get('text', '') for part in (body.get('systemInstruction') or {}).get('parts', [])
+        )
+        prompt = "\n".join(
+            part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', [])
+        )
+        reply = self._reply_text(profile, prompt)
+        prompt_tokens, completion_tokens, cached = self._usage(system, prompt, reply)
+        usage = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens,
+            "cachedContentTokenCount": cached,
+        }
+
+        def candidate(text: str) -> Dict[str, Any]:
+            return {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+
+        if not stream:
+            return web.json_response({"candidates": [candidate(reply)], "usageMetadata": usage, "modelVersion": model})
+
+        response = await self._open_sse(request)
+        for piece in self._split(reply, profile.stream_chunks):
+            await asyncio.sleep(profile.chunk_interval)
+            await self._send_event(response, {"candidates": [candidate(piece)], "usageMetadata": usage})
+        await response.write_eof()
+        return response
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="离线 LLM 模拟服务（智谱 / DeepSeek / Gemini 接口格式）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--distribution', default='lognormal', choices=['fixed', 'uniform', 'lognormal'])
+    parser.add_argument('--latency', type=float, default=0.5, help='中位延迟（秒）')
+    parser.add_argument('--spread', type=float, default=0.3, help='uniform 的浮动范围（秒）或 lognormal 的 sigma')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--response-chars', type=int, default=400)
+    parser.add_argument('--stream-chunks', type=int, default=8)
+    parser.add_argument('--chunk-interval', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args(argv)
+
+
+async def _serve(args: argparse.Namespace):
+    profile = MockProfile(
+        latency=LatencyModel(args.distribution, args.latency, args.spread),
+        error_rate=args.error_rate,
+        response_chars=args.response_chars,
+        stream_chunks=args.stream_chunks,
+        chunk_interval=args.chunk_interval,
+    )
+    async with MockLLMServer(profile, host=args.host, port=args.port, seed=args.seed) as server:
+        for provider in PROVIDERS:
+            print(f"{provider}: base_url = {server.base_url(provider)}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(_serve(_parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,374 @@
+# benchmarks/run_benchmark.py
+"""
+端到端基准测试
+启动本地模拟 LLM 服务并将各提供商指向它，
+（或以回放模式读取录制的 cassette，不访问网络），
+在不同并发度下驱动 OrchestratorAgent 或 MCP 工具，统计：
+- 请求延迟 p50 / p95 / p99
+- 吞吐量（请求/秒）
+- 每个请求产生的 LLM 调用数（含重试）
+- 失败请求数与失败阶段数
+
+示例：
+    python -m benchmarks.run_benchmark --scenario orchestrator --concurrency 1 4 16 --requests 32
+    python -m benchmarks.run_benchmark --scenario mcp --latency 0.2 --error-rate 0.05 --json result.json
+    python -m benchmarks.run_benchmark --cassette .cache/cassettes/desk.jsonl.gz --commodities 豆粕 铜 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.manager import config_manager
+from data_service import MockBackend, data_service
+from llm_clients.base_client import BaseLLMClient
+from llm_clients.cassette import LATENCY_RECORDED, LATENCY_ZERO, REPLAY, get_cassette
+from .mock_llm_server import GEMINI, LatencyModel, MockLLMServer, MockProfile
+
+logger = logging.getLogger(__name__)
+
+# 配置中的提供商名称 -> 模拟服务中的接口格式
+PROVIDER_FORMATS = {"zhipu": "zhipu", "deepseek": "deepseek", "gemini3": GEMINI}
+
+SCENARIOS = ("orchestrator", "mcp")
+
+DEFAULT_CONTENT = """
+豆粕市场情况：
+- 现货价格：3200元/吨
+- 主力合约价格：3150元/吨
+- 港口库存：80万吨，环比下降8%
+"""
+
+# 单个请求：返回失败阶段数，抛出异常表示整个请求失败
+RequestFunc = Callable[[str], Awaitable[int]]
+
+# OrchestratorAgent 各阶段失败时返回的说明文本（维度分析、其他阶段、综合分析、策略设计）
+FAILED_STAGE_PATTERN = re.compile(r"^(?:分析失败|\S+阶段失败|综合分析生成失败|策略设计失败): ", re.MULTILINE)
+
+# LLM 调用计数：返回 (累计调用数, 累计错误数)
+CallCounter = Callable[[], Tuple[int, int]]
+
+
+@dataclass
+class BenchmarkResult:
+    """一个并发度下的测试结果"""
+    scenario: str
+    concurrency: int
+    requests: int
+    failed_requests: int
+    failed_stages: int
+    duration: float
+    throughput: float
+    latency_p50: Optional[float]
+    latency_p95: Optional[float]
+    latency_p99: Optional[float]
+    llm_calls: int
+    llm_calls_per_request: float
+    llm_errors: int
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def configure_for_mock(
+    server: MockLLMServer,
+    keep_rate_limits: bool = False,
+    keep_response_cache: bool = False,
+    mock_data: bool = True
+):
+    """
+    将所有提供商指向模拟服务（运行时覆盖配置，不修改文件）
+
+    Args:
+        server: 已启动的模拟服务
+        keep_rate_limits: 是否保留配置中的 RPM/TPM 限制（默认去掉，避免限流掩盖系统本身的开销）
+        keep_response_cache: 是否保留响应缓存（默认关闭，否则重复请求直接命中缓存）
+        mock_data: 是否让数据服务使用内置模拟库存数据，覆盖结构化数据路径
+    """
+    if mock_data:
+        data_service.set_backend(MockBackend())
+    for provider, wire_format in PROVIDER_FORMATS.items():
+        section = f"llm_providers.{provider}"
+        config_manager.set(section, 'base_url', server.base_url(wire_format))
+        config_manager.set(section, 'api_key', 'mock-key')
+        config_manager.set(section, 'model', f'mock-{wire_format}')
+    _relax_limits(keep_rate_limits, keep_response_cache)
+
+
+def configure_for_replay(
+    path: str,
+    latency: str = LATENCY_RECORDED,
+    keep_rate_limits: bool = False,
+    keep_response_cache: bool = False
+):
+    """
+    以回放模式读取 cassette（运行时覆盖配置，不修改文件）
+
+    base_url 与模型保持录制时的配置，请求哈希才能匹配；回放不访问网络，
+    未配置的 API_KEY 以占位值代替。
+
+    Args:
+        path: cassette 文件路径
+        latency: recorded 按录制耗时回放，zero 立即返回
+        keep_rate_limits: 是否保留配置中的 RPM/TPM 限制
+        keep_response_cache: 是否保留响应缓存
+    """
+    config_manager.set('cassette', 'mode', REPLAY)
+    config_manager.set('cassette', 'path', path)
+    config_manager.set('cassette', 'latency', latency)
+    for provider in PROVIDER_FORMATS:
+        api_key = str(config_manager.get('llm_providers', provider, {}).get('api_key', ''))
+        if not api_key.strip() or api_key.startswith('${'):
+            config_manager.set(f"llm_providers.{provider}", 'api_key', 'replay-key')
+    _relax_limits(keep_rate_limits, keep_response_cache)
+
+
+def _relax_limits(keep_rate_limits: bool, keep_response_cache: bool):
+    if not keep_rate_limits:
+        for provider in PROVIDER_FORMATS:
+            config_manager.set(f"rate_limits.{provider}", 'requests_per_minute', 0)
+            config_manager.set(f"rate_limits.{provider}", 'tokens_per_minute', 0)
+    if not keep_response_cache:
+        config_manager.set('cache', 'enabled', False)
+
+
+def server_counter(server: MockLLMServer) -> CallCounter:
+    """以模拟服务收到的请求数计数"""
+    return lambda: (server.total_requests, sum(item['errors'] for item in server.stats.values()))
+
+
+def cassette_counter() -> CallCounter:
+    """以 cassette 回放的记录数计数（含未命中）"""
+    def count() -> Tuple[int, int]:
+        stats = get_cassette().get_stats()
+        return stats['replayed'] + stats['misses'], stats['replayed_errors'] + stats['misses']
+    return count
+
+
+def _count_failed_stages(results: Dict[str, str]) -> int:
+    return sum(1 for text in results.values() if FAILED_STAGE_PATTERN.match(text))
+
+
+def make_orchestrator_request(provider: Optional[str], analysis_types: Optional[List[str]], content: str) -> RequestFunc:
+    """直接调用共享的 OrchestratorAgent"""
+    from agents.registry import agent_registry
+
+    async def request(commodity: str) -> int:
+        orchestrator = agent_registry.get_orchestrator(provider)
+        results = await orchestrator.comprehensive_analysis(content, commodity, analysis_types)
+        return _count_failed_stages(results)
+
+    return request
+
+
+def make_mcp_request(client: Any, analysis_types: Optional[List[str]], content: str) -> RequestFunc:
+    """通过内存中的 MCP 客户端调用 comprehensive_analysis 工具"""
+
+    async def request(commodity: str) -> int:
+        arguments: Dict[str, Any] = {"commodity_name": commodity, "content": content}
+        if analysis_types:
+            arguments["analysis_types"] = analysis_types
+        result = await client.call_tool("comprehensive_analysis", arguments)
+        text = "\n".join(getattr(block, 'text', '') for block in result.content)
+        if text.startswith("错误") or "分析过程中发生错误" in text:
+            raise RuntimeError(text[:200])
+        # 每个阶段的结果位于 "===== KEY ANALYSIS =====" 标题的下一行
+        return len(FAILED_STAGE_PATTERN.findall(text))
+
+    return request
+
+
+async def run_level(
+    scenario: str,
+    request: RequestFunc,
+    counter: CallCounter,
+    concurrency: int,
+    total_requests: int,
+    commodities: List[str]
+) -> BenchmarkResult:
+    """在一个并发度下执行 total_requests 个请求"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failed_requests = 0
+    failed_stages = 0
+    calls_before, errors_before = counter()
+
+    async def one(index: int):
+        nonlocal failed_requests, failed_stages
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                failed_stages += await request(commodities[index % len(commodities)])
+            except Exception as e:
+                failed_requests += 1
+                logger.warning(f"请求失败: {e}")
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total_requests)))
+    duration = time.perf_counter() - started
+
+    calls_after, errors_after = counter()
+    llm_calls = calls_after - calls_before
+    return BenchmarkResult(
+        scenario=scenario,
+        concurrency=concurrency,
+        requests=total_requests,
+        failed_requests=failed_requests,
+        failed_stages=failed_stages,
+        duration=round(duration, 3),
+        throughput=round(len(latencies) / duration, 3) if duration > 0 else 0.0,
+        latency_p50=percentile(latencies, 50),
+        latency_p95=percentile(latencies, 95),
+        latency_p99=percentile(latencies, 99),
+        llm_calls=llm_calls,
+        llm_calls_per_request=round(llm_calls / total_requests, 2) if total_requests else 0.0,
+        llm_errors=errors_after - errors_before,
+    )
+
+
+async def run_benchmark(
+    counter: CallCounter,
+    scenario: str = "orchestrator",
+    concurrency_levels: Optional[List[int]] = None,
+    requests_per_level: int = 16,
+    provider: Optional[str] = None,
+    analysis_types: Optional[List[str]] = None,
+    commodities: Optional[List[str]] = None,
+    content: str = DEFAULT_CONTENT,
+    warmup: int = 1
+) -> List[BenchmarkResult]:
+    """
+    依次在各并发度下执行基准测试（调用前需先 configure_for_mock 或 configure_for_replay）
+
+    Args:
+        counter: LLM 调用计数（server_counter 或 cassette_counter）
+        scenario: orchestrator（直接调用Agent）或 mcp（经 MCP 工具调用）
+        concurrency_levels: 并发度列表
+        requests_per_level: 每个并发度执行的请求数
+        provider: LLM提供商，默认使用 [agents] default_llm
+        analysis_types: 分析类型，默认全部
+        commodities: 轮流使用的商品名称
+        content: 请求内容
+        warmup: 正式测试前的预热请求数（不计入结果）
+
+    Returns:
+        各并发度的测试结果
+    """
+    if scenario not in SCENARIOS:
+        raise ValueError(f"不支持的场景: {scenario}，可选: {', '.join(SCENARIOS)}")
+    concurrency_levels = concurrency_levels or [1, 4, 16]
+    commodities = commodities or ["豆粕", "铜"]
+
+    async def run_all(request: RequestFunc) -> List[BenchmarkResult]:
+        for i in range(warmup):
+            await request(commodities[i % len(commodities)])
+        results = []
+        for level in concurrency_levels:
+            result = await run_level(scenario, request, counter, level, requests_per_level, commodities)
+            logger.info(f"并发 {level}: {result}")
+            results.append(result)
+        return results
+
+    if scenario == "mcp":
+        from fastmcp import Client
+        import server as mcp_server
+        async with Client(mcp_server.mcp) as client:
+            return await run_all(make_mcp_request(client, analysis_types, content))
+
+    try:
+        return await run_all(make_orchestrator_request(provider, analysis_types, content))
+    finally:
+        await BaseLLMClient.close_all()
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    """格式化为表格"""
+    def ms(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:.0f}"
+
+    header = "| 场景 | 并发 | 请求 | 失败请求 | 失败阶段 | p50(ms) | p95(ms) | p99(ms) | 吞吐(req/s) | LLM调用/请求 | LLM错误 |"
+    lines = [header, "|" + "---|" * (header.count("|") - 1)]
+    for r in results:
+        lines.append(
+            f"| {r.scenario} | {r.concurrency} | {r.requests} | {r.failed_requests} | {r.failed_stages} | "
+            f"{ms(r.latency_p50)} | {ms(r.latency_p95)} | {ms(r.latency_p99)} | {r.throughput:.2f} | "
+            f"{r.llm_calls_per_request:.2f} | {r.llm_errors} |"
+        )
+    return "\n".join(lines)
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="端到端基准测试（使用本地模拟 LLM 服务）")
+    parser.add_argument('--scenario', default='orchestrator', choices=SCENARIOS)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=16, help='每个并发度执行的请求数')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--provider', default=None, help='LLM提供商，默认使用 [agents] default_llm')
+    parser.add_argument('--analysis-types', nargs='+', default=None)
+    parser.add_argument('--commodities', nargs='+', default=None, help='轮流使用的商品名称')
+    parser.add_argument('--cassette', default=None, help='回放指定的 cassette 文件，不启动模拟服务')
+    parser.add_argument('--cassette-latency', default=LATENCY_RECORDED, choices=[LATENCY_RECORDED, LATENCY_ZERO])
+    parser.add_argument('--distribution', default='lognormal', choices=['fixed', 'uniform', 'lognormal'])
+    parser.add_argument('--latency', type=float, default=0.3, help='模拟服务的中位延迟（秒）')
+    parser.add_argument('--spread', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--response-chars', type=int, default=400)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--keep-rate-limits', action='store_true', help='保留配置中的 RPM/TPM 限制')
+    parser.add_argument('--keep-response-cache', action='store_true', help='保留响应缓存')
+    parser.add_argument('--no-mock-data', action='store_true', help='数据服务不使用模拟库存数据（使用配置中的后端）')
+    parser.add_argument('--json', default=None, help='将结果写入 JSON 文件')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    return parser.parse_args(argv)
+
+
+async def _main(args: argparse.Namespace):
+    options = dict(
+        scenario=args.scenario,
+        concurrency_levels=args.concurrency,
+        requests_per_level=args.requests,
+        provider=args.provider,
+        analysis_types=args.analysis_types,
+        commodities=args.commodities,
+        warmup=args.warmup,
+    )
+    if args.cassette:
+        configure_for_replay(args.cassette, args.cassette_latency, args.keep_rate_limits, args.keep_response_cache)
+        results = await run_benchmark(cassette_counter(), **options)
+    else:
+        profile = MockProfile(
+            latency=LatencyModel(args.distribution, args.latency, args.spread),
+            error_rate=args.error_rate,
+            response_chars=args.response_chars,
+        )
+        async with MockLLMServer(profile, seed=args.seed) as server:
+            configure_for_mock(server, args.keep_rate_limits, args.keep_response_cache, not args.no_mock_data)
+            results = await run_benchmark(server_counter(server), **options)
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    arguments = _parse_args()
+    logging.basicConfig(
+        level=logging.INFO if arguments.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(_main(arguments))
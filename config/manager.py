@@ -26,6 +26,8 @@ class ConfigManager:
         self.config_path = Path(config_path)
         self._config: Dict[str, Any] = {}
         self._env_vars: Dict[str, str] = {}
+        # 配置版本号，每次成功加载后递增，供缓存了配置派生对象的模块判断是否需要重建
+        self.version = 0
         
         # 加载所有环境变量和配置
         self._load_all()
@@ -35,6 +37,7 @@ class ConfigManager:
         try:
             self._load_env_vars()
             self.load_config()
+            self.version += 1
             logger.info("配置加载成功")
         except Exception as e:
             logger.error(f"配置加载失败: {e}")
@@ -167,6 +170,25 @@ class ConfigManager:
             logger.error(f"获取配置失败 [{section}][{key}]: {e}")
             return default
     
+    def set(self, section: str, key: str, value: Any):
+        """
+        在运行时覆盖配置值（不写回文件，reload() 后失效），主要用于测试与基准测试
+
+        Args:
+            section: 配置节名，嵌套节用点号分隔，如 "llm_providers.zhipu"
+            key: 配置键名
+            value: 新值
+        """
+        node = self._config
+        for part in section.split('.'):
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        node[key] = value
+        # 使依赖配置指纹的客户端、限流器等在下次使用时重建
+        self.version += 1
+
     def get_llm_config(self, provider: str) -> Dict[str, Any]:
         """
         获取特定 LLM 提供商的配置
@@ -259,7 +281,8 @@ class ConfigManager:
             # 验证默认提供商
             try:
                 default_provider = self.get_default_llm_provider()
-                if default_provider not in llm_providers:
+                # "router" 表示多提供商路由，不对应单个提供商配置
+                if default_provider != 'router' and default_provider not in llm_providers:
                     result['warnings'].append(
                         f"默认提供商 '{default_provider}' 未在 llm_providers 中配置"
                     )
@@ -347,6 +370,7 @@ except Exception as e:
     config_manager = ConfigManager.__new__(ConfigManager)
     config_manager._config = {}
     config_manager._env_vars = {}
+    config_manager.version = 0
     logger.warning("使用空的配置管理器，请检查配置文件")
 
 
@@ -0,0 +1,64 @@
+# data_service/__init__.py
+"""
+数据服务
+异步获取社会库存、工厂库存等结构化数据，供分析Agent直接使用（无需联网搜索）
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from .backends import (
+    DataBackend,
+    MockBackend,
+    LocalFileBackend,
+    HTTPBackend,
+    SOCIAL_INVENTORY,
+    FACTORY_INVENTORY,
+)
+from .service import DataService
+
+# 创建全局数据服务实例
+data_service = DataService.from_config()
+
+
+# 便捷函数
+async def get_social_inventory_data(commodity_name: str) -> Optional[Dict[str, Any]]:
+    """获取社会库存数据，没有数据时返回 None"""
+    return await data_service.get(SOCIAL_INVENTORY, commodity_name)
+
+
+async def get_factory_inventory_data(commodity_name: str) -> Optional[Dict[str, Any]]:
+    """获取工厂库存数据，没有数据时返回 None"""
+    return await data_service.get(FACTORY_INVENTORY, commodity_name)
+
+
+def format_data_block(data: Dict[str, Any], content: str = "") -> str:
+    """
+    将结构化数据与用户提供的材料组合为Prompt中的数据段
+
+    Args:
+        data: 结构化数据
+        content: 用户提供的其他材料
+
+    Returns:
+        数据段文本
+    """
+    block = f"【结构化数据（来源：数据服务）】\n{json.dumps(data, ensure_ascii=False, indent=2)}"
+    if content and content.strip():
+        block += f"\n\n【其他材料】\n{content}"
+    return block
+
+
+__all__ = [
+    'DataBackend',
+    'MockBackend',
+    'LocalFileBackend',
+    'HTTPBackend',
+    'DataService',
+    'SOCIAL_INVENTORY',
+    'FACTORY_INVENTORY',
+    'data_service',
+    'get_social_inventory_data',
+    'get_factory_inventory_data',
+    'format_data_block',
+]
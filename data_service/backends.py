@@ -0,0 +1,183 @@
+# data_service/backends.py
+"""
+数据后端
+每个后端一次调用即可获取多个商品的同一类数据（批量），
+返回 {商品名称: 数据}，没有数据的商品不出现在结果中
+"""
+
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from utils.deadline import remaining
+
+logger = logging.getLogger(__name__)
+
+# 支持的数据集
+SOCIAL_INVENTORY = "social_inventory"
+FACTORY_INVENTORY = "factory_inventory"
+
+
+class DataBackend(ABC):
+    """数据后端基类"""
+
+    name: str = "base"
+
+    @abstractmethod
+    async def fetch(self, dataset: str, commodities: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取数据
+
+        Args:
+            dataset: 数据集名称，如 social_inventory
+            commodities: 商品名称列表
+
+        Returns:
+            {商品名称: 数据}，没有数据的商品不包含在内
+        """
+
+    async def close(self):
+        """释放后端持有的资源"""
+
+
+class MockBackend(DataBackend):
+    """
+    内置模拟数据，仅用于基准测试与测试
+
+    数据是虚构的，不能作为生产配置的后端：库存类Agent拿到数据后会关闭联网搜索并直接引用这些数字。
+    """
+
+    name = "mock"
+
+    MOCK_DATA: Dict[str, Dict[str, Dict[str, Any]]] = {
+        SOCIAL_INVENTORY: {
+            "豆粕": {
+                "total_inventory": 85.5,   # 万吨
+                "weekly_change": -2.3,     # 环比变化
+                "main_warehouses": {
+                    "日照港": 25.1,
+                    "天津港": 18.4,
+                    "张家港": 15.2
+                }
+            },
+            "铜": {
+                "total_inventory": 155203,  # 吨
+                "weekly_change": 8542,
+                "main_warehouses": {
+                    "上海保税区": 55123,
+                    "广东保税区": 42101,
+                    "江苏保税区": 30105
+                }
+            }
+        },
+        FACTORY_INVENTORY: {
+            "豆粕": {
+                "operating_rate": "75%",
+                "factories": {"factory_A": 5000, "factory_B": 6200}
+            },
+            "铜": {
+                "operating_rate": "75%",
+                "factories": {"factory_A": 5000, "factory_B": 6200}
+            },
+        },
+    }
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: 模拟的网络延迟（秒），每次批量调用一次
+        """
+        self.latency = latency
+
+    async def fetch(self, dataset: str, commodities: List[str]) -> Dict[str, Dict[str, Any]]:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        data = self.MOCK_DATA.get(dataset, {})
+        return {name: data[name] for name in commodities if name in data}
+
+
+class LocalFileBackend(DataBackend):
+    """
+    本地文件后端
+    每个数据集对应目录下的一个 JSON 文件（如 social_inventory.json），内容为 {商品名称: 数据}；
+    文件修改后自动重新读取
+    """
+
+    name = "local"
+
+    def __init__(self, path: str = "data"):
+        """
+        Args:
+            path: 数据文件所在目录
+        """
+        self.path = path
+        # {数据集: (文件修改时间, 数据)}
+        self._files: Dict[str, Tuple[float, Dict[str, Dict[str, Any]]]] = {}
+
+    def _load(self, dataset: str) -> Dict[str, Dict[str, Any]]:
+        filepath = os.path.join(self.path, f"{dataset}.json")
+        if not os.path.exists(filepath):
+            return {}
+        mtime = os.path.getmtime(filepath)
+        cached = self._files.get(dataset)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self._files[dataset] = (mtime, data)
+        logger.info(f"已加载数据文件: {filepath}（{len(data)} 个商品）")
+        return data
+
+    async def fetch(self, dataset: str, commodities: List[str]) -> Dict[str, Dict[str, Any]]:
+        data = await asyncio.to_thread(self._load, dataset)
+        return {name: data[name] for name in commodities if name in data}
+
+
+class HTTPBackend(DataBackend):
+    """
+    HTTP 后端
+    GET {base_url}/{dataset}?commodities=豆粕,铜，响应为 {商品名称: 数据}
+    """
+
+    name = "http"
+
+    def __init__(self, base_url: str, timeout: float = 10.0, headers: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            base_url: 数据接口地址
+            timeout: 单次请求超时（秒），不会超过当前请求的截止时间
+            headers: 附加的请求头（如鉴权）
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers=self.headers)
+        return self._session
+
+    async def fetch(self, dataset: str, commodities: List[str]) -> Dict[str, Dict[str, Any]]:
+        left = remaining()
+        timeout = self.timeout if left is None else min(self.timeout, left)
+        session = await self._get_session()
+        async with session.get(
+            f"{self.base_url}/{dataset}",
+            params={'commodities': ','.join(commodities)},
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise RuntimeError(f"数据接口调用失败: {response.status} - {error_text}")
+            data = await response.json()
+        return {name: data[name] for name in commodities if data.get(name)}
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,225 @@
+# data_service/service.py
+"""
+异步数据服务
+- 可插拔后端：local / http，mock 仅供基准测试与测试（见 backends.py）；未配置后端时不返回任何数据
+- TTL 缓存：有数据与无数据（负缓存）分别设置过期时间
+- 防击穿：同一数据同时只有一个后端请求，其余调用方等待其结果
+- 批量：一次调用获取多个商品，缓存未命中的部分合并为一次后端请求
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.manager import config_manager
+from .backends import (
+    DataBackend,
+    FACTORY_INVENTORY,
+    HTTPBackend,
+    LocalFileBackend,
+    MockBackend,
+    SOCIAL_INVENTORY,
+)
+
+logger = logging.getLogger(__name__)
+
+# 缓存键：(数据集, 商品名称)
+CacheKey = Tuple[str, str]
+
+
+class DataService:
+    """带缓存与防击穿的异步数据访问层"""
+
+    def __init__(
+        self,
+        backend: Optional[DataBackend],
+        ttl: float = 600.0,
+        negative_ttl: float = 60.0,
+        max_batch_size: int = 50,
+    ):
+        """
+        Args:
+            backend: 数据后端，为 None 时所有查询都返回无数据（Agent 保持联网搜索）
+            ttl: 有数据时的缓存时间（秒）
+            negative_ttl: 无数据时的缓存时间（秒），避免反复查询不存在的商品
+            max_batch_size: 单次后端请求最多包含的商品数
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_batch_size = max(1, max_batch_size)
+        # {缓存键: (过期时间, 数据或 None)}
+        self._cache: Dict[CacheKey, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        # 正在进行的后端请求：{缓存键: Future}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'backend_calls': 0, 'backend_errors': 0}
+
+    @classmethod
+    def from_config(cls) -> "DataService":
+        """根据 settings.toml 的 [data_service] 节创建数据服务"""
+        options = config_manager.get('data_service', default={})
+        backend_name = options.get('backend') or 'off'
+        backend: Optional[DataBackend] = None
+        if backend_name == 'off':
+            logger.info("未配置数据后端，库存类Agent将联网搜索数据")
+        elif backend_name == 'local':
+            local = options.get('local', {})
+            backend = LocalFileBackend(path=local.get('path', 'data'))
+        elif backend_name == 'http':
+            http = options.get('http', {})
+            backend = HTTPBackend(
+                base_url=http.get('base_url', ''),
+                timeout=http.get('timeout', 10.0),
+                headers=http.get('headers', {})
+            )
+        elif backend_name == 'mock':
+            logger.warning("数据服务使用内置模拟数据（mock），仅应用于基准测试与测试")
+            backend = MockBackend(latency=options.get('mock', {}).get('latency', 0.0))
+        else:
+            raise ValueError(f"不支持的数据后端: {backend_name}")
+
+        return cls(
+            backend=backend,
+            ttl=options.get('ttl', 600.0),
+            negative_ttl=options.get('negative_ttl', 60.0),
+            max_batch_size=options.get('max_batch_size', 50),
+        )
+
+    def set_backend(self, backend: Optional[DataBackend]):
+        """
+        替换数据后端并清空缓存（用于基准测试与测试）
+
+        Args:
+            backend: 新的数据后端，None 表示不提供数据
+        """
+        self.backend = backend
+        self.clear()
+
+    def _get_cached(self, key: CacheKey) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic():
+            del self._cache[key]
+            return False, None
+        return True, entry[1]
+
+    async def get(self, dataset: str, commodity: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单个商品的数据
+
+        Returns:
+            数据字典，没有数据时为 None
+        """
+        return (await self.get_many(dataset, [commodity])).get(commodity)
+
+    async def get_many(self, dataset: str, commodities: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批量获取多个商品的数据
+
+        缓存命中的直接返回；已有进行中请求的等待其结果；其余合并为一次（或按 max_batch_size 分批）后端请求。
+
+        Args:
+            dataset: 数据集名称
+            commodities: 商品名称列表
+
+        Returns:
+            {商品名称: 数据或 None}
+
+        Raises:
+            后端请求失败时抛出其异常（不缓存失败结果）
+        """
+        if self.backend is None:
+            return {commodity: None for commodity in commodities}
+
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        to_fetch: List[str] = []
+        loop = asyncio.get_running_loop()
+
+        for commodity in dict.fromkeys(commodities):
+            key = (dataset, commodity)
+            hit, value = self._get_cached(key)
+            if hit:
+                self.stats['hits'] += 1
+                results[commodity] = value
+            elif key in self._inflight:
+                self.stats['coalesced'] += 1
+                waiting[commodity] = self._inflight[key]
+            else:
+                self.stats['misses'] += 1
+                future = loop.create_future()
+                self._inflight[key] = future
+                waiting[commodity] = future
+                to_fetch.append(commodity)
+
+        try:
+            for start in range(0, len(to_fetch), self.max_batch_size):
+                await self._fetch_batch(dataset, to_fetch[start:start + self.max_batch_size])
+        except BaseException as e:
+            # 唤醒等待本次请求的其他调用方，失败结果不缓存
+            for commodity in to_fetch:
+                future = self._inflight.pop((dataset, commodity), None)
+                if future is None or future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                    future.exception()  # 标记为已读取，避免无人等待时告警
+                else:
+                    future.cancel()
+            raise
+
+        for commodity, future in waiting.items():
+            results[commodity] = await asyncio.shield(future)
+        return results
+
+    async def _fetch_batch(self, dataset: str, batch: List[str]):
+        """向后端请求一批商品的数据，并唤醒等待这些数据的调用方"""
+        self.stats['backend_calls'] += 1
+        try:
+            data = await self.backend.fetch(dataset, batch)
+        except Exception as e:
+            self.stats['backend_errors'] += 1
+            logger.warning(f"数据后端 {self.backend.name} 获取 {dataset} 失败: {e}")
+            raise
+
+        now = time.monotonic()
+        for key in [(dataset, commodity) for commodity in batch]:
+            value = data.get(key[1])
+            self._cache[key] = (now + (self.ttl if value is not None else self.negative_ttl), value)
+            future = self._inflight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(value)
+
+    async def prefetch(self, commodities: List[str], datasets: Optional[List[str]] = None):
+        """
+        预取多个商品的数据到缓存（失败只记录日志）
+
+        Args:
+            commodities: 商品名称列表
+            datasets: 数据集列表，默认为全部库存数据集
+        """
+        if self.backend is None:
+            return
+        datasets = datasets or [SOCIAL_INVENTORY, FACTORY_INVENTORY]
+        outcomes = await asyncio.gather(
+            *(self.get_many(dataset, commodities) for dataset in datasets),
+            return_exceptions=True
+        )
+        for dataset, outcome in zip(datasets, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"预取 {dataset} 数据失败: {outcome}")
+
+    def clear(self):
+        """清空缓存"""
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存与后端调用统计"""
+        backend_name = self.backend.name if self.backend is not None else 'off'
+        return {'backend': backend_name, 'cached_entries': len(self._cache), **self.stats}
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
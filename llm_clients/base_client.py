@@ -1,9 +1,56 @@
 # llm_clients/base_client.py
+import asyncio
+import json
+import logging
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import aiohttp
+
+from utils.deadline import DeadlineExceeded, check_deadline, remaining
+from utils.token_estimator import estimate_messages_tokens
+from utils.tracing import tracer
+from .cassette import get_cassette
+from .circuit_breaker import get_circuit_breaker
+from .errors import LLMAPIError
+from .rate_limiter import get_rate_limiter
+from .retry import RetryPolicy, parse_retry_after
+from .stats import get_provider_stats
+
+logger = logging.getLogger(__name__)
+
+# 连接池默认参数，可在 settings.toml 的 [http_pool] 节中覆盖
+DEFAULT_POOL_OPTIONS: Dict[str, Any] = {
+    'limit': 100,             # 连接池总连接数上限
+    'limit_per_host': 20,     # 单个主机的连接数上限
+    'ttl_dns_cache': 300,     # DNS 缓存时间（秒）
+    'keepalive_timeout': 60,  # 空闲长连接保持时间（秒）
+}
+
+# HTTP 超时默认参数，可在 settings.toml 的 [timeouts] 节中覆盖
+DEFAULT_TIMEOUT_OPTIONS: Dict[str, Any] = {
+    'request_timeout': 120.0,      # 单次非流式请求的总超时（秒）
+    'connect_timeout': 10.0,       # 建立连接的超时（秒）
+    'stream_read_timeout': 60.0,   # 流式响应两段数据之间的最大间隔（秒）
+}
+
 
 class BaseLLMClient(ABC):
-    """所有LLM客户端的抽象基类"""
+    """
+    所有LLM客户端的抽象基类
+
+    子类通过 _build_request / _parse_response / _parse_stream_chunk 描述各提供商的
+    请求与响应格式，HTTP 调用（包括流式 SSE 解析）由基类统一完成。
+    """
+
+    # 提供商显示名称，用于错误信息
+    display_name: str = "LLM"
+
+    # 进程级共享的HTTP会话，按提供商区分：{provider: (事件循环, 会话)}
+    # 同一提供商的所有客户端实例复用同一个长连接池，避免每次调用都重新握手
+    _sessions: Dict[str, Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+
     def __init__(self, api_key: str, base_url: str, model: str, **kwargs):
         self.api_key = api_key
         self.base_url = base_url
@@ -12,20 +59,422 @@ class BaseLLMClient(ABC):
         # 将其他参数如 temperature, max_tokens 存储起来
         self.temperature = kwargs.get('temperature', 0.7)
         self.max_tokens = kwargs.get('max_tokens', 1024)
+        # 连接池按提供商共享，未指定时退化为按客户端类型共享
+        self.provider = kwargs.get('provider') or self.__class__.__name__
+        self.pool_options = {**DEFAULT_POOL_OPTIONS, **(kwargs.get('pool_options') or {})}
+        self.retry_policy: RetryPolicy = kwargs.get('retry_policy') or RetryPolicy()
+        self.timeout_options = {**DEFAULT_TIMEOUT_OPTIONS, **(kwargs.get('timeout_options') or {})}
+        # 调用与尝试次数统计：calls 为对外调用数，attempts 为实际发出的请求数
+        self.attempt_stats = {'calls': 0, 'attempts': 0, 'retries': 0, 'failures': 0}
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        获取当前提供商共享的长连接会话，不存在或已失效时创建
+
+        会话与创建它的事件循环绑定，事件循环变化（如多次 asyncio.run）时会重新创建。
+
+        Returns:
+            可复用的 aiohttp 会话
+        """
+        loop = asyncio.get_running_loop()
+        entry = BaseLLMClient._sessions.get(self.provider)
+        if entry:
+            session_loop, session = entry
+            if not session.closed and session_loop is loop:
+                return session
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_options['limit'],
+            limit_per_host=self.pool_options['limit_per_host'],
+            use_dns_cache=True,
+            ttl_dns_cache=self.pool_options['ttl_dns_cache'],
+            keepalive_timeout=self.pool_options['keepalive_timeout'],
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        BaseLLMClient._sessions[self.provider] = (loop, session)
+        logger.info(f"已为 {self.provider} 创建共享HTTP连接池: {self.pool_options}")
+        return session
+
+    async def close(self):
+        """关闭当前提供商的共享会话（同一提供商的其他客户端会在下次调用时重建）"""
+        await self.close_session(self.provider)
+
+    @classmethod
+    async def close_session(cls, provider: str):
+        """
+        关闭指定提供商的共享会话
+
+        Args:
+            provider: 提供商名称
+        """
+        entry = BaseLLMClient._sessions.pop(provider, None)
+        if entry is None:
+            return
+        session_loop, session = entry
+        if session.closed:
+            return
+        if session_loop is not asyncio.get_running_loop():
+            # 会话属于其他事件循环，无法在当前循环中安全关闭
+            logger.warning(f"{provider} 的HTTP会话属于其他事件循环，跳过关闭")
+            return
+        await session.close()
+        logger.info(f"已关闭 {provider} 的共享HTTP连接池")
+
+    @classmethod
+    async def close_all(cls):
+        """关闭所有提供商的共享会话，应在服务退出前调用"""
+        for provider in list(BaseLLMClient._sessions.keys()):
+            await cls.close_session(provider)
 
-    @abstractmethod
     async def chat(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> str: #  新增 search_whitelist 参数
         """
-        与模型进行异步对话的抽象方法
-        
+        与模型进行异步对话
+
         Args:
             messages: 对话历史，格式为 [{"role": "user", "content": "..."}, ...]
             model: 可选，指定使用的模型，如果不提供则使用默认模型
-            
+            search_whitelist: 可选，允许模型联网搜索的站点/关键词白名单
+
         Returns:
             模型的回复文本
-            
+
         Raises:
             ValueError: 如果模型未配置或不支持搜索功能
         """
-        pass
+        url, headers, payload = self._build_request(messages, model, search_whitelist, stream=False)
+        estimated_tokens = self._estimate_request_tokens(messages)
+        stats = get_provider_stats(self.provider)
+        started = time.monotonic()
+        with stats.track(), tracer.span("llm.call", provider=self.provider, model=model or self.model, stream=False):
+            result = await self._with_retry(lambda: self._send_json(url, headers, payload, estimated_tokens))
+            text = self._parse_response(result)
+            self._record_usage(self._parse_usage(result), time.monotonic() - started)
+            return text
+
+    async def chat_stream(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> AsyncIterator[str]:
+        """
+        与模型进行流式对话，模型每生成一段文本即产出一段
+
+        只有在尚未产出任何文本时失败才会按重试策略重试，已开始输出后出错直接抛出。
+
+        Args:
+            messages: 对话历史，格式同 chat
+            model: 可选，指定使用的模型
+            search_whitelist: 可选，搜索白名单
+
+        Yields:
+            增量回复文本片段
+        """
+        url, headers, payload = self._build_request(messages, model, search_whitelist, stream=True)
+        estimated_tokens = self._estimate_request_tokens(messages)
+        limiter = get_rate_limiter(self.provider)
+        breaker = get_circuit_breaker(self.provider)
+        started = time.monotonic()
+        attempt = 0
+        self.attempt_stats['calls'] += 1
+
+        with get_provider_stats(self.provider).track(), \
+                tracer.span("llm.call", provider=self.provider, model=model or self.model, stream=True):
+            while True:
+                attempt += 1
+                self.attempt_stats['attempts'] += 1
+                yielded = False
+                usage = None
+                try:
+                    # 熔断中直接失败；流式调用在整个输出期间占用一个并发名额
+                    breaker.ensure_available()
+                    async with limiter.limit(estimated_tokens) as admitted_at:
+                        with breaker.guard(), tracer.span("llm.http", attempt=attempt) as http_span:
+                            try:
+                                async for event in self._post_stream(url, headers, payload):
+                                    # 用量通常只在最后一个事件中给出，取最后一次出现的值
+                                    usage = self._parse_usage(event) or usage
+                                    text = self._parse_stream_chunk(event)
+                                    if text:
+                                        yielded = True
+                                        yield text
+                            except LLMAPIError as e:
+                                limiter.record_result(e.status, admitted_at)
+                                raise
+                            limiter.record_result(200, admitted_at)
+                            http_span.set('http.status_code', 200)
+                            self._record_usage(usage, time.monotonic() - started)
+                            return
+                except Exception as e:
+                    if yielded:
+                        self.attempt_stats['failures'] += 1
+                        raise
+                    delay = self._get_retry_delay(e, attempt, started)
+                    if delay is None:
+                        raise
+                await asyncio.sleep(delay)
+
+    async def _send_json(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        estimated_tokens: int
+    ) -> Dict[str, Any]:
+        """单次尝试：在限流器约束内发送非流式请求"""
+        limiter = get_rate_limiter(self.provider)
+        breaker = get_circuit_breaker(self.provider)
+        # 熔断中直接失败，不进入限流排队
+        breaker.ensure_available()
+        async with limiter.limit(estimated_tokens) as admitted_at:
+            with breaker.guard(), tracer.span("llm.http") as http_span:
+                try:
+                    result = await self._post_json(url, headers, payload)
+                except LLMAPIError as e:
+                    limiter.record_result(e.status, admitted_at)
+                    raise
+                limiter.record_result(200, admitted_at)
+                http_span.set('http.status_code', 200)
+                return result
+
+    async def _with_retry(self, attempt_func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        按重试策略执行调用
+
+        Args:
+            attempt_func: 执行单次尝试的函数
+
+        Returns:
+            首次成功的结果
+
+        Raises:
+            最后一次失败的异常（不可重试、次数用尽或超出总时间上限）
+        """
+        started = time.monotonic()
+        attempt = 0
+        self.attempt_stats['calls'] += 1
+        while True:
+            attempt += 1
+            self.attempt_stats['attempts'] += 1
+            try:
+                return await attempt_func()
+            except Exception as e:
+                delay = self._get_retry_delay(e, attempt, started)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def _get_retry_delay(self, error: Exception, attempt: int, started: float) -> Optional[float]:
+        """
+        判断失败后是否重试
+
+        Returns:
+            重试前需要等待的秒数；不再重试时返回 None（并在异常上记录尝试次数）
+        """
+        policy = self.retry_policy
+        give_up = not policy.is_retryable(error) or attempt >= policy.max_attempts
+        delay = 0.0
+        if not give_up:
+            delay = policy.compute_delay(attempt, error)
+            left = remaining()
+            give_up = (
+                time.monotonic() - started + delay > policy.max_total_time
+                or (left is not None and delay >= left)
+            )
+
+        if give_up:
+            self.attempt_stats['failures'] += 1
+            try:
+                error.attempts = attempt
+            except AttributeError:
+                pass
+            if attempt > 1:
+                logger.error(f"{self.display_name} 调用在第 {attempt} 次尝试后放弃: {error}")
+            return None
+
+        self.attempt_stats['retries'] += 1
+        logger.warning(
+            f"{self.display_name} 第 {attempt} 次调用失败（{type(error).__name__}: {error}），"
+            f"{delay:.2f}s 后重试"
+        )
+        return delay
+
+    def _estimate_request_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """预估一次调用消耗的Token数（输入 + 最大输出），用于 TPM 限流"""
+        return estimate_messages_tokens(messages) + self.max_tokens
+
+    @abstractmethod
+    def _build_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        search_whitelist: Optional[List[str]],
+        stream: bool
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """
+        构造请求（由子类实现）
+
+        Returns:
+            (url, headers, payload)
+        """
+
+    @abstractmethod
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        """从非流式响应中提取回复文本（由子类实现）"""
+
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> str:
+        """
+        从一个流式事件中提取增量文本，无文本时返回空字符串
+
+        默认不支持流式输出：提供商支持 SSE 时由子类覆盖，否则 chat_stream 在解析第一个事件时报错。
+
+        Raises:
+            NotImplementedError: 该提供商不支持流式输出
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} 不支持流式输出")
+
+    def _parse_usage(self, result: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """
+        从响应（或流式事件）中提取Token用量（由子类实现），没有用量信息时返回 None
+
+        Returns:
+            {'prompt_tokens': 输入Token数, 'completion_tokens': 输出Token数,
+             'cached_tokens': 输入中命中提供商前缀缓存的Token数}
+        """
+        return None
+
+    def _record_usage(self, usage: Optional[Dict[str, int]], latency: float):
+        """将一次成功调用的Token用量计入提供商统计与当前追踪 span"""
+        if not usage:
+            return
+        get_provider_stats(self.provider).record_usage(
+            prompt_tokens=usage.get('prompt_tokens', 0),
+            completion_tokens=usage.get('completion_tokens', 0),
+            cached_tokens=usage.get('cached_tokens', 0),
+            latency=latency,
+        )
+        tracer.add_tokens(
+            prompt_tokens=usage.get('prompt_tokens', 0),
+            completion_tokens=usage.get('completion_tokens', 0),
+            cached_tokens=usage.get('cached_tokens', 0),
+            provider=self.provider,
+        )
+
+    async def _raise_for_status(self, response: aiohttp.ClientResponse):
+        """将非 200 响应转换为 LLMAPIError（附带 Retry-After）"""
+        error_text = await response.text()
+        raise LLMAPIError(
+            f"{self.display_name}API调用失败: {response.status} - {error_text}",
+            provider=self.provider,
+            status=response.status,
+            body=error_text,
+            retry_after=parse_retry_after(response.headers.get('Retry-After'))
+        )
+
+    def _get_request_timeout(self, stream: bool) -> Tuple[aiohttp.ClientTimeout, bool]:
+        """
+        计算单次请求的超时：配置的超时与当前截止时间的剩余时间取较小者
+
+        流式请求不限制总时长（只受截止时间约束），而是限制两段数据之间的间隔。
+
+        Returns:
+            (aiohttp 超时设置, 总超时是否由截止时间决定)
+
+        Raises:
+            DeadlineExceeded: 截止时间已到
+        """
+        check_deadline(f"{self.display_name}请求")
+        total = None if stream else self.timeout_options.get('request_timeout')
+        left = remaining()
+        capped = left is not None and (total is None or left < total)
+        if capped:
+            total = left
+        return aiohttp.ClientTimeout(
+            total=total,
+            sock_connect=self.timeout_options.get('connect_timeout'),
+            sock_read=self.timeout_options.get('stream_read_timeout') if stream else None,
+        ), capped
+
+    def _deadline_error(self, error: BaseException) -> DeadlineExceeded:
+        return DeadlineExceeded(f"{self.display_name}请求在截止时间前未完成: {type(error).__name__}")
+
+    def _endpoint(self, url: str) -> str:
+        """请求路径（去掉 base_url 与查询参数），用于 cassette 的请求哈希，避免 API Key 与地址影响匹配"""
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        return path.split('?', 1)[0]
+
+    async def _post_json(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送非流式请求并返回解析后的 JSON 响应（cassette 录制/回放模式下经由 cassette）"""
+        return await get_cassette().post_json(
+            self.provider, self._endpoint(url), payload,
+            lambda: self._send_post_json(url, headers, payload)
+        )
+
+    async def _send_post_json(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """通过HTTP发送非流式请求"""
+        session = await self._get_session()
+        timeout, capped = self._get_request_timeout(stream=False)
+        try:
+            async with session.post(url, headers=headers, json=payload, timeout=timeout) as response:
+                if response.status != 200:
+                    await self._raise_for_status(response)
+
+                return await response.json()
+        except asyncio.TimeoutError as e:
+            # 由截止时间截断的超时不是提供商的问题，不重试也不计入熔断
+            if capped:
+                raise self._deadline_error(e) from e
+            raise
+
+    async def _post_stream(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        发送流式请求并逐个产出 SSE 事件中的 JSON 数据
+
+        遇到 "data: [DONE]" 或连接结束时停止；cassette 录制/回放模式下经由 cassette。
+        """
+        cassette_stream = get_cassette().post_stream(
+            self.provider, self._endpoint(url), payload,
+            lambda: self._send_post_stream(url, headers, payload)
+        )
+        async for event in cassette_stream:
+            yield event
+
+    async def _send_post_stream(self, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """通过HTTP发送流式请求"""
+        session = await self._get_session()
+        timeout, capped = self._get_request_timeout(stream=True)
+        try:
+            async for event in self._iter_sse_events(session, url, headers, payload, timeout):
+                yield event
+        except asyncio.TimeoutError as e:
+            if capped:
+                raise self._deadline_error(e) from e
+            raise
+
+    async def _iter_sse_events(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: aiohttp.ClientTimeout
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """解析 SSE 响应流，逐个产出事件中的 JSON 数据"""
+        async with session.post(url, headers=headers, json=payload, timeout=timeout) as response:
+            if response.status != 200:
+                await self._raise_for_status(response)
+
+            data_lines: List[str] = []
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').rstrip('\r\n')
+                if line.startswith('data:'):
+                    data_lines.append(line[5:].lstrip())
+                    continue
+                if line or not data_lines:
+                    # 忽略注释、event/id 等字段
+                    continue
+
+                # 空行表示一个事件结束
+                data = '\n'.join(data_lines)
+                data_lines = []
+                if data == '[DONE]':
+                    return
+                yield json.loads(data)
+
+            if data_lines and data_lines[0] != '[DONE]':
+                yield json.loads('\n'.join(data_lines))
@@ -0,0 +1,376 @@
+# llm_clients/cassette.py
+"""
+LLM 流量录制与回放（cassette）
+录制模式下把每次 HTTP 请求的响应（非流式 JSON、流式事件及其时间偏移、错误状态）
+按请求哈希追加写入 cassette 文件；回放模式下按请求哈希取出录制的响应，
+以录制时的延迟或零延迟返回，不访问网络。
+
+录制/回放发生在 HTTP 层，重试、限流、熔断、用量统计等逻辑与真实调用完全一致，
+可用于离线回放一天的真实请求，对比新版本的耗时与调用次数。
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Pattern, Tuple
+
+from config.manager import config_manager
+from utils.deadline import DeadlineExceeded, remaining
+from .errors import CassetteMissError, LLMAPIError
+from .request_key import compile_ignore_patterns, hash_request
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+MODES = (OFF, RECORD, REPLAY)
+
+# 回放延迟：recorded 按录制时的耗时等待，zero 立即返回
+LATENCY_RECORDED = "recorded"
+LATENCY_ZERO = "zero"
+
+
+class Cassette:
+    """一个 cassette 文件的录制/回放器"""
+
+    def __init__(
+        self,
+        mode: str = OFF,
+        path: str = ".cache/cassettes/default.jsonl.gz",
+        latency: str = LATENCY_RECORDED,
+        on_miss: str = "error",
+        ignore_patterns: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            mode: off / record / replay
+            path: cassette 文件路径，以 .gz 结尾时使用 gzip 压缩
+            latency: 回放延迟，recorded 或 zero
+            on_miss: 回放时找不到录制记录的处理方式，error 抛出 CassetteMissError，live 转为真实请求
+            ignore_patterns: 计算请求哈希前从请求体中抹掉的正则（如时间戳）
+        """
+        if mode not in MODES:
+            raise ValueError(f"不支持的 cassette 模式: {mode}，可选: {', '.join(MODES)}")
+        if latency not in (LATENCY_RECORDED, LATENCY_ZERO):
+            raise ValueError(f"不支持的回放延迟: {latency}")
+        self.mode = mode
+        self.path = Path(path)
+        self.latency = latency
+        self.on_miss = on_miss
+        self.ignore_patterns: List[Pattern] = compile_ignore_patterns(ignore_patterns)
+
+        # 回放数据：{key: [记录, ...]}，同一请求出现多次时按顺序回放，用完后重复最后一条
+        self._entries: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._write_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+        self._stats = {
+            'recorded': 0,
+            'replayed': 0,
+            'replayed_errors': 0,
+            'misses': 0,
+            'recorded_latency': 0.0,
+            'replayed_latency': 0.0,
+        }
+
+    @classmethod
+    def from_config(cls) -> "Cassette":
+        """根据 settings.toml 的 [cassette] 节创建实例"""
+        options = config_manager.get('cassette', default={}) or {}
+        return cls(
+            mode=options.get('mode', OFF),
+            path=options.get('path', ".cache/cassettes/default.jsonl.gz"),
+            latency=options.get('latency', LATENCY_RECORDED),
+            on_miss=options.get('on_miss', "error"),
+            ignore_patterns=options.get('ignore_patterns'),
+        )
+
+    def make_key(self, provider: str, endpoint: str, payload: Dict[str, Any]) -> str:
+        """
+        计算请求哈希
+
+        Args:
+            provider: 提供商名称
+            endpoint: 去掉 base_url 与查询参数后的请求路径（Gemini 的模型名在路径中）
+            payload: 请求体
+
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        return hash_request(
+            {'provider': provider, 'endpoint': endpoint, 'payload': payload},
+            self.ignore_patterns
+        )
+
+    async def post_json(
+        self,
+        provider: str,
+        endpoint: str,
+        payload: Dict[str, Any],
+        send: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        在录制/回放下执行一次非流式请求
+
+        Args:
+            provider: 提供商名称
+            endpoint: 请求路径
+            payload: 请求体
+            send: 发出真实请求的函数
+
+        Returns:
+            响应 JSON
+        """
+        if self.mode == OFF:
+            return await send()
+
+        key = self.make_key(provider, endpoint, payload)
+        if self.mode == REPLAY:
+            entry = await self._find(key, provider, stream=False)
+            if entry is not None:
+                await self._sleep(entry.get('latency', 0.0))
+                self._raise_if_error(entry)
+                return entry['response']
+            # on_miss=live：转为真实请求（不写入）
+            return await send()
+
+        started = time.monotonic()
+        try:
+            result = await send()
+        except LLMAPIError as e:
+            await self._record(key, provider, endpoint, False, time.monotonic() - started, error=e)
+            raise
+        await self._record(key, provider, endpoint, False, time.monotonic() - started, response=result)
+        return result
+
+    async def post_stream(
+        self,
+        provider: str,
+        endpoint: str,
+        payload: Dict[str, Any],
+        send: Callable[[], AsyncIterator[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        在录制/回放下执行一次流式请求，逐个产出事件
+
+        回放时按录制的时间偏移产出各事件（latency=zero 时一次性产出）。
+        """
+        if self.mode == OFF:
+            async for event in send():
+                yield event
+            return
+
+        key = self.make_key(provider, endpoint, payload)
+        if self.mode == REPLAY:
+            entry = await self._find(key, provider, stream=True)
+            if entry is not None:
+                if 'events' not in entry:
+                    await self._sleep(entry.get('latency', 0.0))
+                    self._raise_if_error(entry)
+                elapsed = 0.0
+                for offset, event in entry.get('events', []):
+                    await self._sleep(offset - elapsed)
+                    elapsed = offset
+                    yield event
+                return
+            async for event in send():
+                yield event
+            return
+
+        started = time.monotonic()
+        events: List[Tuple[float, Dict[str, Any]]] = []
+        try:
+            async for event in send():
+                events.append((round(time.monotonic() - started, 4), event))
+                yield event
+        except LLMAPIError as e:
+            if not events:
+                await self._record(key, provider, endpoint, True, time.monotonic() - started, error=e)
+            raise
+        await self._record(key, provider, endpoint, True, time.monotonic() - started, events=events)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取录制/回放统计"""
+        return {
+            'mode': self.mode,
+            'path': str(self.path),
+            'latency': self.latency,
+            **{key: round(value, 3) if isinstance(value, float) else value for key, value in self._stats.items()},
+        }
+
+    def summarize(self) -> Dict[str, Dict[str, Any]]:
+        """
+        按提供商汇总 cassette 文件中的录制记录
+
+        Returns:
+            {provider: {'calls': 调用数, 'errors': 错误数, 'stream_calls': 流式调用数, 'total_latency': 录制耗时合计}}
+        """
+        summary: Dict[str, Dict[str, Any]] = {}
+        for entry in self._read_entries():
+            item = summary.setdefault(
+                entry.get('provider', ''),
+                {'calls': 0, 'errors': 0, 'stream_calls': 0, 'total_latency': 0.0}
+            )
+            item['calls'] += 1
+            item['errors'] += 1 if 'error' in entry else 0
+            item['stream_calls'] += 1 if entry.get('stream') else 0
+            item['total_latency'] = round(item['total_latency'] + entry.get('latency', 0.0), 3)
+        return summary
+
+    # ------------------------------------------------------------------
+    # 回放
+
+    async def _find(self, key: str, provider: str, stream: bool) -> Optional[Dict[str, Any]]:
+        """
+        取出下一条录制记录
+
+        Raises:
+            CassetteMissError: 找不到记录且 on_miss 为 error
+        """
+        if self._entries is None:
+            await asyncio.to_thread(self._load)
+        entries = self._entries.get(key)
+        if not entries:
+            self._stats['misses'] += 1
+            if self.on_miss == "live":
+                logger.warning(f"cassette 中没有 {provider} 的匹配记录，转为真实请求")
+                return None
+            raise CassetteMissError(provider, key, str(self.path))
+
+        index = self._cursors[key]
+        self._cursors[key] = index + 1
+        entry = entries[min(index, len(entries) - 1)]
+        self._stats['replayed'] += 1
+        self._stats['replayed_errors'] += 1 if 'error' in entry else 0
+        if entry.get('stream') != stream:
+            logger.warning(f"cassette 记录的流式标记与当前请求不一致（{provider}）")
+        return entry
+
+    def _load(self):
+        with self._load_lock:
+            if self._entries is not None:
+                return
+            entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for entry in self._read_entries():
+                entries[entry['key']].append(entry)
+            self._entries = entries
+            logger.info(f"已加载 cassette {self.path}: {sum(len(v) for v in entries.values())} 条记录")
+
+    def _read_entries(self) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            logger.warning(f"cassette 文件不存在: {self.path}")
+            return []
+        entries = []
+        with self._open('rt') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 录制进程中途退出时最后一行可能不完整
+                    logger.warning(f"跳过 cassette 中无法解析的记录: {line[:80]}")
+        return entries
+
+    async def _sleep(self, seconds: float):
+        """按回放延迟等待，不超过当前截止时间"""
+        if self.latency == LATENCY_ZERO or seconds <= 0:
+            return
+        left = remaining()
+        if left is not None and seconds >= left:
+            await asyncio.sleep(max(left, 0.0))
+            raise DeadlineExceeded("cassette 回放的请求在截止时间前未完成")
+        self._stats['replayed_latency'] += seconds
+        await asyncio.sleep(seconds)
+
+    @staticmethod
+    def _raise_if_error(entry: Dict[str, Any]):
+        error = entry.get('error')
+        if error is None:
+            return
+        raise LLMAPIError(
+            error.get('message', ''),
+            provider=entry.get('provider', ''),
+            status=error.get('status', 500),
+            body=error.get('body', ''),
+            retry_after=error.get('retry_after'),
+        )
+
+    # ------------------------------------------------------------------
+    # 录制
+
+    async def _record(
+        self,
+        key: str,
+        provider: str,
+        endpoint: str,
+        stream: bool,
+        latency: float,
+        response: Optional[Dict[str, Any]] = None,
+        events: Optional[List[Tuple[float, Dict[str, Any]]]] = None,
+        error: Optional[LLMAPIError] = None,
+    ):
+        entry: Dict[str, Any] = {
+            'key': key,
+            'provider': provider,
+            'endpoint': endpoint,
+            'stream': stream,
+            'latency': round(latency, 4),
+            'recorded_at': round(time.time(), 3),
+        }
+        if error is not None:
+            entry['error'] = {
+                'message': str(error),
+                'status': error.status,
+                'body': error.body,
+                'retry_after': error.retry_after,
+            }
+        elif stream:
+            entry['events'] = events or []
+        else:
+            entry['response'] = response
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        try:
+            await asyncio.to_thread(self._append, line)
+        except Exception as e:
+            # 录制失败不影响真实调用
+            logger.error(f"写入 cassette 失败: {e}")
+            return
+        self._stats['recorded'] += 1
+        self._stats['recorded_latency'] += latency
+
+    def _append(self, line: str):
+        with self._write_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._open('at') as f:
+                f.write(line + "\n")
+
+    def _open(self, mode: str):
+        if self.path.suffix == '.gz':
+            return gzip.open(self.path, mode, encoding='utf-8')
+        return open(self.path, mode, encoding='utf-8')
+
+
+# 当前配置对应的全局实例：(配置, 实例)
+_cassette: Optional[Tuple[Dict[str, Any], Cassette]] = None
+
+
+def get_cassette() -> Cassette:
+    """获取全局 cassette，[cassette] 配置变化后重建"""
+    global _cassette
+    options = config_manager.get('cassette', default={}) or {}
+    if _cassette is not None and _cassette[0] == options:
+        return _cassette[1]
+    cassette = Cassette.from_config()
+    _cassette = (dict(options), cassette)
+    if cassette.mode != OFF:
+        logger.info(f"LLM 流量 cassette 模式: {cassette.mode}，文件: {cassette.path}")
+    return cassette
@@ -0,0 +1,266 @@
+# llm_clients/circuit_breaker.py
+"""
+按提供商的熔断器
+- closed：正常放行，统计最近请求的失败率（服务端错误、网络错误、超时、慢调用）
+- open：失败率超过阈值后熔断，冷却期内直接快速失败，不再等待注定失败的请求
+- half_open：冷却期结束后放行少量探测请求，成功则恢复，失败则重新熔断
+同一提供商的所有客户端共享同一个熔断器
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+import aiohttp
+
+from config.manager import config_manager
+from utils.deadline import DeadlineExceeded
+from .errors import CircuitOpenError, LLMAPIError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个提供商的熔断器"""
+
+    def __init__(
+        self,
+        provider: str,
+        enabled: bool = True,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        slow_call_seconds: float = 0.0,
+    ):
+        """
+        Args:
+            provider: 提供商名称
+            enabled: 是否启用，关闭时始终放行且不统计
+            window: 统计失败率的滚动窗口（最近多少次请求）
+            min_calls: 窗口内请求数少于该值时不熔断
+            failure_rate_threshold: 触发熔断的失败率
+            open_seconds: 熔断后的冷却时间（秒）
+            half_open_max_calls: 半开状态下同时放行的探测请求数
+            slow_call_seconds: 超过该耗时的成功请求按超时计为失败，0 表示不启用
+        """
+        self.provider = provider
+        self.enabled = enabled
+        self.min_calls = max(1, min_calls)
+        self.failure_rate_threshold = failure_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.slow_call_seconds = slow_call_seconds
+
+        self.state = CLOSED
+        self.outcomes: deque = deque(maxlen=max(1, window))   # True 表示成功
+        self.opened_at = 0.0
+        self.half_open_in_flight = 0
+        self.open_count = 0
+        self.rejected_count = 0
+        self.timeout_count = 0
+
+    def is_failure(self, error: BaseException) -> bool:
+        """
+        判断错误是否说明提供商不健康
+
+        服务端错误（5xx、408）、连接错误与超时计为失败；
+        429 由限流器的并发窗口处理，4xx 属于请求本身的问题，均不计入。
+        """
+        if isinstance(error, LLMAPIError):
+            return error.status >= 500 or error.status == 408
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    def _remaining_open_time(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def is_available(self) -> bool:
+        """当前是否会放行请求（不改变状态），供路由选择提供商"""
+        if not self.enabled:
+            return True
+        if self.state == OPEN:
+            return self._remaining_open_time() <= 0
+        if self.state == HALF_OPEN:
+            return self.half_open_in_flight < self.half_open_max_calls
+        return True
+
+    def ensure_available(self):
+        """
+        不占用探测名额的快速检查，用于在进入限流排队前快速失败
+
+        Raises:
+            CircuitOpenError: 当前不会放行请求
+        """
+        if not self.is_available():
+            self.rejected_count += 1
+            raise CircuitOpenError(self.provider, self._remaining_open_time() if self.state == OPEN else 0.0)
+
+    def before_call(self):
+        """
+        请求发出前检查熔断状态
+
+        Raises:
+            CircuitOpenError: 熔断中，或半开状态下探测名额已满
+        """
+        if self.state == OPEN:
+            remaining = self._remaining_open_time()
+            if remaining > 0:
+                self.rejected_count += 1
+                raise CircuitOpenError(self.provider, remaining)
+            self.state = HALF_OPEN
+            self.half_open_in_flight = 0
+            logger.info(f"{self.provider} 熔断冷却结束，进入半开状态")
+
+        if self.state == HALF_OPEN:
+            if self.half_open_in_flight >= self.half_open_max_calls:
+                self.rejected_count += 1
+                raise CircuitOpenError(self.provider, 0.0)
+            self.half_open_in_flight += 1
+
+    def record_success(self, was_probe: bool):
+        """记录一次成功请求"""
+        if was_probe:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.outcomes.clear()
+                logger.info(f"{self.provider} 探测请求成功，熔断器恢复闭合")
+                return
+        self.outcomes.append(True)
+
+    def record_failure(self, was_probe: bool):
+        """记录一次失败请求，失败率超过阈值（或探测失败）时熔断"""
+        if was_probe:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            if self.state == HALF_OPEN:
+                self._open("探测请求失败")
+                return
+        self.outcomes.append(False)
+        if self.state != CLOSED or len(self.outcomes) < self.min_calls:
+            return
+        failure_rate = self.outcomes.count(False) / len(self.outcomes)
+        if failure_rate >= self.failure_rate_threshold:
+            self._open(f"最近 {len(self.outcomes)} 次请求失败率 {failure_rate:.0%}")
+
+    def record_cancelled(self, was_probe: bool):
+        """请求被取消：只归还探测名额，不计入成败"""
+        if was_probe:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    def _open(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.open_count += 1
+        self.outcomes.clear()
+        logger.warning(f"{self.provider} 熔断（{reason}），{self.open_seconds:g}s 内快速失败")
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        在熔断器保护下执行一次请求
+
+        Raises:
+            CircuitOpenError: 熔断中时不执行请求直接抛出
+        """
+        if not self.enabled:
+            yield
+            return
+        self.before_call()
+        was_probe = self.state == HALF_OPEN
+        started = time.monotonic()
+        try:
+            yield
+        except DeadlineExceeded:
+            # 调用方的时间预算用尽，与提供商健康无关
+            self.record_cancelled(was_probe)
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeout_count += 1
+                self.record_failure(was_probe)
+            else:
+                # 提供商正常给出了响应（如 4xx），视为健康
+                self.record_success(was_probe)
+            raise
+        except BaseException:
+            self.record_cancelled(was_probe)
+            raise
+        else:
+            if self.slow_call_seconds and time.monotonic() - started > self.slow_call_seconds:
+                self.timeout_count += 1
+                self.record_failure(was_probe)
+            else:
+                self.record_success(was_probe)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取熔断器状态快照"""
+        failures = self.outcomes.count(False)
+        return {
+            'state': self.state if self.enabled else 'disabled',
+            'recent_failure_rate': round(failures / len(self.outcomes), 4) if self.outcomes else 0.0,
+            'open_remaining_seconds': round(self._remaining_open_time(), 1) if self.state == OPEN else 0.0,
+            'open_count': self.open_count,
+            'rejected_count': self.rejected_count,
+            'timeout_count': self.timeout_count,
+        }
+
+
+# 进程级熔断器：{provider: (配置, 熔断器)}
+_breakers: Dict[str, Tuple[Dict[str, Any], CircuitBreaker]] = {}
+_lock = threading.Lock()
+
+
+def _get_breaker_config(provider: str) -> Dict[str, Any]:
+    """读取熔断配置：[circuit_breaker] 为全局默认，[circuit_breaker.<provider>] 为提供商级覆盖"""
+    breaker_config = config_manager.get('circuit_breaker', default={})
+    options = {k: v for k, v in breaker_config.items() if not isinstance(v, dict)}
+    options.update(breaker_config.get(provider, {}))
+    return options
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """
+    获取提供商的共享熔断器，熔断配置变化后重建
+
+    Args:
+        provider: 提供商名称
+
+    Returns:
+        该提供商的熔断器（[circuit_breaker] enabled = false 时为始终放行的熔断器）
+    """
+    options = _get_breaker_config(provider)
+    entry = _breakers.get(provider)
+    if entry and entry[0] == options:
+        return entry[1]
+
+    with _lock:
+        entry = _breakers.get(provider)
+        if entry and entry[0] == options:
+            return entry[1]
+        breaker = CircuitBreaker(
+            provider=provider,
+            enabled=options.get('enabled', True),
+            window=options.get('window', 20),
+            min_calls=options.get('min_calls', 5),
+            failure_rate_threshold=options.get('failure_rate_threshold', 0.5),
+            open_seconds=options.get('open_seconds', 30.0),
+            half_open_max_calls=options.get('half_open_max_calls', 1),
+            slow_call_seconds=options.get('slow_call_seconds', 0.0),
+        )
+        _breakers[provider] = (options, breaker)
+        return breaker
+
+
+def get_all_circuit_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有提供商熔断器的状态"""
+    return {provider: breaker.snapshot() for provider, (_, breaker) in _breakers.items()}
@@ -1,11 +1,20 @@
-import aiohttp
-import json
-from typing import List, Dict
+# llm_clients/deepseek_client.py
+from typing import List, Dict, Any, Optional, Tuple
 from .base_client import BaseLLMClient
 
 class DeepSeekClient(BaseLLMClient):
-    async def chat(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> str:
-        """DeepSeek 异步聊天实现"""
+    """DeepSeek 客户端"""
+    
+    display_name = "DeepSeek"
+    
+    def _build_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        search_whitelist: Optional[List[str]],
+        stream: bool
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """构造 DeepSeek 聊天请求（流式时使用 SSE）"""
         url = f"{self.base_url}/chat/completions"
         
         headers = {
@@ -19,12 +28,29 @@ class DeepSeekClient(BaseLLMClient):
             "temperature": self.temperature,
             "max_tokens": self.max_tokens
         }
+        if stream:
+            payload["stream"] = True
+            # 在最后一个事件中返回用量（含缓存命中Token数）
+            payload["stream_options"] = {"include_usage": True}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"DeepSeek API调用失败: {response.status} - {error_text}")
-                
-                result = await response.json()
-                return result["choices"][0]["message"]["content"]
+        return url, headers, payload
+    
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        return result["choices"][0]["message"]["content"]
+    
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> str:
+        choices = chunk.get("choices") or []
+        if not choices:
+            return ""
+        return choices[0].get("delta", {}).get("content") or ""
+    
+    def _parse_usage(self, result: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """DeepSeek 在 usage 中以 prompt_cache_hit_tokens 返回命中上下文缓存的输入Token数"""
+        usage = result.get("usage")
+        if not usage:
+            return None
+        return {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cached_tokens": usage.get("prompt_cache_hit_tokens", 0) or 0,
+        }
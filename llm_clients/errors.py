@@ -0,0 +1,44 @@
+# llm_clients/errors.py
+from typing import Optional
+
+
+class LLMAPIError(Exception):
+    """LLM 提供商返回非 200 状态码时抛出"""
+
+    def __init__(
+        self,
+        message: str,
+        provider: str,
+        status: int,
+        body: str = "",
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message)
+        self.provider = provider
+        self.status = status
+        self.body = body
+        # 服务端通过 Retry-After 建议的等待秒数
+        self.retry_after = retry_after
+        # 放弃前总共尝试的次数，由重试逻辑填写
+        self.attempts = 1
+
+
+class CircuitOpenError(Exception):
+    """提供商熔断期间快速失败时抛出"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} 已熔断，{retry_in:.1f}s 后允许探测请求")
+        self.provider = provider
+        # 距离允许探测的剩余秒数
+        self.retry_in = retry_in
+        self.attempts = 1
+
+
+class CassetteMissError(Exception):
+    """cassette 回放模式下找不到匹配的录制记录时抛出"""
+
+    def __init__(self, provider: str, key: str, path: str):
+        super().__init__(f"cassette {path} 中没有 {provider} 请求 {key[:12]} 的录制记录")
+        self.provider = provider
+        self.key = key
+        self.attempts = 1
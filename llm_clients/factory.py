@@ -1,12 +1,21 @@
 
 # llm_clients/factory.py
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Set, Tuple
 from .base_client import BaseLLMClient
 from .zhipu_client import ZhipuClient
 from .deepseek_client import DeepSeekClient
 from .gemini3_client import Gemini3Client
+from .retry import RetryPolicy
+from .hedging_client import HedgingClient
+from .routing_client import ROUTER_PROVIDER, RoutingClient
 from config.manager import config_manager
+import hashlib
+import json
+import logging
 import os
+import threading
+
+logger = logging.getLogger(__name__)
 
 class LLMClientFactory:
     _clients = {
@@ -15,6 +24,15 @@ class LLMClientFactory:
         'gemini3': Gemini3Client,
     }
     
+    # 进程级共享客户端：{provider: (配置指纹, 客户端)}
+    _instances: Dict[str, Tuple[str, BaseLLMClient]] = {}
+    # 配置指纹缓存：{provider: (配置版本号, 指纹)}
+    _fingerprints: Dict[str, Tuple[int, str]] = {}
+    # 可重入：构建对冲客户端时在锁内获取备用提供商的共享客户端
+    _lock = threading.RLock()
+    # 正在构建中的提供商，用于发现对冲备用提供商之间的循环引用
+    _building: Set[str] = set()
+    
     @classmethod
     def create_client(cls, provider: str) -> BaseLLMClient:
         """创建LLM客户端实例"""
@@ -36,10 +54,196 @@ class LLMClientFactory:
             base_url=config.get('base_url', ''),
             model=config.get('model', ''),
             temperature=config.get('temperature', 0.7),
-            max_tokens=config.get('max_tokens', 1024)
+            max_tokens=config.get('max_tokens', 1024),
+            provider=provider,
+            pool_options=cls._get_pool_options(provider),
+            retry_policy=RetryPolicy.from_dict(cls._get_section_options('retry', provider)),
+            timeout_options=cls._get_section_options('timeouts', provider)
         )
     
+    @classmethod
+    def _get_pool_options(cls, provider: str) -> Dict[str, Any]:
+        """
+        读取连接池配置：[http_pool] 为全局配置，[http_pool.<provider>] 为提供商级覆盖
+        
+        Args:
+            provider: LLM 提供商名称
+            
+        Returns:
+            连接池参数字典
+        """
+        return cls._get_section_options('http_pool', provider)
+    
+    @staticmethod
+    def _get_section_options(section: str, provider: str) -> Dict[str, Any]:
+        """读取“全局默认 + [section.<provider>] 覆盖”形式的配置节"""
+        section_config = config_manager.get(section, default={})
+        options = {k: v for k, v in section_config.items() if not isinstance(v, dict)}
+        options.update(section_config.get(provider, {}))
+        return options
+    
+    @classmethod
+    def get_client(cls, provider: str, agent_type: Optional[str] = None) -> BaseLLMClient:
+        """
+        获取提供商的共享客户端实例
+        
+        同一提供商在进程内只创建一个客户端，仅当 config_manager.reload() 后
+        该提供商的配置发生变化时才重建。provider 为 "router" 时返回多提供商路由客户端，
+        按 agent_type 应用 [routing.pinning] 中的固定提供商。
+        
+        Args:
+            provider: LLM 提供商名称
+            agent_type: Agent类型，仅对路由客户端生效
+            
+        Returns:
+            共享的LLM客户端实例
+        """
+        fingerprint = cls.get_config_fingerprint(provider)
+        key = f"{provider}:{agent_type or 'default'}" if provider == ROUTER_PROVIDER else provider
+        entry = cls._instances.get(key)
+        if entry and entry[0] == fingerprint:
+            return entry[1]
+        
+        if provider == ROUTER_PROVIDER:
+            # 路由客户端由各成员提供商的共享客户端组成，需在锁外获取以免重入
+            client = cls._build_routing_client(agent_type)
+            with cls._lock:
+                cls._instances[key] = (fingerprint, client)
+            return client
+        
+        with cls._lock:
+            entry = cls._instances.get(key)
+            if entry and entry[0] == fingerprint:
+                return entry[1]
+            if provider in cls._building:
+                raise ValueError(f"提供商 {provider} 的对冲配置存在循环引用")
+            cls._building.add(provider)
+            try:
+                client = cls._build_shared_client(provider)
+            finally:
+                cls._building.discard(provider)
+            cls._instances[key] = (fingerprint, client)
+            return client
+    
+    @classmethod
+    def _get_routing_providers(cls) -> List[str]:
+        """读取参与路由的提供商列表，默认为全部已注册的提供商"""
+        return list(config_manager.get('routing', 'providers', None) or cls._clients.keys())
+    
+    @classmethod
+    def _build_routing_client(cls, agent_type: Optional[str] = None) -> RoutingClient:
+        """
+        构建路由客户端，跳过未配置 API_KEY 等无法创建的提供商
+        
+        Args:
+            agent_type: Agent类型，用于查找 [routing.pinning] 中的固定提供商
+            
+        Returns:
+            路由客户端实例
+            
+        Raises:
+            ValueError: 没有任何可用的提供商时
+        """
+        clients = {}
+        for provider in cls._get_routing_providers():
+            try:
+                clients[provider] = cls.get_client(provider)
+            except ValueError as e:
+                logger.warning(f"提供商 {provider} 不参与路由: {e}")
+        
+        routing = config_manager.get('routing', default={})
+        pinned = routing.get('pinning', {}).get(agent_type) if agent_type else None
+        if pinned and pinned not in clients:
+            logger.warning(f"{agent_type} 固定的提供商 {pinned} 不可用，改为按评分路由")
+            pinned = None
+        return RoutingClient(
+            clients,
+            pinned_provider=pinned,
+            default_latency=routing.get('default_latency', 5.0),
+            max_failover=routing.get('max_failover', 1)
+        )
+    
+    @classmethod
+    def _build_shared_client(cls, provider: str) -> BaseLLMClient:
+        """
+        构建共享客户端，启用 [hedging] 时包装为对冲请求客户端
+
+        备用提供商使用其共享客户端；备用提供商无法创建（如未配置 API_KEY）时
+        只记录警告并返回不对冲的主客户端，可选配置不影响主提供商的使用。
+        
+        Args:
+            provider: LLM 提供商名称
+            
+        Returns:
+            LLM客户端实例
+        """
+        client = cls.create_client(provider)
+        hedging = cls._get_section_options('hedging', provider)
+        if not hedging.get('enabled', False):
+            return client
+        
+        secondary_provider = hedging.get('secondary_provider') or provider
+        secondary = client
+        if secondary_provider != provider:
+            try:
+                secondary = cls.get_client(secondary_provider)
+            except Exception as e:
+                logger.warning(f"对冲备用提供商 {secondary_provider} 不可用（{e}），{provider} 不启用对冲")
+                return client
+            # 备用提供商自身也启用对冲时只使用其主客户端，对冲请求不再二次对冲
+            if isinstance(secondary, HedgingClient):
+                secondary = secondary.primary
+        return HedgingClient(
+            primary=client,
+            secondary=secondary,
+            percentile=hedging.get('percentile', 95),
+            min_samples=hedging.get('min_samples', 20),
+            min_delay=hedging.get('min_delay', 2.0),
+            max_delay=hedging.get('max_delay', 60.0),
+            max_hedge_ratio=hedging.get('max_hedge_ratio', 0.1)
+        )
+    
+    @classmethod
+    def get_config_fingerprint(cls, provider: str) -> str:
+        """
+        计算提供商配置的指纹，配置版本号不变时直接复用上次结果
+        
+        Args:
+            provider: LLM 提供商名称
+            
+        Returns:
+            配置指纹（十六进制摘要）
+        """
+        version = config_manager.version
+        cached = cls._fingerprints.get(provider)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        if provider == ROUTER_PROVIDER:
+            providers = cls._get_routing_providers()
+        else:
+            providers = [provider]
+            # 对冲客户端持有备用提供商的客户端，备用提供商配置变化时一并重建
+            secondary = cls._get_section_options('hedging', provider).get('secondary_provider')
+            if secondary and secondary != provider:
+                providers.append(secondary)
+        relevant = {
+            'providers': {p: config_manager.get('llm_providers', p, {}) for p in providers},
+            'routing': config_manager.get('routing', default={}) if provider == ROUTER_PROVIDER else {},
+            'http_pool': config_manager.get('http_pool', default={}),
+            'retry': config_manager.get('retry', default={}),
+            'timeouts': config_manager.get('timeouts', default={}),
+            'hedging': config_manager.get('hedging', default={}),
+        }
+        fingerprint = hashlib.sha1(
+            json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        cls._fingerprints[provider] = (version, fingerprint)
+        return fingerprint
+    
     @classmethod
     def register_client(cls, name: str, client_class: type):
         """注册新的LLM客户端"""
         cls._clients[name] = client_class
+        cls._instances.pop(name, None)
+        cls._fingerprints.clear()
@@ -1,18 +1,36 @@
-import aiohttp
-import json
-from typing import List, Dict
+# llm_clients/gemini3_client.py
+from typing import List, Dict, Any, Optional, Tuple
 from .base_client import BaseLLMClient
 
 class Gemini3Client(BaseLLMClient):
-    async def chat(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> str:
-        """Gemini 1.5 Flash 异步聊天实现"""
-        url = f"{self.base_url}/v1beta/models/{model or self.model}:generateContent?key={self.api_key}"
+    """Gemini 客户端"""
+    
+    display_name = "Gemini"
+    
+    def _build_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        search_whitelist: Optional[List[str]],
+        stream: bool
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """构造 Gemini 请求，流式时使用 streamGenerateContent（SSE）"""
+        # base_url 已包含 API 版本（如 .../v1beta）
+        model_path = f"{self.base_url}/models/{model or self.model}"
+        if stream:
+            url = f"{model_path}:streamGenerateContent?alt=sse&key={self.api_key}"
+        else:
+            url = f"{model_path}:generateContent?key={self.api_key}"
         
         headers = {"Content-Type": "application/json"}
         
-        # 转换消息格式为 Gemini API 所需格式
+        # 转换消息格式为 Gemini API 所需格式，system 消息放入 systemInstruction
         contents = []
+        system_parts = []
         for msg in messages:
+            if msg["role"] == "system":
+                system_parts.append({"text": msg["content"]})
+                continue
             contents.append({
                 "role": "user" if msg["role"] == "user" else "model",
                 "parts": [{"text": msg["content"]}]
@@ -25,12 +43,28 @@ class Gemini3Client(BaseLLMClient):
                 "maxOutputTokens": self.max_tokens
             }
         }
+        if system_parts:
+            payload["systemInstruction"] = {"parts": system_parts}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Gemini API调用失败: {response.status} - {error_text}")
-                
-                result = await response.json()
-                return result["candidates"][0]["content"]["parts"][0]["text"]
+        return url, headers, payload
+    
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        return result["candidates"][0]["content"]["parts"][0]["text"]
+    
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> str:
+        candidates = chunk.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = candidates[0].get("content", {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+    
+    def _parse_usage(self, result: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """Gemini 在 usageMetadata 中返回用量，cachedContentTokenCount 为命中缓存的输入Token数"""
+        usage = result.get("usageMetadata")
+        if not usage:
+            return None
+        return {
+            "prompt_tokens": usage.get("promptTokenCount", 0),
+            "completion_tokens": usage.get("candidatesTokenCount", 0),
+            "cached_tokens": usage.get("cachedContentTokenCount", 0),
+        }
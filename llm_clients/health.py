@@ -0,0 +1,44 @@
+# llm_clients/health.py
+"""
+提供商健康快照
+汇总各提供商的熔断器状态、滚动调用统计与限流器状态
+"""
+
+from typing import Any, Dict
+
+from .circuit_breaker import HALF_OPEN, OPEN, get_all_circuit_breaker_stats
+from .rate_limiter import get_all_rate_limiter_stats
+from .stats import get_all_provider_stats
+
+# 最近错误率超过该值时视为降级
+DEGRADED_ERROR_RATE = 0.2
+
+
+def get_provider_health() -> Dict[str, Dict[str, Any]]:
+    """
+    获取所有已产生调用的提供商的健康快照
+
+    Returns:
+        {provider: {'status': healthy/degraded/down, 'circuit_breaker': ..., 'calls': ..., 'rate_limiter': ...}}
+    """
+    breakers = get_all_circuit_breaker_stats()
+    calls = get_all_provider_stats()
+    limiters = get_all_rate_limiter_stats()
+
+    health = {}
+    for provider in sorted(set(breakers) | set(calls) | set(limiters)):
+        breaker = breakers.get(provider, {})
+        call_stats = calls.get(provider, {})
+        if breaker.get('state') == OPEN:
+            status = 'down'
+        elif breaker.get('state') == HALF_OPEN or call_stats.get('recent_error_rate', 0.0) > DEGRADED_ERROR_RATE:
+            status = 'degraded'
+        else:
+            status = 'healthy'
+        health[provider] = {
+            'status': status,
+            'circuit_breaker': breaker,
+            'calls': call_stats,
+            'rate_limiter': limiters.get(provider, {}),
+        }
+    return health
@@ -0,0 +1,140 @@
+# llm_clients/hedging_client.py
+"""
+对冲请求客户端
+主请求在最近延迟的指定分位数内仍未返回时，向同一或备用提供商再发一份相同请求，
+采用先成功的结果并取消另一个，以压缩长尾延迟
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .base_client import BaseLLMClient
+from .stats import get_provider_stats
+
+logger = logging.getLogger(__name__)
+
+
+class HedgingClient(BaseLLMClient):
+    """在主客户端之上增加对冲请求的包装客户端"""
+
+    def __init__(
+        self,
+        primary: BaseLLMClient,
+        secondary: Optional[BaseLLMClient] = None,
+        percentile: float = 95,
+        min_samples: int = 20,
+        min_delay: float = 2.0,
+        max_delay: float = 60.0,
+        max_hedge_ratio: float = 0.1,
+    ):
+        """
+        Args:
+            primary: 主客户端
+            secondary: 对冲请求使用的客户端，默认与主客户端相同
+            percentile: 触发对冲的延迟分位数
+            min_samples: 延迟样本少于该值时以 max_delay 作为对冲等待时间
+            min_delay: 对冲等待时间下限（秒）
+            max_delay: 对冲等待时间上限（秒）
+            max_hedge_ratio: 对冲请求占总调用数的比例上限，防止放大故障期间的负载
+        """
+        # 对外暴露主客户端的参数，使响应缓存键、日志等与主提供商保持一致
+        super().__init__(
+            api_key=primary.api_key,
+            base_url=primary.base_url,
+            model=primary.model,
+            temperature=primary.temperature,
+            max_tokens=primary.max_tokens,
+            provider=primary.provider,
+        )
+        self.display_name = primary.display_name
+        self.primary = primary
+        self.secondary = secondary or primary
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.hedge_stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0}
+
+    def get_hedge_delay(self) -> float:
+        """根据主提供商最近的延迟分布计算对冲等待时间"""
+        latency = get_provider_stats(self.primary.provider).latency_percentile(
+            self.percentile, self.min_samples
+        )
+        if latency is None:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, latency))
+
+    def _hedge_allowed(self) -> bool:
+        return self.hedge_stats['hedged'] < self.max_hedge_ratio * self.hedge_stats['calls']
+
+    async def chat(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> str:
+        """
+        发送主请求，超过对冲等待时间仍未返回则发送对冲请求，返回先成功的结果
+        """
+        self.hedge_stats['calls'] += 1
+        delay = self.get_hedge_delay()
+        primary_task = asyncio.ensure_future(self.primary.chat(messages, model, search_whitelist))
+        pending = {primary_task}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done or not self._hedge_allowed():
+                return await primary_task
+
+            self.hedge_stats['hedged'] += 1
+            logger.info(
+                f"{self.primary.provider} 请求 {delay:.1f}s 未返回，向 {self.secondary.provider} 发送对冲请求"
+            )
+            # 备用提供商使用其自身的默认模型
+            hedge_model = model if self.secondary is self.primary else None
+            hedge_task = asyncio.ensure_future(self.secondary.chat(messages, hedge_model, search_whitelist))
+            pending = {primary_task, hedge_task}
+
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedge_stats['hedge_wins'] += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # 取消落败或未完成的请求（包括外部取消本次调用的情况），并等待其退出：
+            # 被取消的请求需要先释放限流并发槽位与熔断器探测名额，异常也在此取回
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def chat_stream(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> AsyncIterator[str]:
+        """流式调用不做对冲（首个片段已经交付给调用方），直接使用主客户端"""
+        async for chunk in self.primary.chat_stream(messages, model, search_whitelist):
+            yield chunk
+
+    def _build_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        search_whitelist: Optional[List[str]],
+        stream: bool
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """对冲客户端不直接发送请求，请求格式与主客户端一致"""
+        return self.primary._build_request(messages, model, search_whitelist, stream)
+
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        return self.primary._parse_response(result)
+
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> str:
+        return self.primary._parse_stream_chunk(chunk)
+
+    async def close(self):
+        await self.primary.close()
+        if self.secondary is not self.primary:
+            await self.secondary.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲统计"""
+        return {**self.hedge_stats, 'hedge_delay': round(self.get_hedge_delay(), 3)}
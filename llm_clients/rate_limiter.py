@@ -0,0 +1,275 @@
+# llm_clients/rate_limiter.py
+"""
+按提供商的限流与自适应并发控制
+- 令牌桶：每分钟请求数（RPM）与每分钟Token数（TPM）
+- AIMD 并发窗口：遇到 429/503 时乘性减小，成功时加性恢复
+所有等待均按先来先服务排队，同一提供商的全部客户端（跨 Orchestrator）共享同一个限流器
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from config.manager import config_manager
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 视为过载信号、需要收缩并发窗口的HTTP状态码
+OVERLOAD_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """令牌桶，按分钟速率匀速补充"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数
+            capacity: 桶容量（允许的突发量），默认等于每分钟速率
+        """
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        # asyncio.Lock 按获取顺序唤醒等待者，保证先来先服务
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        """
+        获取令牌，不足时排队等待
+
+        Args:
+            amount: 需要的令牌数，超过桶容量时按容量计算，避免永远无法满足
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate_per_second)
+
+    def refund(self, amount: float):
+        """归还多预扣的令牌（例如实际Token用量低于预估时）"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD 自适应并发窗口"""
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 16,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        Args:
+            initial: 初始并发窗口
+            minimum: 窗口下限
+            maximum: 窗口上限
+            decrease_factor: 过载时的乘性缩减系数
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.window = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._last_decrease_at = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """获取一个并发名额，窗口已满时排队等待"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.window))
+            self.in_flight += 1
+
+    async def release(self):
+        """释放并发名额"""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        """成功：每完成一个窗口的请求，窗口加 1"""
+        self.window = min(self.maximum, self.window + 1.0 / self.window)
+
+    def on_overload(self, admitted_at: Optional[float] = None) -> bool:
+        """
+        过载（429/503）：窗口乘性缩减
+
+        上次缩减之前就已发出的请求所带回的过载信号属于同一轮拥塞，不再重复缩减。
+
+        Args:
+            admitted_at: 该请求获得并发名额的时间（time.monotonic）
+
+        Returns:
+            是否实际缩减了窗口
+        """
+        if admitted_at is not None and admitted_at < self._last_decrease_at:
+            return False
+        self.window = max(self.minimum, self.window * self.decrease_factor)
+        self._last_decrease_at = time.monotonic()
+        return True
+
+
+class ProviderRateLimiter:
+    """单个提供商的限流器：RPM、TPM 令牌桶 + AIMD 并发窗口"""
+
+    def __init__(
+        self,
+        provider: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        Args:
+            provider: 提供商名称
+            requests_per_minute: 每分钟请求数上限，为空或 0 表示不限制
+            tokens_per_minute: 每分钟Token数上限，为空或 0 表示不限制
+            initial_concurrency / min_concurrency / max_concurrency: 并发窗口参数
+            decrease_factor: 过载时的窗口缩减系数
+        """
+        self.provider = provider
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=initial_concurrency,
+            minimum=min_concurrency,
+            maximum=max_concurrency,
+            decrease_factor=decrease_factor,
+        )
+        self.total_wait_seconds = 0.0
+        self.overload_count = 0
+
+    @asynccontextmanager
+    async def limit(self, estimated_tokens: int = 0) -> AsyncIterator[float]:
+        """
+        在限流约束内执行一次调用
+
+        依次等待 RPM 令牌、TPM 令牌和并发名额，退出时释放并发名额。
+
+        Args:
+            estimated_tokens: 本次调用预估消耗的Token数（输入 + 最大输出）
+
+        Yields:
+            获得并发名额的时间（time.monotonic），调用 record_result 时传回
+        """
+        started = time.monotonic()
+        if self.request_bucket is not None:
+            await self.request_bucket.acquire(1)
+        if self.token_bucket is not None and estimated_tokens > 0:
+            await self.token_bucket.acquire(estimated_tokens)
+        await self.concurrency.acquire()
+
+        admitted_at = time.monotonic()
+        waited = admitted_at - started
+        self.total_wait_seconds += waited
+        if waited > 1.0:
+            logger.info(f"{self.provider} 限流排队 {waited:.2f}s")
+        tracer.record_span("llm.queue_wait", waited, provider=self.provider)
+        try:
+            yield admitted_at
+        finally:
+            await self.concurrency.release()
+
+    def record_result(self, status: Optional[int], admitted_at: Optional[float] = None):
+        """
+        根据调用结果调整并发窗口
+
+        Args:
+            status: HTTP状态码，网络异常等无状态码的情况传 None（不调整窗口）
+            admitted_at: limit() 产出的获得并发名额时间
+        """
+        if status is None:
+            return
+        if status in OVERLOAD_STATUSES:
+            self.overload_count += 1
+            if self.concurrency.on_overload(admitted_at):
+                logger.warning(
+                    f"{self.provider} 返回 {status}，并发窗口缩减至 {int(self.concurrency.window)}"
+                )
+        elif 200 <= status < 300:
+            self.concurrency.on_success()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流器当前状态"""
+        return {
+            'concurrency_window': int(self.concurrency.window),
+            'in_flight': self.concurrency.in_flight,
+            'overload_count': self.overload_count,
+            'total_wait_seconds': round(self.total_wait_seconds, 3),
+            'request_tokens_available': (
+                round(self.request_bucket.available, 1) if self.request_bucket else None
+            ),
+            'token_budget_available': (
+                round(self.token_bucket.available) if self.token_bucket else None
+            ),
+        }
+
+
+# 进程级限流器：{provider: (配置, 事件循环, 限流器)}
+_limiters: Dict[str, Tuple[Dict[str, Any], asyncio.AbstractEventLoop, ProviderRateLimiter]] = {}
+
+
+def _get_rate_limit_config(provider: str) -> Dict[str, Any]:
+    """读取限流配置：[rate_limits] 为全局默认，[rate_limits.<provider>] 为提供商级覆盖"""
+    rate_config = config_manager.get('rate_limits', default={})
+    options = {k: v for k, v in rate_config.items() if not isinstance(v, dict)}
+    options.update(rate_config.get(provider, {}))
+    return options
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """
+    获取提供商的共享限流器，限流配置变化或事件循环变化后重建
+
+    Args:
+        provider: 提供商名称
+
+    Returns:
+        该提供商的限流器
+    """
+    options = _get_rate_limit_config(provider)
+    loop = asyncio.get_running_loop()
+    entry = _limiters.get(provider)
+    if entry and entry[0] == options and entry[1] is loop:
+        return entry[2]
+
+    limiter = ProviderRateLimiter(
+        provider=provider,
+        requests_per_minute=options.get('requests_per_minute'),
+        tokens_per_minute=options.get('tokens_per_minute'),
+        initial_concurrency=options.get('initial_concurrency', 8),
+        min_concurrency=options.get('min_concurrency', 1),
+        max_concurrency=options.get('max_concurrency', 16),
+        decrease_factor=options.get('decrease_factor', 0.5),
+    )
+    _limiters[provider] = (options, loop, limiter)
+    logger.info(f"已为 {provider} 创建限流器: {options}")
+    return limiter
+
+
+def get_all_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有提供商限流器的状态"""
+    return {provider: limiter.get_stats() for provider, (_, _, limiter) in _limiters.items()}
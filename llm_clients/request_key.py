@@ -0,0 +1,36 @@
+# llm_clients/request_key.py
+"""
+请求哈希的公共处理
+响应缓存与 cassette 都以请求内容的哈希作为键。Prompt 中嵌入的分析时间（精确到秒）
+会让同一请求每次得到不同的哈希，计算前需要先把这类易变内容抹掉。
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Iterable, List, Optional, Pattern
+
+# 默认在计算请求哈希前抹掉 Prompt 中的分析时间，否则不同时间的同一请求无法匹配
+DEFAULT_IGNORE_PATTERNS = [r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}"]
+
+
+def compile_ignore_patterns(patterns: Optional[Iterable[str]] = None) -> List[Pattern]:
+    """编译需要抹掉的正则，为 None 时使用 DEFAULT_IGNORE_PATTERNS"""
+    return [re.compile(p) for p in (DEFAULT_IGNORE_PATTERNS if patterns is None else patterns)]
+
+
+def hash_request(material: Any, ignore_patterns: Iterable[Pattern] = ()) -> str:
+    """
+    将请求内容序列化为 JSON，抹掉易变内容后计算哈希
+
+    Args:
+        material: 可 JSON 序列化的请求内容
+        ignore_patterns: 需要替换为 "*" 的正则
+
+    Returns:
+        SHA-256 十六进制摘要
+    """
+    text = json.dumps(material, ensure_ascii=False, sort_keys=True)
+    for pattern in ignore_patterns:
+        text = pattern.sub("*", text)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -0,0 +1,311 @@
+# llm_clients/response_cache.py
+"""
+LLM 响应缓存
+内容寻址（请求参数与消息的哈希）的两级缓存：内存 LRU + 磁盘 SQLite，
+支持按Agent类型设置TTL、按容量淘汰以及命中率统计。
+计算哈希前抹掉 Prompt 中的分析时间等易变内容，否则嵌入了当前时间的请求永远无法命中。
+"""
+
+import asyncio
+import copy
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+from config.manager import config_manager
+from .request_key import compile_ignore_patterns, hash_request
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """LLM 响应的两级缓存（内存 LRU + SQLite）"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        memory_max_entries: int = 256,
+        memory_max_bytes: int = 32 * 1024 * 1024,
+        disk_path: Optional[str] = ".cache/llm_responses.sqlite3",
+        disk_max_bytes: int = 256 * 1024 * 1024,
+        default_ttl: int = 3600,
+        ttls: Optional[Dict[str, int]] = None,
+        ignore_patterns: Optional[Iterable[str]] = None,
+    ):
+        """
+        初始化响应缓存
+
+        Args:
+            enabled: 是否启用缓存
+            memory_max_entries: 内存层最多保存的条目数
+            memory_max_bytes: 内存层最多占用的字节数
+            disk_path: SQLite 文件路径，为空则不启用磁盘层
+            disk_max_bytes: 磁盘层最多保存的响应字节数
+            default_ttl: 未单独配置的Agent类型使用的TTL（秒）
+            ttls: 按Agent类型设置的TTL（秒）
+            ignore_patterns: 计算缓存键前从消息中抹掉的正则，为空时抹掉精确到秒的时间
+        """
+        self.enabled = enabled
+        self.memory_max_entries = memory_max_entries
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.disk_max_bytes = disk_max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.ignore_patterns: List[Pattern] = compile_ignore_patterns(ignore_patterns)
+
+        # 内存层：{key: (过期时间, 响应, 字节数)}，按访问顺序排列
+        self._memory: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+
+    @classmethod
+    def from_config(cls) -> "ResponseCache":
+        """根据 settings.toml 的 [cache] 节创建缓存实例"""
+        cache_config = config_manager.get('cache', default={})
+        disk_path = None
+        if cache_config.get('disk_enabled', True):
+            disk_path = cache_config.get('disk_path', ".cache/llm_responses.sqlite3")
+        return cls(
+            enabled=cache_config.get('enabled', False),
+            memory_max_entries=cache_config.get('memory_max_entries', 256),
+            memory_max_bytes=int(cache_config.get('memory_max_mb', 32) * 1024 * 1024),
+            disk_path=disk_path,
+            disk_max_bytes=int(cache_config.get('disk_max_mb', 256) * 1024 * 1024),
+            default_ttl=cache_config.get('default_ttl', 3600),
+            ttls=cache_config.get('ttl', {}),
+            ignore_patterns=cache_config.get('ignore_patterns'),
+        )
+
+    def make_key(
+        self,
+        provider: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        search_whitelist: Optional[List[str]],
+        messages: List[Dict[str, str]],
+    ) -> str:
+        """
+        根据请求参数与完整消息计算缓存键（抹掉 ignore_patterns 匹配的内容）
+
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        return hash_request(
+            {
+                'provider': provider,
+                'model': model,
+                'temperature': temperature,
+                'max_tokens': max_tokens,
+                'search_whitelist': search_whitelist or [],
+                'messages': messages,
+            },
+            self.ignore_patterns
+        )
+
+    def get_ttl(self, agent_type: Optional[str]) -> int:
+        """获取指定Agent类型的缓存TTL（秒）"""
+        return self.ttls.get(agent_type, self.default_ttl)
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存，依次查询内存层和磁盘层
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的响应，未命中或已过期时返回 None
+        """
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return value
+            self._remove_from_memory(key)
+
+        if self.disk_path is not None:
+            try:
+                row = await asyncio.to_thread(self._disk_get, key, now)
+            except Exception as e:
+                logger.error(f"读取磁盘缓存失败: {e}")
+                row = None
+            if row is not None:
+                value, expires_at = row
+                self._put_memory(key, value, expires_at)
+                self._stats['disk_hits'] += 1
+                return value
+
+        self._stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: int):
+        """
+        写入缓存（同时写入内存层和磁盘层）
+
+        Args:
+            key: 缓存键
+            value: 响应内容
+            ttl: 有效期（秒），不大于 0 时不缓存
+        """
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._put_memory(key, value, expires_at)
+        self._stats['sets'] += 1
+        if self.disk_path is not None:
+            try:
+                await asyncio.to_thread(self._disk_set, key, value, expires_at)
+            except Exception as e:
+                # 磁盘层故障不影响主流程，仅退化为内存缓存
+                logger.error(f"写入磁盘缓存失败: {e}")
+
+    def clear(self):
+        """清空内存层和磁盘层"""
+        self._memory.clear()
+        self._memory_bytes = 0
+        if self.disk_path is not None:
+            with self._db_lock:
+                db = self._connect()
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中/未命中等统计信息"""
+        lookups = self._stats['memory_hits'] + self._stats['disk_hits'] + self._stats['misses']
+        hits = self._stats['memory_hits'] + self._stats['disk_hits']
+        return {
+            **self._stats,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+        }
+
+    # ------------------------------------------------------------------
+    # 内存层
+    # ------------------------------------------------------------------
+
+    def _put_memory(self, key: str, value: str, expires_at: float):
+        """写入内存层并按条目数与字节数淘汰最久未使用的条目"""
+        self._remove_from_memory(key)
+        size = len(value.encode('utf-8'))
+        if size > self.memory_max_bytes:
+            return
+        self._memory[key] = (expires_at, value, size)
+        self._memory_bytes += size
+        while self._memory and (
+            len(self._memory) > self.memory_max_entries
+            or self._memory_bytes > self.memory_max_bytes
+        ):
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self._stats['memory_evictions'] += 1
+
+    def _remove_from_memory(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    # ------------------------------------------------------------------
+    # 磁盘层（在线程池中执行，避免阻塞事件循环）
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.disk_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+            )
+            self._db.commit()
+            logger.info(f"磁盘缓存已打开: {self.disk_path}")
+        return self._db
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                return None
+            db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+            return row[0], row[1]
+
+    def _disk_set(self, key: str, value: str, expires_at: float):
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, now),
+            )
+            # 先清理过期条目，再按最久未访问淘汰直到总大小不超过上限
+            db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.disk_max_bytes:
+                rows = db.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                ).fetchall()
+                for evict_key, evict_size in rows:
+                    if total <= self.disk_max_bytes:
+                        break
+                    db.execute("DELETE FROM responses WHERE key = ?", (evict_key,))
+                    total -= evict_size
+                    self._stats['disk_evictions'] += 1
+            db.commit()
+
+
+# 全局响应缓存：(配置版本号, [cache] 配置, 缓存实例)
+_response_cache: Optional[Tuple[int, Dict[str, Any], ResponseCache]] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """获取全局响应缓存，配置重新加载后 [cache] 节发生变化时重建"""
+    global _response_cache
+    version = config_manager.version
+    if _response_cache is not None and _response_cache[0] == version:
+        return _response_cache[2]
+    options = config_manager.get('cache', default={}) or {}
+    if _response_cache is not None and _response_cache[1] == options:
+        # 其他配置变化时保留已缓存的内容
+        _response_cache = (version, _response_cache[1], _response_cache[2])
+        return _response_cache[2]
+    if _response_cache is not None:
+        logger.info("[cache] 配置已变化，重建LLM响应缓存")
+    cache = ResponseCache.from_config()
+    _response_cache = (version, copy.deepcopy(options), cache)
+    return cache
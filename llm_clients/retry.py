@@ -0,0 +1,88 @@
+# llm_clients/retry.py
+"""
+LLM 调用的重试策略
+区分可重试的状态码与网络错误，采用带全抖动的指数退避，
+优先遵循服务端的 Retry-After，并限制单次调用的总重试时间
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+from .errors import LLMAPIError
+
+# 默认可重试的HTTP状态码：超时、限流与服务端临时故障
+DEFAULT_RETRYABLE_STATUSES = (408, 409, 425, 429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头
+
+    Args:
+        value: 响应头的值，可以是秒数或 HTTP 日期
+
+    Returns:
+        需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class RetryPolicy:
+    """重试策略"""
+    max_attempts: int = 3              # 最大尝试次数（含首次）
+    base_delay: float = 0.5            # 指数退避的基础延迟（秒）
+    max_delay: float = 20.0            # 单次退避的最大延迟（秒）
+    max_total_time: float = 90.0       # 从首次尝试开始的总时间上限（秒）
+    retryable_statuses: Tuple[int, ...] = field(default=DEFAULT_RETRYABLE_STATUSES)
+
+    @classmethod
+    def from_dict(cls, options: Dict[str, Any]) -> "RetryPolicy":
+        """根据配置字典创建策略，未配置的项使用默认值"""
+        return cls(
+            max_attempts=options.get('max_attempts', 3),
+            base_delay=options.get('base_delay', 0.5),
+            max_delay=options.get('max_delay', 20.0),
+            max_total_time=options.get('max_total_time', 90.0),
+            retryable_statuses=tuple(options.get('retryable_statuses', DEFAULT_RETRYABLE_STATUSES)),
+        )
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """
+        判断错误是否值得重试
+
+        可重试：配置的状态码、连接/读取类网络错误、超时。
+        """
+        if isinstance(error, LLMAPIError):
+            return error.status in self.retryable_statuses
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    def compute_delay(self, attempt: int, error: BaseException) -> float:
+        """
+        计算第 attempt 次失败后的等待时间
+
+        服务端给出 Retry-After 时以其为准，否则使用全抖动指数退避：
+        uniform(0, min(max_delay, base_delay * 2^(attempt-1)))。
+        """
+        if isinstance(error, LLMAPIError) and error.retry_after is not None:
+            return error.retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
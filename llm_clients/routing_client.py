@@ -0,0 +1,168 @@
+# llm_clients/routing_client.py
+"""
+多提供商路由客户端
+根据各提供商最近的延迟、错误率与在途请求数，为每次调用选择当前最优的提供商，
+可按Agent固定提供商，失败时按评分顺序切换到下一个提供商
+"""
+
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from utils.deadline import DeadlineExceeded, remaining
+from .base_client import BaseLLMClient
+from .circuit_breaker import get_circuit_breaker
+from .errors import CircuitOpenError
+from .rate_limiter import get_rate_limiter
+from .stats import get_provider_stats
+
+logger = logging.getLogger(__name__)
+
+# 在配置中代表“路由客户端”的提供商名称
+ROUTER_PROVIDER = "router"
+
+
+class RoutingClient(BaseLLMClient):
+    """在多个提供商之间按实时表现路由请求的客户端"""
+
+    def __init__(
+        self,
+        clients: Dict[str, BaseLLMClient],
+        pinned_provider: Optional[str] = None,
+        default_latency: float = 5.0,
+        max_failover: int = 1,
+    ):
+        """
+        Args:
+            clients: 候选提供商的客户端 {provider: client}，顺序即同分时的优先级
+            pinned_provider: 固定使用的提供商（仍会在其失败时切换），为空则按评分选择
+            default_latency: 尚无延迟样本时假设的延迟（秒）
+            max_failover: 一次调用失败后最多再尝试几个其他提供商
+        """
+        if not clients:
+            raise ValueError("路由客户端至少需要一个可用的提供商")
+        if pinned_provider and pinned_provider not in clients:
+            raise ValueError(f"固定的提供商 {pinned_provider} 不在路由候选中: {', '.join(clients)}")
+
+        first = clients[pinned_provider] if pinned_provider else next(iter(clients.values()))
+        super().__init__(
+            api_key="",
+            base_url="",
+            model=first.model,
+            temperature=first.temperature,
+            max_tokens=first.max_tokens,
+            provider=ROUTER_PROVIDER,
+        )
+        self.display_name = "Router"
+        self.clients = clients
+        self.pinned_provider = pinned_provider
+        self.default_latency = default_latency
+        self.max_failover = max_failover
+        self.route_counts: Dict[str, int] = {provider: 0 for provider in clients}
+
+    def score(self, provider: str) -> float:
+        """
+        计算提供商的评分（越小越好）
+
+        评分 = 预期延迟 × (1 + 并发负载) / 成功率
+        - 预期延迟：最近成功调用的 p50，无样本时使用 default_latency
+        - 并发负载：(在途请求数 + 1) / 限流器当前并发窗口，接近或超过 1 表示将要排队；
+          RPM 令牌已耗尽时再加 1
+        - 成功率：1 - 最近错误率（下限 0.05）
+        """
+        stats = get_provider_stats(provider)
+        latency = stats.latency_percentile(50)
+        if latency is None:
+            latency = self.default_latency
+        limiter = get_rate_limiter(provider)
+        load = (stats.in_flight + 1) / max(1, int(limiter.concurrency.window))
+        if limiter.request_bucket is not None and limiter.request_bucket.available < 1:
+            load += 1.0
+        success_rate = max(0.05, 1.0 - stats.error_rate)
+        return latency * (1.0 + load) / success_rate
+
+    def rank_providers(self) -> List[str]:
+        """
+        按评分排序候选提供商
+
+        熔断中的提供商排在最后；固定的提供商未熔断时始终排在首位。
+        """
+        available = {provider: get_circuit_breaker(provider).is_available() for provider in self.clients}
+        ranked = sorted(self.clients, key=lambda provider: (not available[provider], self.score(provider)))
+        if self.pinned_provider and available[self.pinned_provider]:
+            ranked.remove(self.pinned_provider)
+            ranked.insert(0, self.pinned_provider)
+        return ranked
+
+    async def chat(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> str:
+        """
+        将调用路由到评分最优的提供商，失败时按评分顺序切换
+
+        只有换一个提供商可能成功的错误才切换（见 _should_failover）；
+        各提供商使用其自身配置的模型，model 参数仅在固定提供商时生效。
+        """
+        candidates = self.rank_providers()[:1 + self.max_failover]
+        last_error: Optional[Exception] = None
+        for provider in candidates:
+            self.route_counts[provider] += 1
+            provider_model = model if provider == self.pinned_provider else None
+            try:
+                return await self.clients[provider].chat(messages, provider_model, search_whitelist)
+            except Exception as e:
+                if not self._should_failover(provider, e):
+                    raise
+                last_error = e
+                if provider != candidates[-1]:
+                    logger.warning(f"路由到 {provider} 的调用失败（{e}），切换到下一个提供商")
+        raise last_error
+
+    def _should_failover(self, provider: str, error: Exception) -> bool:
+        """
+        判断失败后是否切换到下一个提供商
+
+        切换：该提供商重试策略认为可重试的错误（限流、5xx、超时）、熔断与网络错误。
+        不切换：截止时间已到（剩余时间不足以再调用一次），以及不可重试的 4xx 等
+        请求本身的问题（换提供商同样会失败）。
+        """
+        if isinstance(error, DeadlineExceeded):
+            return False
+        left = remaining()
+        if left is not None and left <= 0:
+            return False
+        if isinstance(error, (CircuitOpenError, aiohttp.ClientError)):
+            return True
+        return self.clients[provider].retry_policy.is_retryable(error)
+
+    async def chat_stream(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> AsyncIterator[str]:
+        """流式调用路由到评分最优的提供商（开始输出后不再切换）"""
+        provider = self.rank_providers()[0]
+        self.route_counts[provider] += 1
+        provider_model = model if provider == self.pinned_provider else None
+        async for chunk in self.clients[provider].chat_stream(messages, provider_model, search_whitelist):
+            yield chunk
+
+    def _build_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        search_whitelist: Optional[List[str]],
+        stream: bool
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """路由客户端不直接发送请求，chat / chat_stream 转发给各提供商的客户端，由其构造各自格式的请求"""
+        raise NotImplementedError("路由客户端不直接发送请求")
+
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        raise NotImplementedError("路由客户端不直接解析响应")
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取路由统计：各提供商的调用次数与当前评分"""
+        return {
+            'pinned_provider': self.pinned_provider,
+            'route_counts': dict(self.route_counts),
+            'scores': {provider: round(self.score(provider), 3) for provider in self.clients},
+        }
@@ -0,0 +1,182 @@
+# llm_clients/stats.py
+"""
+按提供商的调用统计
+滚动窗口内的延迟分布、错误率以及当前在途请求数，供对冲请求、路由与健康检查使用；
+另外累计提供商返回的Token用量，以及输入命中前缀缓存的Token数与对应的延迟
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from utils.deadline import DeadlineExceeded
+
+
+class ProviderStats:
+    """单个提供商的滚动调用统计"""
+
+    def __init__(self, provider: str, window: int = 200):
+        """
+        Args:
+            provider: 提供商名称
+            window: 滚动窗口大小（最近多少次调用）
+        """
+        self.provider = provider
+        self.latencies: deque = deque(maxlen=window)   # 最近成功调用的耗时（秒）
+        self.outcomes: deque = deque(maxlen=window)    # 最近调用结果，True 表示成功
+        self.in_flight = 0
+        self.total_calls = 0
+        self.total_errors = 0
+        # 提供商返回的Token用量累计
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.usage_calls = 0
+        self.cache_hit_calls = 0
+        # 最近调用的耗时，按输入是否命中前缀缓存区分
+        self.cache_hit_latencies: deque = deque(maxlen=window)
+        self.cache_miss_latencies: deque = deque(maxlen=window)
+
+    def record_start(self):
+        """记录一次调用开始"""
+        self.in_flight += 1
+        self.total_calls += 1
+
+    def record_success(self, latency: float):
+        """记录一次成功调用"""
+        self.in_flight -= 1
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        self.in_flight -= 1
+        self.total_errors += 1
+        self.outcomes.append(False)
+
+    def record_usage(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        latency: Optional[float] = None
+    ):
+        """
+        记录一次调用的Token用量
+
+        Args:
+            prompt_tokens: 输入Token数
+            completion_tokens: 输出Token数
+            cached_tokens: 输入中命中提供商前缀缓存的Token数
+            latency: 该次调用的耗时（秒）
+        """
+        self.usage_calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        if cached_tokens > 0:
+            self.cache_hit_calls += 1
+        if latency is not None:
+            (self.cache_hit_latencies if cached_tokens > 0 else self.cache_miss_latencies).append(latency)
+
+    def record_cancelled(self):
+        """记录一次被取消的调用（如对冲中落败的请求），不计入成功率"""
+        self.in_flight -= 1
+
+    @contextmanager
+    def track(self):
+        """
+        统计一次调用：正常结束记为成功，抛出异常记为失败，
+        被取消（CancelledError/GeneratorExit）或超过截止时间不计入成败
+        """
+        self.record_start()
+        started = time.monotonic()
+        try:
+            yield
+        except DeadlineExceeded:
+            # 调用方的时间预算用尽，不代表提供商出错
+            self.record_cancelled()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.record_cancelled()
+            raise
+        else:
+            self.record_success(time.monotonic() - started)
+
+    def latency_percentile(self, percentile: float, min_samples: int = 1) -> Optional[float]:
+        """
+        计算最近成功调用的延迟分位数
+
+        Args:
+            percentile: 分位数（0-100）
+            min_samples: 样本数少于该值时返回 None
+
+        Returns:
+            延迟（秒），样本不足时为 None
+        """
+        if len(self.latencies) < max(1, min_samples):
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+    @staticmethod
+    def _median(values: deque) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[(len(ordered) - 1) // 2], 3)
+
+    @property
+    def error_rate(self) -> float:
+        """最近窗口内的错误率"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取统计快照"""
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            'in_flight': self.in_flight,
+            'total_calls': self.total_calls,
+            'total_errors': self.total_errors,
+            'recent_error_rate': round(self.error_rate, 4),
+            'latency_p50': round(p50, 3) if p50 is not None else None,
+            'latency_p95': round(p95, 3) if p95 is not None else None,
+            'samples': len(self.latencies),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cached_prompt_tokens': self.cached_tokens,
+            'prompt_cache_hit_rate': round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None,
+            'cache_hit_calls': self.cache_hit_calls,
+            'usage_calls': self.usage_calls,
+            'latency_p50_cache_hit': self._median(self.cache_hit_latencies),
+            'latency_p50_cache_miss': self._median(self.cache_miss_latencies),
+        }
+
+
+# 进程级统计表
+_provider_stats: Dict[str, ProviderStats] = {}
+_lock = threading.Lock()
+
+
+def get_provider_stats(provider: str) -> ProviderStats:
+    """获取（必要时创建）提供商的统计对象"""
+    stats = _provider_stats.get(provider)
+    if stats is None:
+        with _lock:
+            stats = _provider_stats.setdefault(provider, ProviderStats(provider))
+    return stats
+
+
+def get_all_provider_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有提供商的统计快照"""
+    return {provider: stats.snapshot() for provider, stats in _provider_stats.items()}
@@ -1,12 +1,20 @@
 # llm_clients/zhipu_client.py
-import aiohttp
-import json
-from typing import List, Dict
+from typing import List, Dict, Any, Optional, Tuple
 from .base_client import BaseLLMClient
 
 class ZhipuClient(BaseLLMClient):
-    async def chat(self, messages: List[Dict[str, str]], model: str = None, search_whitelist: List[str] = None) -> str:
-        """智谱AI聊天实现"""
+    """智谱AI客户端"""
+    
+    display_name = "智谱"
+    
+    def _build_request(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        search_whitelist: Optional[List[str]],
+        stream: bool
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """构造智谱AI聊天请求"""
         url = f"{self.base_url}/chat/completions"
         
         headers = {
@@ -20,6 +28,8 @@ class ZhipuClient(BaseLLMClient):
             "temperature": self.temperature,
             "max_tokens": self.max_tokens
         }
+        if stream:
+            payload["stream"] = True
         
         # 如果有搜索白名单，添加到payload中
         if search_whitelist:
@@ -31,11 +41,24 @@ class ZhipuClient(BaseLLMClient):
                 }
             }]
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"智谱API调用失败: {response.status} - {error_text}")
-                
-                result = await response.json()
-                return result["choices"][0]["message"]["content"]
+        return url, headers, payload
+    
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        return result["choices"][0]["message"]["content"]
+    
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> str:
+        choices = chunk.get("choices") or []
+        if not choices:
+            return ""
+        return choices[0].get("delta", {}).get("content") or ""
+    
+    def _parse_usage(self, result: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """智谱在 usage.prompt_tokens_details.cached_tokens 中返回命中缓存的输入Token数"""
+        usage = result.get("usage")
+        if not usage:
+            return None
+        return {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0,
+        }
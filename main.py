@@ -10,8 +10,11 @@ async def main():
         {"role": "user", "content": "你好，请介绍一下你自己"}
     ]
     
-    response = await client.chat(messages)
-    print(f"{provider} 回复: {response}")
+    try:
+        response = await client.chat(messages)
+        print(f"{provider} 回复: {response}")
+    finally:
+        await client.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,21 +1,60 @@
 # server.py
 
 import asyncio
+import json
+import logging
+import time
 import traceback
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
 
 # 使用 FastMCP 库，这是 fastmcp 工具推荐的现代用法
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
 
 # 导入我们项目中的模块
 # 注意：这里的导入路径要和你项目中的实际路径匹配
-from agents import OrchestratorAgent
+from agents import agent_registry
 from config.manager import config_manager
+from data_service import data_service
+from llm_clients.base_client import BaseLLMClient
+from llm_clients.cassette import OFF as CASSETTE_OFF, get_cassette
+from llm_clients.health import get_provider_health
+from llm_clients.response_cache import get_response_cache
+from utils.deadline import DeadlineExceeded, deadline_scope, remaining
+from utils.loop_watchdog import loop_watchdog
+from utils.profiling import format_profile_note, profile_request
+from utils.prompt_loader import prompt_loader
+from utils.tracing import resolve_export_path, tracer
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """
+    服务生命周期：启动时校验Prompt模板、预构建共享Agent并启动事件循环监控与Prompt自动重载，
+    退出时停止这些后台任务，关闭所有LLM提供商的共享HTTP连接池与数据服务
+    """
+    agent_registry.validate_prompts()
+    agent_registry.warm_up()
+    if config_manager.get('watchdog', 'enabled', True):
+        loop_watchdog.start()
+    prompt_loader.start_auto_reload()
+    try:
+        yield
+    finally:
+        await prompt_loader.stop_auto_reload()
+        await loop_watchdog.stop()
+        await BaseLLMClient.close_all()
+        await data_service.close()
+
 
 # 1. 实例化 FastMCP 服务器
 #    "commodity-analysis-server" 是你的服务器名称，会显示在 inspector 中
-mcp = FastMCP("commodity-analysis-server")
+mcp = FastMCP("commodity-analysis-server", lifespan=lifespan)
 
 # ==============================================================================
 #  工具类别: [智能分析]
@@ -25,41 +64,52 @@ mcp = FastMCP("commodity-analysis-server")
 async def comprehensive_analysis(
     commodity_name: str,
     content: str = "",
-    analysis_types: List[str] = ["basis", "macro", "industry", "price", "factory", "social", "strategy_design"]
+    analysis_types: List[str] = ["basis", "macro", "industry", "price", "factory", "social", "strategy_design"],
+    timeout_seconds: Optional[float] = None,
+    profile: bool = False,
+    ctx: Optional[Context] = None
 ) -> str:
     """
     [分析] 对指定商品进行全面分析，包括基差、宏观、产业基本面和价格分析。
+    每完成一项分析即通过进度通知和日志消息推送该项结果，最终返回完整报告。
+    超过截止时间仍未完成的分析会被取消，综合分析基于已完成的部分生成并标注缺失项。
 
     Args:
         commodity_name: 商品名称，例如：豆粕、铜、原油。
         content: 用于分析的市场数据、新闻或文本内容。如果为空，Agent将尝试通过网络搜索获取信息。
         analysis_types: 指定要执行的分析类型列表，可选值: ["basis", "macro", "industry", "price", "factory", "social", "strategy_design"]。默认执行所有类型。
+        timeout_seconds: 本次调用的截止时间（秒），默认使用配置 [timeouts] default_deadline。
+        profile: 是否对本次调用进行性能剖析，结果保存到 [profiling] output_dir。
     """
     try:
         if not commodity_name or not commodity_name.strip():
             return "错误：'commodity_name' 参数不能为空。"
 
-        # 从配置中获取默认的LLM提供商来初始化Orchestrator
+        # 从配置中获取默认的LLM提供商，复用进程内共享的Orchestrator
         default_llm = config_manager.get('agents', 'default_llm', 'zhipu')
-        orchestrator = OrchestratorAgent(llm_provider=default_llm)
+        orchestrator = agent_registry.get_orchestrator(default_llm)
 
         # 如果用户没有提供分析内容，则构造一个让模型去搜索的提示
         if not content or not content.strip():
             content = f"请自行搜索关于{commodity_name}的最新市场信息，并进行分析。"
 
-        # 调用 orchestrator 的核心方法
-        results = await orchestrator.comprehensive_analysis(
-            content=content,
-            commodity_name=commodity_name,
-            analysis_types=analysis_types
-        )
-        
-        # 将返回的结果字典格式化为更易读的字符串
-        output_parts = []
-        for key, value in results.items():
-            output_parts.append(f"===== {key.upper()} ANALYSIS =====\n{value}")
+        # 各维度分析 + 综合分析 + 策略设计（及自定义阶段）
+        total = len(orchestrator.get_stage_names(analysis_types))
+
+        # 调用 orchestrator 的流式方法，每完成一项就向客户端推送进度与部分结果
+        results = {}
+        with deadline_scope(_get_deadline_seconds(timeout_seconds)), \
+                tracer.span("tool.comprehensive_analysis", commodity=commodity_name):
+            async with profile_request("comprehensive_analysis", force=profile) as profiling:
+                async for key, value in orchestrator.comprehensive_analysis_stream(
+                    content=content,
+                    commodity_name=commodity_name,
+                    analysis_types=analysis_types
+                ):
+                    results[key] = value
+                    await _report_partial_result(ctx, key, value, len(results), total)
         
-        return "\n\n".join(output_parts)
+        return _format_results(orchestrator, results) + format_profile_note(profiling)
 
     except Exception as e:
         # 捕获所有异常，并返回详细的错误信息，方便调试
@@ -67,11 +117,42 @@ async def comprehensive_analysis(
         return error_details
 
 
+def _format_results(orchestrator, results: Dict[str, str]) -> str:
+    """将结果字典格式化为更易读的字符串（按固定顺序）"""
+    output_parts = []
+    for key in orchestrator.get_result_order():
+        if key not in results:
+            continue
+        output_parts.append(f"===== {key.upper()} ANALYSIS =====\n{results[key]}")
+    return "\n\n".join(output_parts)
+
+
+def _get_deadline_seconds(timeout_seconds: Optional[float]) -> Optional[float]:
+    """本次工具调用的截止时间（秒）：调用方指定优先，否则使用配置的默认值，不大于 0 表示不限制"""
+    if timeout_seconds is not None:
+        return timeout_seconds
+    return config_manager.get('timeouts', 'default_deadline', None)
+
+
+async def _report_partial_result(ctx: Optional[Context], key: str, value: str, done: int, total: int):
+    """通过 MCP 进度通知与日志消息向客户端推送单项分析结果"""
+    if ctx is None:
+        return
+    try:
+        await ctx.report_progress(progress=done, total=total, message=f"{key} 分析完成")
+        await ctx.info(f"===== {key.upper()} ANALYSIS =====\n{value}")
+    except Exception as e:
+        # 推送失败不影响分析本身
+        logger.warning(f"推送部分结果失败: {e}")
+
+
 @mcp.tool()
 async def single_analysis(
     analysis_type: str,
     commodity_name: str,
-    content: str = ""
+    content: str = "",
+    timeout_seconds: Optional[float] = None,
+    profile: bool = False
 ) -> str:
     """
     [分析] 对指定商品进行单一维度的分析。
@@ -80,6 +161,8 @@ async def single_analysis(
         analysis_type: 分析类型，可选值: "basis":基差分析, "macro":宏观分析, "industry":产业基本面分析, "price":价格分析, "factory":工厂分析, "social":社会分析, "strategy_design":策略设计。
         commodity_name: 商品名称，例如：豆粕。
         content: 用于分析的内容。如果为空，Agent将尝试通过网络搜索获取信息。
+        timeout_seconds: 本次调用的截止时间（秒），默认使用配置 [timeouts] default_deadline。
+        profile: 是否对本次调用进行性能剖析，结果保存到 [profiling] output_dir。
     """
     try:
         if not analysis_type or not analysis_type.strip():
@@ -91,28 +174,250 @@ async def single_analysis(
         if analysis_type not in valid_types:
             return f"错误：无效的 'analysis_type'。可选值为: {', '.join(valid_types)}"
 
-        # 从配置中获取默认的LLM提供商来初始化Orchestrator
+        # 从配置中获取默认的LLM提供商，复用进程内共享的Orchestrator
         default_llm = config_manager.get('agents', 'default_llm', 'zhipu')
-        orchestrator = OrchestratorAgent(llm_provider=default_llm)
+        orchestrator = agent_registry.get_orchestrator(default_llm)
 
         # 如果用户没有提供分析内容，则构造一个让模型去搜索的提示
         if not content or not content.strip():
             content = f"请自行搜索关于{commodity_name}的{analysis_type}相关信息，并进行分析。"
 
-        # 调用 orchestrator 的单一分析方法
-        result = await orchestrator.single_analysis(
-            analysis_type=analysis_type,
-            content=content,
-            commodity_name=commodity_name
-        )
+        # 调用 orchestrator 的单一分析方法，超过截止时间即取消
+        with deadline_scope(_get_deadline_seconds(timeout_seconds)), \
+                tracer.span("tool.single_analysis", commodity=commodity_name, analysis_type=analysis_type) as span:
+            try:
+                async with profile_request("single_analysis", force=profile) as profiling, \
+                        asyncio.timeout(remaining()) as scope:
+                    result = await orchestrator.single_analysis(
+                        analysis_type=analysis_type,
+                        content=content,
+                        commodity_name=commodity_name
+                    )
+            except DeadlineExceeded as e:
+                span.set_error(e)
+                return f"错误：{analysis_type} 分析未在截止时间内完成。"
+            except TimeoutError as e:
+                if not scope.expired():
+                    raise
+                span.set_error(e)
+                return f"错误：{analysis_type} 分析未在截止时间内完成。"
         
-        return result
+        return result + format_profile_note(profiling)
 
     except Exception as e:
         error_details = f"单一分析过程中发生错误: {type(e).__name__} - {e}\n--- 详细错误信息 ---\n{traceback.format_exc()}"
         return error_details
 
 
+class BatchItem(BaseModel):
+    """批量分析中的单个商品"""
+    commodity_name: str
+    content: str = ""
+    analysis_types: Optional[List[str]] = None
+
+
+# 进程级批量分析并发上限：(上限, 事件循环, 信号量)，所有批量调用共享
+_batch_semaphore: Optional[Tuple[int, asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+
+def _get_batch_semaphore() -> asyncio.Semaphore:
+    """获取批量分析的全局信号量，[batch] max_concurrency 变化或事件循环变化后重建"""
+    global _batch_semaphore
+    limit = max(1, int(config_manager.get('batch', 'max_concurrency', 4)))
+    loop = asyncio.get_running_loop()
+    if _batch_semaphore is None or _batch_semaphore[0] != limit or _batch_semaphore[1] is not loop:
+        _batch_semaphore = (limit, loop, asyncio.Semaphore(limit))
+    return _batch_semaphore[2]
+
+
+@mcp.tool()
+async def batch_analysis(
+    items: List[BatchItem],
+    timeout_seconds: Optional[float] = None,
+    profile: bool = False,
+    ctx: Optional[Context] = None
+) -> str:
+    """
+    [分析] 批量对多个商品进行全面分析。
+    所有商品共享LLM客户端、限流器与响应缓存，同时进行的商品数受全局并发上限 [batch] max_concurrency 约束；
+    每完成一个商品即推送进度，最终返回各商品的报告与耗时。
+
+    Args:
+        items: 商品列表，每项包含 commodity_name，以及可选的 content 与 analysis_types（默认执行所有类型，
+            可选值同 comprehensive_analysis，含无效值的商品不执行并直接判定失败）。
+        timeout_seconds: 每个商品的截止时间（秒，从该商品开始执行时计），默认使用配置 [timeouts] default_deadline。
+        profile: 是否对整个批量调用进行性能剖析，结果保存到 [profiling] output_dir。
+    """
+    try:
+        if not items:
+            return "错误：'items' 参数不能为空。"
+        names = [item.commodity_name.strip() for item in items]
+        if not all(names):
+            return "错误：每个商品的 'commodity_name' 都不能为空。"
+
+        default_llm = config_manager.get('agents', 'default_llm', 'zhipu')
+        orchestrator = agent_registry.get_orchestrator(default_llm)
+        semaphore = _get_batch_semaphore()
+        batch_started = time.monotonic()
+
+        # 分析类型无效的商品直接判定失败，不占用并发名额与数据预取
+        valid_types = orchestrator.get_supported_analysis_types()
+        rejected: Dict[int, str] = {}
+        for index, item in enumerate(items):
+            invalid = [t for t in (item.analysis_types or []) if t not in valid_types]
+            if invalid:
+                rejected[index] = f"无效的 'analysis_types': {', '.join(invalid)}。可选值为: {', '.join(valid_types)}"
+
+        # 一次批量请求预取全部商品的库存数据，各商品分析时直接命中缓存
+        await data_service.prefetch([name for index, name in enumerate(names) if index not in rejected])
+        done = 0
+
+        async def run_item(index: int, item: BatchItem) -> Dict[str, object]:
+            nonlocal done
+            commodity_name = item.commodity_name.strip()
+            if index in rejected:
+                done += 1
+                return {
+                    'commodity_name': commodity_name,
+                    'report': "",
+                    'error': rejected[index],
+                    'queued_seconds': 0.0,
+                    'elapsed_seconds': 0.0,
+                }
+            content = item.content
+            if not content or not content.strip():
+                content = f"请自行搜索关于{commodity_name}的最新市场信息，并进行分析。"
+            queued_at = time.monotonic()
+            async with semaphore:
+                started = time.monotonic()
+                tracer.record_span("batch.queue_wait", started - queued_at, commodity=commodity_name)
+                try:
+                    with deadline_scope(_get_deadline_seconds(timeout_seconds)):
+                        results = await orchestrator.comprehensive_analysis(
+                            content=content,
+                            commodity_name=commodity_name,
+                            analysis_types=item.analysis_types
+                        )
+                    report, error = _format_results(orchestrator, results), None
+                except Exception as e:
+                    logger.error(f"{commodity_name} 批量分析失败: {e}")
+                    report, error = "", f"{type(e).__name__} - {e}"
+                finished = time.monotonic()
+
+            done += 1
+            if ctx is not None:
+                try:
+                    await ctx.report_progress(progress=done, total=len(items), message=f"{commodity_name} 分析完成")
+                except Exception as e:
+                    logger.warning(f"推送批量进度失败: {e}")
+            return {
+                'commodity_name': commodity_name,
+                'report': report,
+                'error': error,
+                'queued_seconds': started - queued_at,
+                'elapsed_seconds': finished - started,
+            }
+
+        with tracer.span("tool.batch_analysis", items=len(items)):
+            async with profile_request("batch_analysis", force=profile) as profiling:
+                outcomes = await asyncio.gather(*(run_item(index, item) for index, item in enumerate(items)))
+        total_seconds = time.monotonic() - batch_started
+
+        summary = [f"===== BATCH SUMMARY =====\n共 {len(outcomes)} 个商品，总耗时 {total_seconds:.1f}s"]
+        for outcome in outcomes:
+            status = "失败" if outcome['error'] else "完成"
+            summary.append(
+                f"- {outcome['commodity_name']}: {status}，"
+                f"排队 {outcome['queued_seconds']:.1f}s，分析 {outcome['elapsed_seconds']:.1f}s"
+            )
+        output_parts = ["\n".join(summary)]
+        for outcome in outcomes:
+            body = outcome['report'] if not outcome['error'] else f"分析失败: {outcome['error']}"
+            output_parts.append(f"##### {outcome['commodity_name']} #####\n{body}")
+        return "\n\n".join(output_parts) + format_profile_note(profiling)
+
+    except Exception as e:
+        error_details = f"批量分析过程中发生错误: {type(e).__name__} - {e}\n--- 详细错误信息 ---\n{traceback.format_exc()}"
+        return error_details
+
+
+# ==============================================================================
+#  工具类别: [运维]
+# ==============================================================================
+
+@mcp.tool()
+async def cache_stats() -> str:
+    """
+    [运维] 查看LLM响应缓存的命中、未命中与淘汰统计，以及数据服务的缓存与后端调用统计；
+    启用了 cassette 录制/回放时一并给出其统计。
+    """
+    stats = get_response_cache().get_stats()
+    lines = [f"{key}: {value:.2%}" if key == 'hit_rate' else f"{key}: {value}" for key, value in stats.items()]
+    lines.append("[数据服务]")
+    lines.extend(f"{key}: {value}" for key, value in data_service.get_stats().items())
+    cassette = get_cassette()
+    if cassette.mode != CASSETTE_OFF:
+        lines.append("[cassette]")
+        lines.extend(f"{key}: {value}" for key, value in cassette.get_stats().items())
+    return "\n".join(lines)
+
+
+@mcp.tool()
+async def metrics() -> str:
+    """
+    [运维] 以 Prometheus 文本格式输出指标：各阶段（工具调用、编排阶段、Agent调用、Prompt渲染、
+    限流排队、LLM调用与HTTP请求）的耗时直方图、按提供商/Agent累计的Token用量，以及事件循环延迟直方图与阻塞次数。
+    """
+    return tracer.render_prometheus() + loop_watchdog.render_prometheus()
+
+
+@mcp.tool()
+async def trace_export(limit: int = 200, trace_id: Optional[str] = None, path: Optional[str] = None) -> str:
+    """
+    [运维] 以 OpenTelemetry OTLP/JSON 格式导出最近的追踪 span，可直接发送到 OTel Collector 的 /v1/traces。
+
+    Args:
+        limit: 导出最近的 span 数量。
+        trace_id: 只导出指定调用链。
+        path: 写入的文件路径，相对于配置 [tracing] export_dir，为空时直接返回 JSON。
+    """
+    target = None
+    if path:
+        try:
+            target = resolve_export_path(path)
+        except ValueError as e:
+            return f"错误：{e}"
+
+    spans = tracer.get_spans(trace_id=trace_id, limit=limit)
+    payload = json.dumps(tracer.export_otlp(spans), ensure_ascii=False)
+    if target is None:
+        return payload
+
+    def write():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(payload, encoding='utf-8')
+
+    await asyncio.to_thread(write)
+    return f"已导出 {len(spans)} 个 span 到 {target}"
+
+
+@mcp.tool()
+async def provider_health() -> str:
+    """
+    [运维] 查看各LLM提供商的健康状态：熔断器状态、最近延迟与错误率、限流器并发窗口。
+    """
+    health = get_provider_health()
+    if not health:
+        return "尚无LLM调用记录。"
+    lines = []
+    for provider, info in health.items():
+        lines.append(f"[{provider}] 状态: {info['status']}")
+        for section in ('circuit_breaker', 'calls', 'rate_limiter'):
+            details = ", ".join(f"{key}={value}" for key, value in info[section].items())
+            lines.append(f"  {section}: {details}")
+    return "\n".join(lines)
+
+
 # ==============================================================================
 #  启动服务器
 # ==============================================================================
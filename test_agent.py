@@ -12,6 +12,7 @@ from agents import (
     StrategyDesignAgent
 )
 from config.manager import config_manager
+from llm_clients.base_client import BaseLLMClient
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -107,6 +108,9 @@ async def main():
     # 测试主控Agent
     await test_orchestrator()
     
+    # 关闭共享的HTTP连接池
+    await BaseLLMClient.close_all()
+    
     print("\n测试完成！")
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+# test_basis_features.py
+import tempfile
+
+import numpy as np
+
+from analytics.basis_features import BasisFeatureEngine
+from analytics.timeseries_store import TimeSeriesStore
+
+DAYS = np.arange(np.datetime64("2025-01-01"), np.datetime64("2025-03-01"))
+
+
+def _fill_store(root: str) -> TimeSeriesStore:
+    """两个期货合约 + 现货，现货比期货多一个交易日"""
+    store = TimeSeriesStore(root)
+    futures_days = DAYS[:-1]
+    store.append("豆粕", "spot", "price", DAYS, np.linspace(3000, 3100, len(DAYS)))
+    store.append("豆粕", "M2505", "close", futures_days, np.linspace(2900, 2950, len(futures_days)))
+    store.append("豆粕", "M2509", "close", futures_days, np.linspace(2850, 2880, len(futures_days)))
+    return store
+
+
+def test_store_append_and_read_range():
+    """追加后按闭区间读取，skip_existing 丢弃旧日期，关闭时抛出异常"""
+    with tempfile.TemporaryDirectory() as root:
+        store = TimeSeriesStore(root)
+        assert store.append("铜", "spot", "price", DAYS[:10], np.arange(10.0)) == 10
+        # 与已有数据重叠的部分被跳过
+        assert store.append("铜", "spot", "price", DAYS[5:15], np.arange(5.0, 15.0)) == 5
+        try:
+            store.append("铜", "spot", "price", DAYS[:3], np.zeros(3), skip_existing=False)
+            assert False, "旧日期应被拒绝"
+        except ValueError:
+            pass
+
+        dates, values = store.read("铜", "spot", "price", start=DAYS[3], end=DAYS[6])
+        assert list(dates) == list(DAYS[3:7]), dates
+        assert list(values) == [3.0, 4.0, 5.0, 6.0], values
+        dates, _ = store.read("铜", "spot", "price")
+        assert len(dates) == 15
+        latest_dates, latest_values = store.latest("铜", "spot", "price", 2)
+        assert list(latest_dates) == list(DAYS[13:15]) and list(latest_values) == [13.0, 14.0]
+    print("✅ 时间序列存储追加、跳过旧日期与区间读取")
+
+
+def test_store_rejects_mismatched_input():
+    """日期与数值长度不一致或日期未递增时拒绝写入"""
+    with tempfile.TemporaryDirectory() as root:
+        store = TimeSeriesStore(root)
+        for dates, values in ((DAYS[:3], [1.0, 2.0]), (DAYS[[2, 1]], [1.0, 2.0])):
+            try:
+                store.append("铜", "spot", "price", dates, values)
+                assert False, "应抛出 ValueError"
+            except ValueError:
+                pass
+        assert store.list_commodities() == []
+    print("✅ 时间序列存储拒绝非法输入")
+
+
+def test_features_anchor_to_last_futures_date():
+    """现货比期货多出的交易日不应让合约被视为已到期，也不应输出 nan"""
+    with tempfile.TemporaryDirectory() as root:
+        features = BasisFeatureEngine(_fill_store(root), change_window=5).compute("豆粕")
+        assert features is not None
+        assert features.as_of == str(DAYS[-2]), features.as_of
+        assert [c.contract for c in features.contracts] == ["M2505", "M2509"]
+        assert abs(features.contracts[0].basis - (features.spot_price - features.contracts[0].futures_price)) < 1e-9
+        assert features.contracts[0].change is not None
+        assert [(s.near, s.far) for s in features.spreads] == [("M2505", "M2509")]
+        assert features.nearby_basis == features.contracts[0].basis
+        assert "nan" not in features.to_table().lower()
+    print("✅ 基差特征以现货与期货都有报价的最后交易日为基准")
+
+
+def test_features_without_futures():
+    """没有期货数据时返回 None"""
+    with tempfile.TemporaryDirectory() as root:
+        store = TimeSeriesStore(root)
+        store.append("豆粕", "spot", "price", DAYS, np.full(len(DAYS), 3000.0))
+        assert BasisFeatureEngine(store).compute("豆粕") is None
+        assert BasisFeatureEngine(store).compute("铜") is None
+    print("✅ 缺少期货或现货数据时不计算基差特征")
+
+
+if __name__ == "__main__":
+    test_store_append_and_read_range()
+    test_store_rejects_mismatched_input()
+    test_features_anchor_to_last_futures_date()
+    test_features_without_futures()
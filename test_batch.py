@@ -0,0 +1,48 @@
+# test_batch.py
+import asyncio
+
+from fastmcp import Client
+
+import server
+from config.manager import config_manager
+from data_service import data_service
+
+
+def test_invalid_analysis_types_rejected_up_front():
+    """分析类型无效的商品在预取数据与占用并发名额前即被拒绝，不影响其他商品"""
+    provider = config_manager.get('agents', 'default_llm', 'zhipu')
+    # 只需创建客户端，本测试不会发出LLM请求
+    config_manager.set(f"llm_providers.{provider}", 'api_key', 'test-key')
+
+    prefetched = []
+    original_prefetch = data_service.prefetch
+
+    async def record_prefetch(names):
+        prefetched.append(list(names))
+        await original_prefetch(names)
+
+    data_service.prefetch = record_prefetch
+    items = [
+        {"commodity_name": "豆粕", "analysis_types": ["basis", "weather"]},
+        {"commodity_name": "铜", "analysis_types": ["unknown"]},
+    ]
+
+    async def run():
+        async with Client(server.mcp) as client:
+            result = await client.call_tool("batch_analysis", {"items": items})
+        return result.content[0].text
+
+    try:
+        text = asyncio.run(run())
+    finally:
+        data_service.prefetch = original_prefetch
+
+    assert prefetched == [[]], prefetched
+    assert "- 豆粕: 失败" in text and "- 铜: 失败" in text, text
+    assert "无效的 'analysis_types': weather" in text, text
+    assert "无效的 'analysis_types': unknown" in text, text
+    print("✅ 无效的分析类型在执行前被拒绝")
+
+
+if __name__ == "__main__":
+    test_invalid_analysis_types_rejected_up_front()
@@ -0,0 +1,66 @@
+# test_context_compressor.py
+from utils.context_compressor import ContextCompressor
+from utils.token_estimator import estimate_tokens
+
+
+def _report(topic: str, paragraphs: int) -> str:
+    lines = [f"## {topic}分析"]
+    for i in range(paragraphs):
+        lines.append(f"第{i}段：{topic}近期走势平稳，成交量与持仓量变化不大，市场参与者观望情绪较浓，暂无明显方向。")
+    lines.append(f"结论：{topic}短期偏多，关注下游需求与库存变化风险。")
+    return "\n".join(lines)
+
+
+def _kept(text: str) -> str:
+    """去掉压缩说明行，只保留正文"""
+    return text.rsplit("\n（已压缩", 1)[0]
+
+
+def test_section_budget():
+    """超出章节预算时压缩到预算以内，并保留标题与结论"""
+    compressor = ContextCompressor(section_tokens=120, total_tokens=0)
+    text = _report("豆粕", 20)
+    assert estimate_tokens(text) > 120
+    result = compressor.compress({"basis": text})["basis"]
+    assert "已压缩" in result
+    assert estimate_tokens(_kept(result)) <= 120, estimate_tokens(_kept(result))
+    assert "## 豆粕分析" in result and "结论：豆粕短期偏多" in result
+    # 未超出预算的章节原样保留
+    short = _report("铜", 1)
+    assert compressor.compress({"basis": short})["basis"] == short
+    print("✅ 章节压缩到预算以内并保留关键结论")
+
+
+def test_total_budget():
+    """各章节预算之和超过总预算时按比例收缩"""
+    compressor = ContextCompressor(section_tokens=300, total_tokens=300, section_overrides={"macro": 150})
+    sections = {name: _report(topic, 30) for name, topic in (("basis", "豆粕"), ("macro", "宏观"), ("price", "价格"))}
+    result = compressor.compress(sections)
+    assert list(result) == ["basis", "macro", "price"]
+    kept = {name: estimate_tokens(_kept(text)) for name, text in result.items()}
+    assert sum(kept.values()) <= 300, kept
+    # 覆盖预算较小的章节收缩后仍小于其他章节
+    assert kept["macro"] < kept["basis"], kept
+    print("✅ 全部章节不超过总预算")
+
+
+def test_dedupe():
+    """与前面章节相同的章节与重复段落只保留一次"""
+    compressor = ContextCompressor(section_tokens=10000, total_tokens=0)
+    shared = "全球大豆供应宽松，巴西新作丰产预期压制远月价格走势。"
+    result = compressor.compress({
+        "basis": f"基差走强\n{shared}",
+        "inventory": f"库存下降\n{shared}",
+        "copy": f"基差走强\n{shared}",
+    })
+    assert result["basis"].count(shared) == 1
+    assert shared not in result["inventory"] and "库存下降" in result["inventory"]
+    assert "与 basis 部分相同" in result["copy"]
+    assert ContextCompressor(enabled=False).compress({"copy": shared}) == {"copy": shared}
+    print("✅ 重复章节与段落去重")
+
+
+if __name__ == "__main__":
+    test_section_budget()
+    test_total_budget()
+    test_dedupe()
@@ -0,0 +1,226 @@
+# test_llm_reliability.py
+import asyncio
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from pathlib import Path
+
+import aiohttp
+
+from llm_clients.cassette import RECORD, REPLAY, Cassette
+from llm_clients.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from llm_clients.errors import CassetteMissError, CircuitOpenError, LLMAPIError
+from llm_clients.rate_limiter import AdaptiveConcurrencyLimiter, ProviderRateLimiter
+from llm_clients.retry import RetryPolicy, parse_retry_after
+
+
+def test_retryable_classification():
+    """限流、5xx、网络错误与超时可重试，其他 4xx 与普通异常不可重试"""
+    policy = RetryPolicy()
+    for error in (
+        LLMAPIError("限流", "zhipu", 429),
+        LLMAPIError("网关错误", "zhipu", 502),
+        LLMAPIError("请求超时", "zhipu", 408),
+        aiohttp.ClientConnectionError("连接被重置"),
+        asyncio.TimeoutError(),
+    ):
+        assert policy.is_retryable(error), error
+    for error in (
+        LLMAPIError("请求参数错误", "zhipu", 400),
+        LLMAPIError("未授权", "zhipu", 401),
+        LLMAPIError("不存在", "zhipu", 404),
+        ValueError("响应格式错误"),
+    ):
+        assert not policy.is_retryable(error), error
+    assert not RetryPolicy(retryable_statuses=(503,)).is_retryable(LLMAPIError("限流", "zhipu", 429))
+    print("✅ 可重试与不可重试错误分类")
+
+
+def test_parse_retry_after():
+    """Retry-After 支持秒数与 HTTP 日期，过去的时间为 0，无法解析时为 None"""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(" 1.5 ") == 1.5
+    assert parse_retry_after("-2") == 0.0
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= parse_retry_after(later) <= 30, parse_retry_after(later)
+    earlier = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+    assert parse_retry_after(earlier) == 0.0
+    for value in (None, "", "明天再试"):
+        assert parse_retry_after(value) is None, value
+    print("✅ Retry-After 解析")
+
+
+def test_compute_delay():
+    """服务端给出 Retry-After 时以其为准，否则为不超过上限的全抖动退避"""
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    assert policy.compute_delay(1, LLMAPIError("限流", "zhipu", 429, retry_after=7.0)) == 7.0
+    error = LLMAPIError("服务不可用", "zhipu", 503)
+    for attempt, bound in ((1, 0.5), (2, 1.0), (3, 2.0), (10, 2.0)):
+        delays = [policy.compute_delay(attempt, error) for _ in range(200)]
+        assert all(0 <= delay <= bound for delay in delays), (attempt, max(delays))
+    print("✅ 退避延迟遵循 Retry-After 与上限")
+
+
+def _fail(breaker: CircuitBreaker, error: Exception):
+    try:
+        with breaker.guard():
+            raise error
+    except type(error):
+        pass
+
+
+def test_circuit_breaker_transitions():
+    """失败率达到阈值后熔断，冷却后半开放行一个探测请求，探测成功恢复、失败重新熔断"""
+    breaker = CircuitBreaker("breaker_test", window=4, min_calls=4, failure_rate_threshold=0.5, open_seconds=0.05)
+    # 4xx 说明提供商正常响应，不计为失败
+    for _ in range(4):
+        _fail(breaker, LLMAPIError("请求参数错误", "breaker_test", 400))
+    assert breaker.state == CLOSED
+
+    # 窗口内 4 次请求中 2 次 5xx，失败率达到 50% 时熔断
+    _fail(breaker, LLMAPIError("服务不可用", "breaker_test", 503))
+    assert breaker.state == CLOSED
+    _fail(breaker, LLMAPIError("服务不可用", "breaker_test", 503))
+    assert breaker.state == OPEN
+    try:
+        with breaker.guard():
+            assert False, "熔断期间不应执行请求"
+    except CircuitOpenError:
+        pass
+    assert not breaker.is_available()
+
+    # 冷却结束：探测失败后重新熔断
+    time.sleep(0.06)
+    assert breaker.is_available()
+    _fail(breaker, aiohttp.ClientConnectionError("连接被重置"))
+    assert breaker.state == OPEN and breaker.open_count == 2
+
+    # 再次冷却：探测期间只放行一个请求，探测成功后恢复闭合
+    time.sleep(0.06)
+    with breaker.guard():
+        assert breaker.state == HALF_OPEN
+        try:
+            with breaker.guard():
+                assert False, "探测名额已满时不应执行请求"
+        except CircuitOpenError:
+            pass
+    assert breaker.state == CLOSED
+    print("✅ 熔断器闭合、熔断、半开与恢复")
+
+
+def test_aimd_window():
+    """过载时窗口乘性缩减（同一轮拥塞只缩减一次），成功时加性恢复"""
+    limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=2, maximum=10)
+    admitted_before = time.monotonic()
+    assert limiter.on_overload(admitted_before)
+    assert limiter.window == 4.0
+    # 缩减之前发出的请求带回的过载信号不再缩减
+    assert not limiter.on_overload(admitted_before)
+    assert limiter.window == 4.0
+    limiter.on_overload(time.monotonic())
+    limiter.on_overload(time.monotonic())
+    assert limiter.window == 2.0, limiter.window
+
+    # 每次成功窗口加 1/窗口，即每完成约一个窗口的请求加 1，且不超过上限
+    for _ in range(2):
+        limiter.on_success()
+    assert abs(limiter.window - (2 + 1 / 2 + 1 / 2.5)) < 1e-9, limiter.window
+    for _ in range(500):
+        limiter.on_success()
+    assert limiter.window == 10.0
+
+    # 限流器只对 429/503 缩减，网络错误（无状态码）与 4xx 不调整
+    provider = ProviderRateLimiter("aimd_test", initial_concurrency=8)
+    provider.record_result(None)
+    provider.record_result(400)
+    assert provider.concurrency.window == 8.0
+    provider.record_result(429)
+    assert provider.concurrency.window == 4.0 and provider.overload_count == 1
+    print("✅ AIMD 并发窗口缩减与恢复")
+
+
+def test_aimd_window_limits_in_flight():
+    """并发名额受窗口限制，释放后唤醒排队的请求"""
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter(initial=2, minimum=1, maximum=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done() and limiter.in_flight == 2
+        await limiter.release()
+        await asyncio.wait_for(waiter, 1.0)
+        return limiter.in_flight
+
+    assert asyncio.run(run()) == 2
+    print("✅ 并发窗口限制同时进行的请求")
+
+
+def test_cassette_round_trip():
+    """录制的非流式、流式与错误响应按请求哈希回放，不再调用真实请求"""
+    async def run(path: str):
+        payload = {"messages": [{"role": "user", "content": "分析时间 2025-01-01 09:00:00 豆粕"}]}
+        recorder = Cassette(mode=RECORD, path=path)
+
+        async def send():
+            return {"choices": [{"message": {"content": "偏多"}}]}
+
+        async def send_stream():
+            for text in ("偏", "多"):
+                yield {"delta": text}
+
+        async def send_error():
+            raise LLMAPIError("限流", "zhipu", 429, retry_after=2.0)
+
+        assert await recorder.post_json("zhipu", "/chat", payload, send) == await send()
+        assert [e async for e in recorder.post_stream("zhipu", "/chat/stream", payload, send_stream)] == [
+            {"delta": "偏"}, {"delta": "多"}
+        ]
+        try:
+            await recorder.post_json("zhipu", "/error", payload, send_error)
+        except LLMAPIError:
+            pass
+        assert recorder.get_stats()['recorded'] == 3
+
+        player = Cassette(mode=REPLAY, path=path, latency="zero")
+
+        async def live():
+            raise AssertionError("回放模式不应发出真实请求")
+
+        def live_stream():
+            raise AssertionError("回放模式不应发出真实请求")
+
+        # 分析时间不同的同一请求应命中录制记录
+        replay_payload = {"messages": [{"role": "user", "content": "分析时间 2025-06-30 15:30:00 豆粕"}]}
+        assert await player.post_json("zhipu", "/chat", replay_payload, live) == await send()
+        assert [e async for e in player.post_stream("zhipu", "/chat/stream", replay_payload, live_stream)] == [
+            {"delta": "偏"}, {"delta": "多"}
+        ]
+        try:
+            await player.post_json("zhipu", "/error", replay_payload, live)
+            assert False, "应回放录制的错误"
+        except LLMAPIError as e:
+            assert e.status == 429 and e.retry_after == 2.0
+        try:
+            await player.post_json("zhipu", "/chat", {"messages": []}, live)
+            assert False, "未录制的请求应报错"
+        except CassetteMissError:
+            pass
+        return player.get_stats(), player.summarize()
+
+    with tempfile.TemporaryDirectory() as root:
+        stats, summary = asyncio.run(run(str(Path(root) / "round_trip.jsonl.gz")))
+    assert stats['replayed'] == 3 and stats['replayed_errors'] == 1 and stats['misses'] == 1, stats
+    assert summary['zhipu']['calls'] == 3 and summary['zhipu']['stream_calls'] == 1, summary
+    print("✅ cassette 录制后回放")
+
+
+if __name__ == "__main__":
+    test_retryable_classification()
+    test_parse_retry_after()
+    test_compute_delay()
+    test_circuit_breaker_transitions()
+    test_aimd_window()
+    test_aimd_window_limits_in_flight()
+    test_cassette_round_trip()
@@ -0,0 +1,84 @@
+# test_response_cache.py
+import asyncio
+
+from agents.factory_inventory_analysis_agent import FactoryInventoryAnalysisAgent
+from config.manager import config_manager
+from llm_clients.response_cache import get_response_cache
+
+
+class FakeLLMClient:
+    """记录调用次数的假客户端"""
+
+    model = "fake-model"
+    temperature = 0.7
+    max_tokens = 1024
+
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, messages, model=None, search_whitelist=None):
+        self.calls += 1
+        return f"分析结果 {self.calls}"
+
+
+def _make_agent(client: FakeLLMClient) -> FactoryInventoryAnalysisAgent:
+    # 跳过 BaseAgent.__init__，避免依赖真实提供商的 API_KEY
+    agent = FactoryInventoryAnalysisAgent.__new__(FactoryInventoryAnalysisAgent)
+    agent.llm_provider = "fake"
+    agent.llm_client = client
+    return agent
+
+
+def _use_memory_cache():
+    config_manager.set('cache', 'enabled', True)
+    config_manager.set('cache', 'disk_enabled', False)
+
+
+def test_hit_across_analysis_time():
+    """Prompt 中嵌入了精确到秒的分析时间，相隔数秒的相同请求仍应命中缓存"""
+    _use_memory_cache()
+    client = FakeLLMClient()
+    agent = _make_agent(client)
+
+    async def run():
+        first = await agent.analyze("测试数据", "豆粕")
+        await asyncio.sleep(1.1)
+        second = await agent.analyze("测试数据", "豆粕")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert client.calls == 1, client.calls
+    assert first == second, (first, second)
+    assert get_response_cache().get_stats()['memory_hits'] >= 1
+    print("✅ 分析时间不同的相同请求命中响应缓存")
+
+
+def test_different_content_misses():
+    """时间以外的内容不同时不应命中"""
+    _use_memory_cache()
+    cache = get_response_cache()
+    key = lambda text: cache.make_key("p", "m", 0.7, 1024, None, [{"role": "user", "content": text}])
+    assert key("时间 2025-01-01 09:00:00 豆粕") == key("时间 2025-01-02 10:30:59 豆粕")
+    assert key("时间 2025-01-01 09:00:00 豆粕") != key("时间 2025-01-01 09:00:00 铜")
+    print("✅ 缓存键只忽略时间戳")
+
+
+def test_rebuild_on_config_change():
+    """[cache] 配置变化后重建缓存，其他配置变化时保留已缓存内容"""
+    _use_memory_cache()
+    cache = get_response_cache()
+    config_manager.set('timeouts', 'unrelated_test_key', 1)
+    assert get_response_cache() is cache
+    config_manager.set('cache', 'default_ttl', 7)
+    rebuilt = get_response_cache()
+    assert rebuilt is not cache
+    assert rebuilt.default_ttl == 7
+    config_manager.set('cache', 'enabled', False)
+    assert get_response_cache().enabled is False
+    print("✅ [cache] 配置变化后重建响应缓存")
+
+
+if __name__ == "__main__":
+    test_hit_across_analysis_time()
+    test_different_content_misses()
+    test_rebuild_on_config_change()
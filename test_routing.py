@@ -0,0 +1,69 @@
+# test_routing.py
+import asyncio
+
+import aiohttp
+
+from llm_clients.errors import CircuitOpenError, LLMAPIError
+from llm_clients.routing_client import RoutingClient
+from llm_clients.zhipu_client import ZhipuClient
+from utils.deadline import DeadlineExceeded
+
+
+class StubClient(ZhipuClient):
+    """按设定抛出错误或返回固定回复的提供商客户端"""
+
+    def __init__(self, provider: str, error: Exception = None):
+        super().__init__(api_key="test", base_url="http://localhost", model="stub", provider=provider)
+        self.error = error
+        self.calls = 0
+
+    async def chat(self, messages, model=None, search_whitelist=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return f"{self.provider} ok"
+
+
+def _route(first_error: Exception):
+    """固定路由到 first（失败时最多切换一次到 second），返回 (结果或异常, first, second)"""
+    first = StubClient("route_test_a", first_error)
+    second = StubClient("route_test_b")
+    router = RoutingClient({"route_test_a": first, "route_test_b": second}, pinned_provider="route_test_a")
+    try:
+        result = asyncio.run(router.chat([{"role": "user", "content": "hi"}]))
+    except Exception as e:
+        result = e
+    return result, first, second
+
+
+def test_failover_on_retryable_errors():
+    """限流、5xx、熔断与网络错误切换到下一个提供商"""
+    for error in (
+        LLMAPIError("限流", "route_test_a", 429),
+        LLMAPIError("服务不可用", "route_test_a", 503),
+        CircuitOpenError("route_test_a", 10.0),
+        aiohttp.ClientConnectionError("连接被重置"),
+    ):
+        result, first, second = _route(error)
+        assert result == "route_test_b ok", (error, result)
+        assert second.calls == 1
+    print("✅ 可重试错误、熔断与网络错误时切换提供商")
+
+
+def test_no_failover_on_request_errors():
+    """不可重试的 4xx、截止时间到达与其他错误直接抛出，不再调用其他提供商"""
+    for error in (
+        LLMAPIError("请求参数错误", "route_test_a", 400),
+        LLMAPIError("未授权", "route_test_a", 401),
+        DeadlineExceeded("截止时间已到"),
+        ValueError("响应格式错误"),
+    ):
+        result, first, second = _route(error)
+        assert result is error, (error, result)
+        assert second.calls == 0, error
+    print("✅ 不可重试的 4xx、截止时间到达与其他错误时不切换提供商")
+
+
+if __name__ == "__main__":
+    test_failover_on_retryable_errors()
+    test_no_failover_on_request_errors()
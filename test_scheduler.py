@@ -0,0 +1,83 @@
+# test_scheduler.py
+import asyncio
+from contextlib import aclosing
+
+from agents.scheduler import StageGraph, StageScheduler
+from utils.deadline import DeadlineExceeded, deadline_scope
+
+
+async def _run_pipeline(deadline: float, reserve: float, stage_seconds: float):
+    """两个维度阶段 + 依赖它们的综合阶段，返回 {阶段: 结果}"""
+    async def leaf(inputs):
+        await asyncio.sleep(stage_seconds)
+        return "ok"
+
+    async def synthesis(inputs):
+        return ",".join(
+            "missing" if isinstance(value, BaseException) else value
+            for _, value in sorted(inputs.items())
+        )
+
+    graph = StageGraph()
+    graph.add_stage("basis", leaf, reserve=reserve)
+    graph.add_stage("macro", leaf, reserve=reserve)
+    graph.add_stage("comprehensive", synthesis, ["basis", "macro"])
+
+    results = {}
+    with deadline_scope(deadline):
+        async for name, result in StageScheduler().run_iter(graph):
+            results[name] = result
+    return results
+
+
+def test_deadline_below_reserve():
+    """截止时间短于预留时间时，维度阶段仍应有时间完成（回归：曾得到 0s 超时）"""
+    results = asyncio.run(_run_pipeline(deadline=1.0, reserve=90.0, stage_seconds=0.05))
+    assert results["basis"] == "ok", results
+    assert results["macro"] == "ok", results
+    assert results["comprehensive"] == "ok,ok", results
+    print("✅ 截止时间短于预留时间时维度阶段正常完成")
+
+
+def test_reserve_still_limits_slow_stages():
+    """预留仍然生效：维度阶段超出（截止时间 - 预留）后被取消，综合阶段照常运行"""
+    results = asyncio.run(_run_pipeline(deadline=1.0, reserve=90.0, stage_seconds=5.0))
+    assert isinstance(results["basis"], DeadlineExceeded), results
+    assert results["comprehensive"] == "missing,missing", results
+    print("✅ 慢阶段在预留时间前被取消，综合阶段基于缺失结果运行")
+
+
+def test_early_stop_waits_for_cancelled_stages():
+    """调用方提前停止迭代时，仍在运行的阶段应在生成器关闭前完成取消清理"""
+    cleaned = []
+
+    async def fast(inputs):
+        return "ok"
+
+    async def slow(inputs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            # 模拟释放限流槽位等需要等待的清理
+            await asyncio.sleep(0.05)
+            cleaned.append("slow")
+            raise
+
+    async def run():
+        graph = StageGraph()
+        graph.add_stage("fast", fast)
+        graph.add_stage("slow", slow)
+        async with aclosing(StageScheduler().run_iter(graph)) as stages:
+            async for name, _ in stages:
+                assert name == "fast"
+                break
+        return list(cleaned)
+
+    assert asyncio.run(run()) == ["slow"]
+    print("✅ 提前停止迭代时等待被取消的阶段退出")
+
+
+if __name__ == "__main__":
+    test_deadline_below_reserve()
+    test_reserve_still_limits_slow_stages()
+    test_early_stop_waits_for_cancelled_stages()
@@ -0,0 +1,57 @@
+# test_tracing.py
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from fastmcp import Client
+
+import server
+from config.manager import config_manager
+from utils.tracing import resolve_export_path
+
+
+def _use_export_dir() -> Path:
+    export_dir = Path(tempfile.mkdtemp())
+    config_manager.set('tracing', 'export_dir', str(export_dir))
+    return export_dir.resolve()
+
+
+def test_resolve_export_path():
+    """导出路径只能落在导出目录内"""
+    export_dir = _use_export_dir()
+    assert resolve_export_path("a/trace.json") == export_dir / "a" / "trace.json"
+    outside = export_dir.parent / "outside"
+    outside.mkdir(exist_ok=True)
+    os.symlink(outside, export_dir / "link")
+    for path in ("../escape.json", "a/../../escape.json", str(export_dir / "abs.json"), "/etc/passwd", "link/x.json", "."):
+        try:
+            resolve_export_path(path)
+        except ValueError:
+            continue
+        raise AssertionError(f"应拒绝导出路径: {path}")
+    print("✅ 导出路径限制在导出目录内")
+
+
+def test_trace_export_tool():
+    """trace_export 工具写入导出目录，拒绝目录外的路径且不创建任何文件"""
+    export_dir = _use_export_dir()
+
+    async def run():
+        async with Client(server.mcp) as client:
+            ok = await client.call_tool("trace_export", {"path": "out/trace.json"})
+            rejected = await client.call_tool("trace_export", {"path": "../../escape/trace.json"})
+        return ok.content[0].text, rejected.content[0].text
+
+    ok, rejected = asyncio.run(run())
+    assert (export_dir / "out" / "trace.json").exists(), ok
+    json.loads((export_dir / "out" / "trace.json").read_text(encoding='utf-8'))
+    assert rejected.startswith("错误"), rejected
+    assert not (export_dir.parent.parent / "escape").exists()
+    print("✅ trace_export 拒绝导出目录外的路径")
+
+
+if __name__ == "__main__":
+    test_resolve_export_path()
+    test_trace_export_tool()
@@ -3,14 +3,35 @@ from .prompt_loader import (
     prompt_loader,
     get_prompt,
     format_prompt,
+    build_messages,
     reload_prompts,
     list_prompts
 )
+from .token_estimator import estimate_tokens, estimate_messages_tokens
+from .context_compressor import ContextCompressor, compress_sections
+from .deadline import DeadlineExceeded, deadline_scope, remaining, check_deadline
+from .tracing import Span, Tracer, tracer, current_span
+from .loop_watchdog import LoopWatchdog, loop_watchdog
 
 __all__ = [
     'prompt_loader',
     'get_prompt',
     'format_prompt',
+    'build_messages',
     'reload_prompts',
-    'list_prompts'
+    'list_prompts',
+    'estimate_tokens',
+    'estimate_messages_tokens',
+    'ContextCompressor',
+    'compress_sections',
+    'DeadlineExceeded',
+    'deadline_scope',
+    'remaining',
+    'check_deadline',
+    'Span',
+    'Tracer',
+    'tracer',
+    'current_span',
+    'LoopWatchdog',
+    'loop_watchdog'
 ]
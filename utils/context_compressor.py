@@ -0,0 +1,201 @@
+# utils/context_compressor.py
+"""
+上下文压缩
+在综合分析与策略设计之前压缩各维度的分析报告：
+- 去重：与前面章节完全相同的章节、重复出现的段落只保留一次
+- 抽取：超出章节Token预算时，优先保留标题、结论/建议/风险等关键句，再按原文顺序补足
+- 预算：每个章节有独立预算，全部章节之和不超过总预算（按比例收缩）
+Token数使用本地估算（见 utils.token_estimator），不调用模型
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from config.manager import config_manager
+from .token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 含有这些词的行视为关键结论，压缩时优先保留
+DEFAULT_KEY_MARKERS = (
+    "结论", "总结", "综上", "建议", "观点", "判断", "预计", "预期", "风险",
+    "策略", "看涨", "看跌", "偏多", "偏空", "震荡", "核心", "关键", "主要",
+)
+
+# 参与跨章节去重的段落最短长度（字符），过短的行（如“无”）不去重
+MIN_DEDUPE_LENGTH = 20
+
+_HEADING_PATTERN = re.compile(r'^\s*(#{1,6}\s|\*\*[^*]+\*\*\s*[:：]?\s*$|[一二三四五六七八九十]+[、.．])')
+_LIST_PATTERN = re.compile(r'^\s*([-*•]|\d+[.)、．])\s')
+_NORMALIZE_PATTERN = re.compile(r'[\s*#>`_\-•]+')
+
+
+def _normalize(text: str) -> str:
+    """去除空白与Markdown标记，用于判断重复"""
+    return _NORMALIZE_PATTERN.sub('', text)
+
+
+class ContextCompressor:
+    """按章节Token预算压缩多份分析报告"""
+
+    def __init__(
+        self,
+        section_tokens: int = 1200,
+        total_tokens: int = 6000,
+        section_overrides: Optional[Dict[str, int]] = None,
+        key_markers: Tuple[str, ...] = DEFAULT_KEY_MARKERS,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            section_tokens: 每个章节的默认Token预算
+            total_tokens: 全部章节的Token总预算，0 表示不限制
+            section_overrides: 按章节名称覆盖的预算，如 {'price': 800}
+            key_markers: 关键结论标记词
+            enabled: 是否启用，关闭时原样返回
+        """
+        self.section_tokens = section_tokens
+        self.total_tokens = total_tokens
+        self.section_overrides = dict(section_overrides or {})
+        self.key_markers = tuple(key_markers)
+        self.enabled = enabled
+
+    @classmethod
+    def from_config(cls) -> "ContextCompressor":
+        """根据 settings.toml 的 [compression] 节创建压缩器"""
+        options = config_manager.get('compression', default={})
+        return cls(
+            section_tokens=options.get('section_tokens', 1200),
+            total_tokens=options.get('total_tokens', 6000),
+            section_overrides=options.get('sections', {}),
+            key_markers=tuple(options.get('key_markers', DEFAULT_KEY_MARKERS)),
+            enabled=options.get('enabled', True),
+        )
+
+    def compress(self, sections: Dict[str, str]) -> Dict[str, str]:
+        """
+        压缩一组章节
+
+        Args:
+            sections: {章节名称: 文本}，顺序即优先级（去重时保留先出现的内容）
+
+        Returns:
+            压缩后的 {章节名称: 文本}，键与顺序不变
+        """
+        if not self.enabled or not sections:
+            return dict(sections)
+
+        original_tokens = sum(estimate_tokens(text) for text in sections.values())
+        deduped = self._dedupe(sections)
+        budgets = self._allocate_budgets(deduped)
+        compressed = {
+            name: self.compress_section(text, budgets[name])
+            for name, text in deduped.items()
+        }
+
+        compressed_tokens = sum(estimate_tokens(text) for text in compressed.values())
+        if compressed_tokens < original_tokens:
+            logger.info(f"上下文压缩: {original_tokens} -> {compressed_tokens} tokens（{len(sections)} 个章节）")
+        return compressed
+
+    def _dedupe(self, sections: Dict[str, str]) -> Dict[str, str]:
+        """去掉与前面章节完全相同的章节，以及已在前面出现过的段落"""
+        seen_sections: Dict[str, str] = {}
+        seen_lines = set()
+        result = {}
+        for name, text in sections.items():
+            key = _normalize(text)
+            if key and key in seen_sections:
+                result[name] = f"（内容与 {seen_sections[key]} 部分相同，已省略）"
+                continue
+            seen_sections.setdefault(key, name)
+
+            kept_lines = []
+            for line in text.splitlines():
+                line_key = _normalize(line)
+                if len(line_key) >= MIN_DEDUPE_LENGTH:
+                    if line_key in seen_lines:
+                        continue
+                    seen_lines.add(line_key)
+                kept_lines.append(line)
+            result[name] = "\n".join(kept_lines)
+        return result
+
+    def _allocate_budgets(self, sections: Dict[str, str]) -> Dict[str, int]:
+        """确定每个章节的预算：章节预算与实际长度取较小者，合计超过总预算时按比例收缩"""
+        budgets = {
+            name: min(self.section_overrides.get(name, self.section_tokens), estimate_tokens(text))
+            for name, text in sections.items()
+        }
+        total = sum(budgets.values())
+        if self.total_tokens and total > self.total_tokens:
+            ratio = self.total_tokens / total
+            budgets = {name: max(1, int(budget * ratio)) for name, budget in budgets.items()}
+        return budgets
+
+    def _line_priority(self, line: str) -> int:
+        """行的保留优先级：标题 > 关键结论 > 列表项 > 普通文本"""
+        if _HEADING_PATTERN.match(line):
+            return 3
+        if any(marker in line for marker in self.key_markers):
+            return 2
+        if _LIST_PATTERN.match(line):
+            return 1
+        return 0
+
+    def compress_section(self, text: str, budget: int) -> str:
+        """
+        将单个章节压缩到预算以内
+
+        按优先级从高到低、同优先级按原文顺序选择行，输出时恢复原文顺序；
+        单行就超出剩余预算时截断该行。
+
+        Args:
+            text: 章节文本
+            budget: Token预算
+
+        Returns:
+            压缩后的文本，发生压缩时末尾附带说明
+        """
+        total_tokens = estimate_tokens(text)
+        if total_tokens <= budget:
+            return text
+
+        lines = [line for line in text.splitlines() if line.strip()]
+        ranked: List[Tuple[int, int, str]] = sorted(
+            ((-self._line_priority(line), index, line) for index, line in enumerate(lines)),
+        )
+
+        selected: Dict[int, str] = {}
+        used = 0
+        for _, index, line in ranked:
+            cost = estimate_tokens(line) + 1
+            if used + cost <= budget:
+                selected[index] = line
+                used += cost
+            elif budget - used > 20:
+                selected[index] = self._truncate(line, budget - used - 1)
+                used = budget
+            if used >= budget:
+                break
+
+        kept = "\n".join(selected[index] for index in sorted(selected))
+        return f"{kept}\n（已压缩：原文约 {total_tokens} tokens，保留关键结论约 {estimate_tokens(kept)} tokens）"
+
+    @staticmethod
+    def _truncate(line: str, budget: int) -> str:
+        """按Token预算截断单行（二分查找最长的前缀）"""
+        low, high = 0, len(line)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(line[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return line[:low] + "…"
+
+
+def compress_sections(sections: Dict[str, str]) -> Dict[str, str]:
+    """使用当前配置压缩一组章节（便捷函数）"""
+    return ContextCompressor.from_config().compress(sections)
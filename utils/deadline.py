@@ -0,0 +1,76 @@
+# utils/deadline.py
+"""
+请求截止时间
+通过 contextvars 在一次工具调用内向下传递截止时间（time.monotonic 时钟），
+调度器的各阶段与每次 HTTP 请求据此计算剩余时间；新建的任务会自动继承创建时的截止时间
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """截止时间已到，或阶段超出了时间预算"""
+
+
+def get_deadline() -> Optional[float]:
+    """获取当前截止时间（time.monotonic），未设置时为 None"""
+    return _deadline.get()
+
+
+def remaining(reserve: float = 0.0) -> Optional[float]:
+    """
+    距离截止时间的剩余秒数
+
+    Args:
+        reserve: 需要预留给后续步骤的秒数，从剩余时间中扣除
+
+    Returns:
+        剩余秒数（不小于 0），未设置截止时间时为 None
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - reserve - time.monotonic())
+
+
+def check_deadline(what: str = "请求"):
+    """
+    截止时间已到时抛出异常
+
+    Raises:
+        DeadlineExceeded: 截止时间已到
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"{what}已超过截止时间")
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    在当前上下文中设置 seconds 秒后的截止时间，不会晚于外层已有的截止时间
+
+    Args:
+        seconds: 时间预算（秒），为 None 或不大于 0 时沿用外层截止时间
+
+    Yields:
+        生效的截止时间（time.monotonic），没有截止时间时为 None
+    """
+    current = _deadline.get()
+    if not seconds or seconds <= 0:
+        yield current
+        return
+
+    deadline = time.monotonic() + seconds
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
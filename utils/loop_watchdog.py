@@ -0,0 +1,193 @@
+# utils/loop_watchdog.py
+"""
+事件循环阻塞监控
+服务是单线程事件循环，任何同步阻塞（time.sleep、同步文件/配置读取、大 JSON 解析）都会让所有并发分析停顿。
+
+- 心跳协程每隔 interval 秒醒来一次，实际醒来时间与预期的差值即事件循环延迟，计入直方图
+- 监控线程检查心跳，事件循环超过 threshold 秒没有响应时，抓取事件循环线程当前的调用栈
+  （即正在阻塞的协程）写入日志；每次阻塞只记录一次
+
+延迟直方图与阻塞次数随 metrics 工具以 Prometheus 文本格式输出。
+"""
+
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+from config.manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶上界（秒）
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LoopWatchdog:
+    """事件循环延迟监控"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.5, stack_limit: int = 30):
+        """
+        Args:
+            interval: 心跳间隔（秒）
+            threshold: 事件循环无响应超过该秒数时记录阻塞调用栈
+            stack_limit: 日志中保留的最内层栈帧数
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        # 最近一次心跳的时间（time.monotonic），由心跳协程写、监控线程读
+        self._last_beat = 0.0
+        self._reported_beat: Optional[float] = None
+
+        self._buckets = [0] * len(LAG_BUCKETS)
+        self.samples = 0
+        self.lag_sum = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.last_stall: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_config(cls) -> "LoopWatchdog":
+        """根据 settings.toml 的 [watchdog] 节创建实例"""
+        options = config_manager.get('watchdog', default={}) or {}
+        return cls(
+            interval=options.get('interval', 0.1),
+            threshold=options.get('threshold', 0.5),
+            stack_limit=options.get('stack_limit', 30),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """在当前事件循环中启动心跳协程与监控线程（已在运行时忽略）"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._reported_beat = None
+        self._stop_event.clear()
+        self._task = self._loop.create_task(self._heartbeat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"事件循环监控已启动: 心跳间隔 {self.interval}s，阻塞阈值 {self.threshold}s")
+
+    async def stop(self):
+        """停止心跳协程与监控线程"""
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            self._observe(lag)
+            if lag >= self.threshold:
+                logger.warning(f"事件循环延迟 {lag:.3f}s（阈值 {self.threshold}s）")
+
+    def _observe(self, lag: float):
+        self.samples += 1
+        self.lag_sum += lag
+        self.max_lag = max(self.max_lag, lag)
+        for i, bound in enumerate(LAG_BUCKETS):
+            if lag <= bound:
+                self._buckets[i] += 1
+
+    def _watch(self):
+        """监控线程：心跳超时说明事件循环正被阻塞，抓取此刻的调用栈"""
+        check_interval = min(self.interval, self.threshold) / 2
+        while not self._stop_event.wait(check_interval):
+            last_beat = self._last_beat
+            blocked = time.monotonic() - last_beat - self.interval
+            if blocked < self.threshold or self._reported_beat == last_beat:
+                continue
+            self._reported_beat = last_beat
+            self._report_stall(blocked)
+
+    def _report_stall(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        coroutine = _innermost_coroutine(frame)
+        stack = "".join(traceback.format_stack(frame)[-self.stack_limit:])
+        del frame
+        self.stalls += 1
+        self.last_stall = {
+            'at': time.time(),
+            'blocked': round(blocked, 3),
+            'coroutine': coroutine,
+            'stack': stack,
+        }
+        logger.warning(
+            f"事件循环已阻塞 {blocked:.2f}s，阻塞协程: {coroutine or '未知（不在协程中）'}\n"
+            f"--- 事件循环线程调用栈 ---\n{stack}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取延迟与阻塞统计"""
+        return {
+            'running': self.running,
+            'samples': self.samples,
+            'mean_lag': round(self.lag_sum / self.samples, 6) if self.samples else 0.0,
+            'max_lag': round(self.max_lag, 6),
+            'stalls': self.stalls,
+            'last_stall_coroutine': (self.last_stall or {}).get('coroutine'),
+        }
+
+    def render_prometheus(self, prefix: str = "commodity") -> str:
+        """以 Prometheus 文本格式输出延迟直方图、最大延迟与阻塞次数"""
+        lines = [
+            f"# HELP {prefix}_event_loop_lag_seconds 事件循环心跳延迟",
+            f"# TYPE {prefix}_event_loop_lag_seconds histogram",
+        ]
+        for bound, value in zip(LAG_BUCKETS, list(self._buckets)):
+            lines.append(f'{prefix}_event_loop_lag_seconds_bucket{{le="{bound}"}} {value}')
+        lines.append(f'{prefix}_event_loop_lag_seconds_bucket{{le="+Inf"}} {self.samples}')
+        lines.append(f"{prefix}_event_loop_lag_seconds_sum {self.lag_sum:.6f}")
+        lines.append(f"{prefix}_event_loop_lag_seconds_count {self.samples}")
+        lines.append(f"# HELP {prefix}_event_loop_max_lag_seconds 事件循环最大延迟")
+        lines.append(f"# TYPE {prefix}_event_loop_max_lag_seconds gauge")
+        lines.append(f"{prefix}_event_loop_max_lag_seconds {self.max_lag:.6f}")
+        lines.append(f"# HELP {prefix}_event_loop_stalls_total 超过阈值的事件循环阻塞次数")
+        lines.append(f"# TYPE {prefix}_event_loop_stalls_total counter")
+        lines.append(f"{prefix}_event_loop_stalls_total {self.stalls}")
+        return "\n".join(lines) + "\n"
+
+
+def _innermost_coroutine(frame) -> Optional[str]:
+    """从当前执行位置向外找到第一个协程函数的栈帧"""
+    while frame is not None:
+        code = frame.f_code
+        if code.co_flags & (inspect.CO_COROUTINE | inspect.CO_ASYNC_GENERATOR):
+            return f"{code.co_qualname} ({code.co_filename}:{frame.f_lineno})"
+        frame = frame.f_back
+    return None
+
+
+# 全局事件循环监控
+loop_watchdog = LoopWatchdog.from_config()
@@ -0,0 +1,319 @@
+# utils/profiling.py
+"""
+按请求的性能剖析
+用于定位一次慢请求的时间花在了哪里（事件循环上的计算、JSON 解析、Prompt 格式化还是等待网络）。
+
+- sampling 模式：共享的后台线程定期采样事件循环线程的调用栈（[loop]），
+  并请求事件循环在空闲时记录属于该请求的各个 asyncio 任务当前等待的协程链（[await]，
+  任务集合与协程帧只能在事件循环线程上安全读取），输出 collapsed-stack 格式，
+  可直接用 flamegraph.pl / speedscope 查看
+- pstats 模式：在请求期间启用 cProfile，输出 .pstats 文件
+
+通过 [profiling] enabled 或工具调用的 profile 参数开启；配置了 slow_threshold 时，
+所有请求都以低开销的采样模式运行，耗时超过阈值的请求自动保存结果。
+注意事件循环线程由所有并发请求共享，无法判断某一时刻的计算属于哪个请求：
+同一事件循环上有多个请求在剖析时不记录 [loop] 采样（计入 loop_samples_skipped），只保留 [await]。
+"""
+
+import asyncio
+import cProfile
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from config.manager import config_manager
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+MODE_SAMPLING = "sampling"
+MODE_PSTATS = "pstats"
+
+# 当前请求的剖析 ID，新建的任务自动继承，采样时据此找出属于该请求的任务
+_request_id: ContextVar[Optional[str]] = ContextVar('profiling_request_id', default=None)
+
+
+def _describe_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+def _thread_stack(frame) -> List[str]:
+    """线程调用栈，从最外层到当前执行位置"""
+    stack = []
+    while frame is not None:
+        stack.append(_describe_frame(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(task: asyncio.Task) -> List[str]:
+    """任务的协程等待链，从任务入口到最内层正在等待的对象"""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'ag_frame', None) \
+            or getattr(awaitable, 'gi_frame', None)
+        if frame is None:
+            # 链的末端：Future、Task 等非协程对象
+            stack.append(f"<{type(awaitable).__name__}>")
+            break
+        stack.append(_describe_frame(frame))
+        awaitable = getattr(awaitable, 'cr_await', None) or getattr(awaitable, 'ag_await', None) \
+            or getattr(awaitable, 'gi_yieldfrom', None)
+    return stack
+
+
+class ProfileSession:
+    """一次请求的剖析会话"""
+
+    def __init__(self, name: str, request_id: str, mode: str, forced: bool, loop: asyncio.AbstractEventLoop):
+        self.name = name
+        self.request_id = request_id
+        self.mode = mode
+        # 是否显式开启（配置或调用参数），否则只在超过慢请求阈值时保存
+        self.forced = forced
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        # 多个请求同时剖析、无法归属而跳过的 [loop] 采样数
+        self.loop_samples_skipped = 0
+        self.profiler: Optional[cProfile.Profile] = None
+        self.paths: List[str] = []
+
+    def sample_loop(self, frames: Dict[int, object], exclusive: bool):
+        """
+        记录一次事件循环线程调用栈采样（在采样线程中调用）
+
+        Args:
+            frames: sys._current_frames() 的结果
+            exclusive: 该事件循环上是否只有本会话在剖析，否则采样无法归属，只计数
+        """
+        self.sample_count += 1
+        if not exclusive:
+            self.loop_samples_skipped += 1
+            return
+        frame = frames.get(self.thread_id)
+        if frame is not None:
+            self.samples["[loop];" + ";".join(_thread_stack(frame))] += 1
+
+    def sample_task(self, task: asyncio.Task):
+        """记录本请求一个任务的协程等待链（在事件循环线程中调用）"""
+        self.samples["[await];" + ";".join(_await_stack(task))] += 1
+
+    def collapsed(self) -> str:
+        """collapsed-stack 文本：每行 "栈;帧;帧 次数" """
+        # 采样线程与事件循环线程都会写入 samples，先复制一份
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.copy().most_common())
+
+    def top_frames(self, limit: int = 5) -> List[str]:
+        """事件循环线程上自身采样最多的函数"""
+        leaves: Counter = Counter()
+        for stack, count in self.samples.copy().items():
+            if stack.startswith("[loop];"):
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        return [f"{frame} x{count}" for frame, count in leaves.most_common(limit)]
+
+
+class SamplingProfiler:
+    """所有活动会话共享的采样线程，没有活动会话时退出"""
+
+    def __init__(self):
+        self._sessions: List[ProfileSession] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # 已提交、尚未在事件循环上执行的任务快照，每个事件循环同时最多一个
+        self._pending_snapshots: Set[asyncio.AbstractEventLoop] = set()
+        self.interval = 0.005
+
+    def register(self, session: ProfileSession, interval: float):
+        with self._lock:
+            self._sessions.append(session)
+            self.interval = interval
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, session: ProfileSession):
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            by_loop: Dict[asyncio.AbstractEventLoop, List[ProfileSession]] = {}
+            for session in sessions:
+                by_loop.setdefault(session.loop, []).append(session)
+
+            frames = sys._current_frames()
+            for loop, group in by_loop.items():
+                for session in group:
+                    try:
+                        session.sample_loop(frames, exclusive=len(group) == 1)
+                    except Exception as e:
+                        logger.debug(f"采样失败: {e}")
+                self._request_task_snapshot(loop)
+            del frames
+            time.sleep(self.interval)
+
+    def _request_task_snapshot(self, loop: asyncio.AbstractEventLoop):
+        """请求事件循环在空闲时记录任务等待链；上一次请求尚未执行（事件循环繁忙）时跳过"""
+        with self._lock:
+            if loop in self._pending_snapshots:
+                return
+            self._pending_snapshots.add(loop)
+        try:
+            loop.call_soon_threadsafe(self._snapshot_tasks, loop)
+        except RuntimeError:
+            # 事件循环已关闭
+            with self._lock:
+                self._pending_snapshots.discard(loop)
+
+    def _snapshot_tasks(self, loop: asyncio.AbstractEventLoop):
+        """在事件循环线程中执行：把各任务的协程等待链计入其所属请求的会话"""
+        with self._lock:
+            self._pending_snapshots.discard(loop)
+            sessions = {s.request_id: s for s in self._sessions if s.loop is loop}
+        if not sessions:
+            return
+        for task in asyncio.all_tasks(loop):
+            session = sessions.get(task.get_context().get(_request_id))
+            if session is None or task.done():
+                continue
+            try:
+                session.sample_task(task)
+            except Exception as e:
+                logger.debug(f"采样失败: {e}")
+
+
+_sampler = SamplingProfiler()
+
+
+def _get_options() -> Dict[str, object]:
+    options = config_manager.get('profiling', default={}) or {}
+    return {
+        'enabled': options.get('enabled', False),
+        'mode': options.get('mode', MODE_SAMPLING),
+        'interval': float(options.get('interval', 0.005)),
+        'slow_threshold': float(options.get('slow_threshold', 0.0)),
+        'output_dir': options.get('output_dir', ".cache/profiles"),
+        'max_files': int(options.get('max_files', 200)),
+    }
+
+
+@asynccontextmanager
+async def profile_request(name: str, force: bool = False) -> AsyncIterator[Optional[ProfileSession]]:
+    """
+    对一次请求进行剖析，结束后按需写入 output_dir
+
+    文件名为 "时间_名称_请求ID"，请求ID 优先使用当前追踪 span 的 trace_id，便于与 trace_export 对照。
+
+    Args:
+        name: 请求名称（如工具名）
+        force: 是否强制剖析（工具调用的 profile 参数）
+
+    Yields:
+        剖析会话；未开启剖析且未配置慢请求阈值时为 None
+    """
+    options = _get_options()
+    forced = force or bool(options['enabled'])
+    threshold = options['slow_threshold']
+    if not forced and threshold <= 0:
+        yield None
+        return
+
+    span = current_span()
+    request_id = span.trace_id if span is not None else uuid.uuid4().hex
+    # 慢请求自动捕获总是使用低开销的采样模式
+    mode = options['mode'] if forced else MODE_SAMPLING
+    session = ProfileSession(name, request_id, mode, forced, asyncio.get_running_loop())
+
+    if mode == MODE_PSTATS:
+        session.profiler = cProfile.Profile()
+        try:
+            session.profiler.enable()
+        except ValueError as e:
+            # 同一线程上已有其他请求在使用 cProfile
+            logger.warning(f"无法启用 cProfile（{e}），改用采样模式")
+            session.profiler = None
+            session.mode = MODE_SAMPLING
+    if session.profiler is None:
+        _sampler.register(session, options['interval'])
+
+    token = _request_id.set(request_id)
+    try:
+        yield session
+    finally:
+        try:
+            _request_id.reset(token)
+        except ValueError:
+            pass
+        if session.profiler is not None:
+            session.profiler.disable()
+        else:
+            _sampler.unregister(session)
+        session.elapsed = time.perf_counter() - session.started
+
+        slow = threshold > 0 and session.elapsed >= threshold
+        if forced or slow:
+            try:
+                await asyncio.to_thread(_save, session, options['output_dir'], options['max_files'])
+            except Exception as e:
+                logger.error(f"保存性能剖析结果失败: {e}")
+            if slow:
+                logger.warning(
+                    f"慢请求 {name} 耗时 {session.elapsed:.2f}s（阈值 {threshold:.1f}s），"
+                    f"已保存性能剖析: {', '.join(session.paths)}；热点: {'; '.join(session.top_frames())}"
+                )
+            if span is not None:
+                span.set('profile', ", ".join(session.paths))
+
+
+def _save(session: ProfileSession, output_dir: str, max_files: int):
+    """写入剖析结果，并按修改时间删除超出数量上限的旧文件"""
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}_{session.name}_{session.request_id[:16]}"
+    if session.profiler is not None:
+        path = directory / f"{stem}.pstats"
+        session.profiler.dump_stats(str(path))
+    else:
+        path = directory / f"{stem}.collapsed"
+        path.write_text(session.collapsed(), encoding='utf-8')
+    session.paths.append(str(path))
+
+    if max_files > 0:
+        files = sorted(
+            (p for p in directory.iterdir() if p.suffix in ('.pstats', '.collapsed')),
+            key=lambda p: p.stat().st_mtime
+        )
+        for old in files[:-max_files]:
+            old.unlink(missing_ok=True)
+
+
+def format_profile_note(session: Optional[ProfileSession]) -> str:
+    """工具输出末尾附加的剖析结果说明，没有保存结果时为空字符串"""
+    if session is None or not session.paths:
+        return ""
+    return (
+        f"\n\n===== PROFILE =====\n请求ID: {session.request_id}，耗时 {session.elapsed:.2f}s，"
+        f"模式: {session.mode}，采样 {session.sample_count} 次"
+        + (f"（其中 {session.loop_samples_skipped} 次因并发请求未记录 [loop]）" if session.loop_samples_skipped else "")
+        + f"\n结果: {', '.join(session.paths)}"
+    )
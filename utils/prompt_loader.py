@@ -1,10 +1,139 @@
 # utils/prompt_loader.py
+import asyncio
 import os
-from typing import Dict
+import string
+import threading
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
 import logging
 
+from config.manager import config_manager
+from .tracing import tracer
+
 logger = logging.getLogger(__name__)
 
+_formatter = string.Formatter()
+
+# 模板中分隔系统前缀与用户输入的标记行
+USER_MARKER = "<<<USER>>>"
+
+
+class PromptTemplate:
+    """
+    预编译的Prompt模板
+
+    加载时用 string.Formatter 解析一次，得到字面量与占位符片段，
+    格式化时直接拼接，不再重复解析模板文本。
+
+    模板中单独一行的 USER_MARKER 将其分为两部分：之前为不含占位符的系统前缀
+    （各次调用完全相同，可命中提供商的前缀缓存），之后为含占位符的用户输入。
+    没有分隔行的模板整体作为用户输入。
+    """
+
+    def __init__(self, name: str, text: str, mtime: float = 0.0, size: int = 0):
+        """
+        Args:
+            name: Prompt名称
+            text: 模板内容（str.format 语法）
+            mtime: 文件修改时间，用于增量重载
+            size: 文件大小，用于增量重载
+
+        Raises:
+            ValueError: 模板语法错误（如未闭合的花括号），或系统前缀中含有占位符
+        """
+        self.name = name
+        self.text = text
+        self.mtime = mtime
+        self.size = size
+
+        system_text, user_text = '', text
+        lines = text.split('\n')
+        for i, line in enumerate(lines):
+            if line.strip() == USER_MARKER:
+                system_text = '\n'.join(lines[:i]).strip()
+                user_text = '\n'.join(lines[i + 1:]).strip()
+                break
+
+        # [(字面量, 占位符名称, 转换标记, 格式说明)]，占位符名称为 None 表示只有字面量
+        self._parts: List[Tuple[str, Optional[str], Optional[str], str]] = []
+        fields = set()
+        try:
+            system_parts = list(_formatter.parse(system_text))
+            system_fields = [field for _, field, _, _ in system_parts if field is not None]
+            if system_fields:
+                raise ValueError(f"系统前缀中不能包含占位符: {', '.join('{' + f + '}' for f in system_fields)}")
+            # 系统前缀中的 {{ }} 同样按转义处理
+            self.system = ''.join(literal for literal, _, _, _ in system_parts)
+
+            for literal, field_name, format_spec, conversion in _formatter.parse(user_text):
+                if field_name is not None:
+                    if field_name == '' or field_name.isdigit():
+                        raise ValueError(f"不支持位置参数占位符: {{{field_name}}}")
+                    if format_spec and '{' in format_spec:
+                        raise ValueError(f"不支持嵌套占位符: {{{field_name}:{format_spec}}}")
+                    fields.add(self._root_name(field_name))
+                self._parts.append((literal, field_name, conversion, format_spec or ''))
+        except ValueError as e:
+            raise ValueError(f"Prompt模板 {name} 解析失败: {e}") from e
+        self.fields: FrozenSet[str] = frozenset(fields)
+
+    @staticmethod
+    def _root_name(field_name: str) -> str:
+        """占位符的参数名（去掉属性访问与下标，如 data.total -> data）"""
+        for i, char in enumerate(field_name):
+            if char in '.[':
+                return field_name[:i]
+        return field_name
+
+    def render_user(self, kwargs: Dict[str, Any]) -> str:
+        """
+        用参数填充用户输入部分
+
+        Raises:
+            ValueError: 缺少参数或格式化失败
+        """
+        missing = self.fields.difference(kwargs)
+        if missing:
+            raise ValueError(f"格式化prompt失败，缺少参数: {', '.join(sorted(missing))}")
+
+        chunks: List[str] = []
+        try:
+            for literal, field_name, conversion, format_spec in self._parts:
+                chunks.append(literal)
+                if field_name is None:
+                    continue
+                if field_name in kwargs:
+                    value = kwargs[field_name]
+                else:
+                    value, _ = _formatter.get_field(field_name, (), kwargs)
+                if conversion:
+                    value = _formatter.convert_field(value, conversion)
+                chunks.append(format(value, format_spec))
+        except Exception as e:
+            raise ValueError(f"格式化prompt失败: {e}")
+        return ''.join(chunks)
+
+    def render(self, kwargs: Dict[str, Any]) -> str:
+        """
+        用参数填充模板，返回系统前缀与用户输入拼接成的完整文本
+
+        Raises:
+            ValueError: 缺少参数或格式化失败
+        """
+        user = self.render_user(kwargs)
+        return f"{self.system}\n\n{user}" if self.system else user
+
+    def render_messages(self, kwargs: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        用参数填充模板，返回对话消息：系统前缀为 system 消息，用户输入为 user 消息
+
+        Raises:
+            ValueError: 缺少参数或格式化失败
+        """
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        messages.append({"role": "user", "content": self.render_user(kwargs)})
+        return messages
+
+
 class PromptLoader:
     """Prompt加载器，统一管理所有Prompt文件"""
     
@@ -16,30 +145,117 @@ class PromptLoader:
             prompt_dir: Prompt文件所在目录
         """
         self.prompt_dir = prompt_dir
-        self._prompts: Dict[str, str] = {}
+        # 重载时整体替换为新字典，读取方始终看到完整的一份
+        self._prompts: Dict[str, PromptTemplate] = {}
+        # 调用方声明会传入的参数：{Prompt名称: 参数集合}
+        self._requirements: Dict[str, FrozenSet[str]] = {}
+        self._reload_lock = threading.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
         self.load_all_prompts()
     
-    def load_all_prompts(self):
-        """加载所有prompt文件"""
+    def load_all_prompts(self) -> List[str]:
+        """
+        加载所有prompt文件（只重新解析修改过的文件）
+
+        Returns:
+            新增或发生变化的Prompt名称列表
+        """
         if not os.path.exists(self.prompt_dir):
             raise FileNotFoundError(f"Prompt目录不存在: {self.prompt_dir}")
         
-        loaded_count = 0
-        for filename in os.listdir(self.prompt_dir):
-            if filename.endswith('.txt'):
-                prompt_name = filename[:-4]  # 去掉.txt后缀
-                filepath = os.path.join(self.prompt_dir, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        self._prompts[prompt_name] = f.read().strip()
-                        loaded_count += 1
-                        logger.debug(f"已加载Prompt: {prompt_name}")
-                except Exception as e:
-                    logger.error(f"加载Prompt文件失败 {filepath}: {e}")
+        current = self._prompts
+        prompts: Dict[str, PromptTemplate] = {}
+        changed: List[str] = []
+        for filename in sorted(os.listdir(self.prompt_dir)):
+            if not filename.endswith('.txt'):
+                continue
+            prompt_name = filename[:-4]  # 去掉.txt后缀
+            filepath = os.path.join(self.prompt_dir, filename)
+            stat = os.stat(filepath)
+            existing = current.get(prompt_name)
+            if existing and existing.mtime == stat.st_mtime and existing.size == stat.st_size:
+                prompts[prompt_name] = existing
+                continue
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    template = PromptTemplate(prompt_name, f.read().strip(), stat.st_mtime, stat.st_size)
+                self._check_requirements(template)
+            except Exception as e:
+                logger.error(f"加载Prompt文件失败 {filepath}: {e}")
+                if not current:
                     raise
-        
-        logger.info(f"成功加载 {loaded_count} 个Prompt文件")
+                # 重载时保留旧版本（新文件则跳过），避免把有问题的模板替换上线
+                if existing is not None:
+                    prompts[prompt_name] = existing
+                continue
+            prompts[prompt_name] = template
+            changed.append(prompt_name)
+            logger.debug(f"已加载Prompt: {prompt_name}（占位符: {', '.join(sorted(template.fields))}）")
+
+        removed = set(current) - set(prompts)
+        self._prompts = prompts
+        if removed:
+            logger.info(f"已移除Prompt: {', '.join(sorted(removed))}")
+        logger.info(f"成功加载 {len(prompts)} 个Prompt文件，其中 {len(changed)} 个新增或更新")
+        return changed
+
+    def _check_requirements(self, template: PromptTemplate):
+        """检查模板占位符是否都能由调用方提供"""
+        provided = self._requirements.get(template.name)
+        if provided is None:
+            return
+        missing = template.fields - provided
+        if missing:
+            raise ValueError(
+                f"Prompt {template.name} 使用了调用方未提供的占位符: {', '.join(sorted(missing))}"
+            )
+
+    def require(self, name: str, args: Iterable[str]):
+        """
+        声明调用方格式化某个Prompt时会传入的参数，供 validate() 与重载时检查
+
+        Args:
+            name: Prompt名称
+            args: 参数名称
+        """
+        self._requirements[name] = frozenset(args)
+
+    def validate(self) -> List[str]:
+        """
+        检查所有已声明的Prompt：文件存在，且占位符都在声明的参数中
+
+        Returns:
+            问题列表，为空表示全部通过
+        """
+        problems = []
+        prompts = self._prompts
+        for name, provided in sorted(self._requirements.items()):
+            template = prompts.get(name)
+            if template is None:
+                problems.append(f"Prompt未找到: {name}")
+                continue
+            missing = template.fields - provided
+            if missing:
+                problems.append(f"Prompt {name} 缺少参数: {', '.join(sorted(missing))}")
+            unused = provided - template.fields
+            if unused:
+                logger.debug(f"Prompt {name} 未使用参数: {', '.join(sorted(unused))}")
+        return problems
     
+    def get_template(self, name: str) -> PromptTemplate:
+        """
+        获取编译后的Prompt模板
+
+        Raises:
+            ValueError: 如果Prompt未找到
+        """
+        prompts = self._prompts
+        template = prompts.get(name)
+        if template is None:
+            available_prompts = ', '.join(prompts.keys())
+            raise ValueError(f"Prompt未找到: {name}。可用的Prompt: {available_prompts}")
+        return template
+
     def get_prompt(self, name: str) -> str:
         """
         获取指定的prompt
@@ -53,10 +269,7 @@ class PromptLoader:
         Raises:
             ValueError: 如果Prompt未找到
         """
-        if name not in self._prompts:
-            available_prompts = ', '.join(self._prompts.keys())
-            raise ValueError(f"Prompt未找到: {name}。可用的Prompt: {available_prompts}")
-        return self._prompts[name]
+        return self.get_template(name).text
     
     def format_prompt(self, name: str, **kwargs) -> str:
         """
@@ -72,21 +285,81 @@ class PromptLoader:
         Raises:
             ValueError: 如果格式化失败
         """
-        prompt = self.get_prompt(name)
-        
+        return self.get_template(name).render(kwargs)
+
+    def build_messages(self, name: str, **kwargs) -> List[Dict[str, str]]:
+        """
+        格式化prompt并拆分为对话消息
+
+        静态说明放在 system 消息、变量放在其后的 user 消息，使每次调用的请求前缀完全相同，
+        便于提供商复用已缓存的前缀（上下文缓存）。
+
+        Args:
+            name: Prompt名称
+            **kwargs: 格式化参数
+
+        Returns:
+            [{"role": "system", ...}, {"role": "user", ...}]，模板没有系统前缀时只有 user 消息
+
+        Raises:
+            ValueError: 如果格式化失败
+        """
+        with tracer.span("prompt.render", prompt=name):
+            return self.get_template(name).render_messages(kwargs)
+
+    def start_auto_reload(self):
+        """
+        按 [prompts] auto_reload_interval 启动后台重载任务（0 表示关闭，已在运行时忽略）
+
+        文件检查与解析在线程中执行，不占用事件循环，也不在格式化Prompt的请求路径上进行。
+        """
+        interval = config_manager.get('prompts', 'auto_reload_interval', 0)
+        if not interval or (self._reload_task is not None and not self._reload_task.done()):
+            return
+        self._reload_task = asyncio.get_running_loop().create_task(
+            self._auto_reload(interval), name="prompt-auto-reload"
+        )
+        logger.info(f"Prompt自动重载已启动: 每 {interval}s 检查一次")
+
+    async def stop_auto_reload(self):
+        """停止后台重载任务"""
+        if self._reload_task is None:
+            return
+        self._reload_task.cancel()
         try:
-            return prompt.format(**kwargs)
-        except KeyError as e:
-            raise ValueError(f"格式化prompt失败，缺少参数: {e}")
+            await self._reload_task
+        except asyncio.CancelledError:
+            pass
+        self._reload_task = None
+
+    async def _auto_reload(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self._reload_if_idle)
+
+    def _reload_if_idle(self):
+        """检查文件变化；已有其他重载在进行时跳过本次"""
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self.load_all_prompts()
         except Exception as e:
-            raise ValueError(f"格式化prompt失败: {e}")
+            logger.error(f"自动重载Prompt失败，继续使用当前版本: {e}")
+        finally:
+            self._reload_lock.release()
     
-    def reload(self):
-        """重新加载所有Prompt"""
+    def reload(self) -> List[str]:
+        """
+        重新加载Prompt（增量：只重新解析修改过的文件，完成后整体替换）
+
+        Returns:
+            新增或发生变化的Prompt名称列表
+        """
         logger.info("重新加载Prompt...")
-        self._prompts.clear()
-        self.load_all_prompts()
+        with self._reload_lock:
+            changed = self.load_all_prompts()
         logger.info("Prompt重新加载完成")
+        return changed
     
     def list_prompts(self) -> list:
         """获取所有可用的Prompt名称列表"""
@@ -102,14 +375,17 @@ class PromptLoader:
         Returns:
             包含Prompt信息的字典
         """
-        if name not in self._prompts:
+        template = self._prompts.get(name)
+        if template is None:
             raise ValueError(f"Prompt未找到: {name}")
         
-        content = self._prompts[name]
+        content = template.text
         return {
             "name": name,
             "length": len(content),
             "lines": content.count('\n') + 1,
+            "placeholders": sorted(template.fields),
+            "system_length": len(template.system),
             "preview": content[:100] + "..." if len(content) > 100 else content
         }
 
@@ -122,7 +398,11 @@ except Exception as e:
     logger.error(f"全局Prompt加载器初始化失败: {e}")
     # 创建一个空的加载器以避免程序崩溃
     prompt_loader = PromptLoader.__new__(PromptLoader)
+    prompt_loader.prompt_dir = "prompts"
     prompt_loader._prompts = {}
+    prompt_loader._requirements = {}
+    prompt_loader._reload_lock = threading.Lock()
+    prompt_loader._reload_task = None
     logger.warning("使用空的Prompt加载器，请检查Prompt文件")
 
 
@@ -137,9 +417,14 @@ def format_prompt(name: str, **kwargs) -> str:
     return prompt_loader.format_prompt(name, **kwargs)
 
 
-def reload_prompts():
-    """便捷函数：重新加载Prompt"""
-    prompt_loader.reload()
+def build_messages(name: str, **kwargs) -> List[Dict[str, str]]:
+    """便捷函数：格式化Prompt并拆分为 system/user 消息"""
+    return prompt_loader.build_messages(name, **kwargs)
+
+
+def reload_prompts() -> List[str]:
+    """便捷函数：重新加载Prompt，返回发生变化的Prompt名称"""
+    return prompt_loader.reload()
 
 
 def list_prompts() -> list:
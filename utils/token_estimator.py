@@ -0,0 +1,46 @@
+# utils/token_estimator.py
+"""
+本地Token估算
+不依赖具体模型的分词器，按字符类别粗略估算：中日韩字符约 1 字符/Token，
+其他字符（英文、数字、标点、空白）约 4 字符/Token。用于限流配额与上下文预算，
+误差在 ±20% 左右，足以满足这些场景。
+"""
+
+import re
+from typing import Dict, List
+
+# 中日韩统一表意文字、日文假名、韩文音节及全角标点
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+# 每条消息的固定开销（角色标记等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的Token数
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        估算的Token数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    估算对话消息列表的Token数
+
+    Args:
+        messages: 对话消息，格式为 [{"role": "user", "content": "..."}, ...]
+
+    Returns:
+        估算的Token数
+    """
+    return sum(estimate_tokens(msg.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
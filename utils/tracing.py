@@ -0,0 +1,428 @@
+# utils/tracing.py
+"""
+调用链追踪与指标
+以 contextvars 在一次工具调用内传递当前 span，记录各阶段（工具调用、编排阶段、Agent 调用、
+Prompt 渲染、限流排队、LLM 调用与每次 HTTP 尝试）的耗时、状态、提供商与Token用量。
+
+已结束的 span 保存在内存环形缓冲区中，可导出为 OpenTelemetry 的 OTLP/JSON 格式；
+同时按 span 名称、提供商、Agent 与状态聚合耗时直方图与Token计数，输出 Prometheus 文本格式。
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+# 耗时直方图的桶上界（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 指标标签：span 名称、提供商、Agent 类型、状态
+METRIC_LABELS = ('name', 'provider', 'agent', 'status')
+
+# Token 用量在 span 属性中的键
+TOKEN_KEYS = ('prompt_tokens', 'completion_tokens', 'cached_tokens')
+
+
+class Span:
+    """一个追踪片段"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent', 'start_ns', 'end_ns', '_started', 'attributes', 'status', 'status_message')
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._started = time.perf_counter()
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    @property
+    def duration(self) -> float:
+        """耗时（秒），未结束时为已经过的时间"""
+        if self.end_ns is None:
+            return time.perf_counter() - self._started
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, key: str, value: Any):
+        """设置属性"""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        """批量设置属性"""
+        self.attributes.update(attributes)
+
+    def set_error(self, error: BaseException):
+        """将 span 标记为失败"""
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+        self.attributes['error.type'] = type(error).__name__
+        status = getattr(error, 'status', None)
+        if isinstance(status, int):
+            self.attributes['http.status_code'] = status
+
+    def add_tokens(self, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0):
+        """累加 Token 用量"""
+        for key, value in zip(TOKEN_KEYS, (prompt_tokens, completion_tokens, cached_tokens)):
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def lookup(self, key: str, default: Any = None) -> Any:
+        """从自身或最近的祖先 span 中查找属性"""
+        span: Optional[Span] = self
+        while span is not None:
+            if key in span.attributes:
+                return span.attributes[key]
+            span = span.parent
+        return default
+
+    def end(self):
+        self.end_ns = self.start_ns + int((time.perf_counter() - self._started) * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为便于查看的字典"""
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent is not None else None,
+            'start_ns': self.start_ns,
+            'duration': round(self.duration, 6),
+            'status': self.status,
+            'status_message': self.status_message,
+            'attributes': dict(self.attributes),
+        }
+
+
+class _NoopSpan(Span):
+    """追踪关闭时使用的空 span，所有修改均被忽略"""
+
+    def __init__(self):
+        super().__init__("noop")
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes: Any):
+        pass
+
+    def set_error(self, error: BaseException):
+        pass
+
+    def add_tokens(self, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+def current_span() -> Optional[Span]:
+    """获取当前 span，不在任何 span 内时为 None"""
+    return _current_span.get()
+
+
+class _DurationHistogram:
+    """一组标签下的耗时直方图"""
+
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class Tracer:
+    """进程内的追踪器：保存最近的 span 并聚合指标"""
+
+    def __init__(self, enabled: bool = True, max_spans: int = 5000, service_name: str = "commodity-analysis-server"):
+        """
+        Args:
+            enabled: 是否记录 span（关闭时 span() 返回空 span，不产生开销）
+            max_spans: 内存中保留的已结束 span 数上限
+            service_name: 导出时的 service.name
+        """
+        self.enabled = enabled
+        self.service_name = service_name
+        self._spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._durations: Dict[Tuple[str, ...], _DurationHistogram] = defaultdict(_DurationHistogram)
+        # {(provider, agent): [prompt, completion, cached]}
+        self._tokens: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0, 0])
+        self._config_version: Optional[int] = None
+
+    def _sync_config(self):
+        """配置版本变化时重新读取 [tracing] 节"""
+        version = config_manager.version
+        if version == self._config_version:
+            return
+        self._config_version = version
+        self.enabled = config_manager.get('tracing', 'enabled', True)
+        self.service_name = config_manager.get('tracing', 'service_name', self.service_name)
+        max_spans = config_manager.get('tracing', 'max_spans', self._spans.maxlen)
+        if max_spans != self._spans.maxlen:
+            with self._lock:
+                self._spans = deque(self._spans, maxlen=max_spans)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        在当前 span 下开启子 span，退出时结束；代码块抛出异常时 span 标记为失败
+
+        Args:
+            name: span 名称，如 "agent.chat"、"llm.http"
+            **attributes: 初始属性
+
+        Yields:
+            新的 span（追踪关闭时为空 span）
+        """
+        self._sync_config()
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # 异步生成器在其他上下文中被关闭时无法恢复，当前上下文不受影响
+                pass
+            self._finish(span)
+
+    def record_span(self, name: str, duration: float, **attributes: Any):
+        """
+        记录一个已经结束的子 span（如限流排队），结束时间为当前时刻
+
+        Args:
+            name: span 名称
+            duration: 耗时（秒）
+            **attributes: 属性
+        """
+        self._sync_config()
+        if not self.enabled:
+            return
+        span = Span(name, _current_span.get(), attributes)
+        span.end_ns = span.start_ns
+        span.start_ns -= int(duration * 1e9)
+        self._finish(span, ended=True)
+
+    def add_tokens(self, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0, provider: str = ""):
+        """
+        将 Token 用量计入当前 span 与按提供商/Agent 的累计指标
+
+        Args:
+            prompt_tokens: 输入Token数
+            completion_tokens: 输出Token数
+            cached_tokens: 输入中命中提供商前缀缓存的Token数
+            provider: 提供商，为空时从当前 span 中查找
+        """
+        self._sync_config()
+        if not self.enabled:
+            return
+        span = _current_span.get()
+        agent = ""
+        if span is not None:
+            span.add_tokens(prompt_tokens, completion_tokens, cached_tokens)
+            provider = provider or span.lookup('provider', "")
+            agent = span.lookup('agent', "")
+        with self._lock:
+            totals = self._tokens[(provider, agent)]
+            totals[0] += prompt_tokens
+            totals[1] += completion_tokens
+            totals[2] += cached_tokens
+
+    def _finish(self, span: Span, ended: bool = False):
+        if not ended:
+            span.end()
+        labels = (
+            span.name,
+            str(span.lookup('provider', "")),
+            str(span.lookup('agent', "")),
+            span.status,
+        )
+        with self._lock:
+            self._spans.append(span)
+            self._durations[labels].observe(span.duration)
+
+    def get_spans(self, trace_id: Optional[str] = None, limit: Optional[int] = None) -> List[Span]:
+        """
+        获取已结束的 span（按结束先后）
+
+        Args:
+            trace_id: 只返回指定调用链的 span
+            limit: 只返回最近的若干个
+
+        Returns:
+            span 列表
+        """
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        if limit is not None:
+            spans = spans[-limit:] if limit > 0 else []
+        return spans
+
+    def export_otlp(self, spans: Optional[List[Span]] = None) -> Dict[str, Any]:
+        """
+        导出为 OTLP/JSON（ExportTraceServiceRequest），可直接 POST 到 OpenTelemetry Collector 的 /v1/traces
+
+        Args:
+            spans: 要导出的 span，默认导出内存中的全部
+
+        Returns:
+            OTLP/JSON 字典
+        """
+        spans = self.get_spans() if spans is None else spans
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [_otlp_span(span) for span in spans],
+                }],
+            }]
+        }
+
+    def render_prometheus(self, prefix: str = "commodity") -> str:
+        """
+        以 Prometheus 文本格式输出指标
+
+        - {prefix}_span_duration_seconds：各类 span 的耗时直方图
+        - {prefix}_llm_tokens_total：按提供商/Agent/类型（prompt/completion/cached）累计的Token数
+
+        Returns:
+            Prometheus 文本格式的指标
+        """
+        with self._lock:
+            durations = {labels: (list(h.buckets), h.count, h.sum) for labels, h in self._durations.items()}
+            tokens = {key: list(values) for key, values in self._tokens.items()}
+
+        lines = [
+            f"# HELP {prefix}_span_duration_seconds 各阶段 span 的耗时",
+            f"# TYPE {prefix}_span_duration_seconds histogram",
+        ]
+        for labels, (buckets, count, total) in sorted(durations.items()):
+            base = _format_labels(dict(zip(METRIC_LABELS, labels)))
+            for bound, value in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'{prefix}_span_duration_seconds_bucket{{{base},le="{bound}"}} {value}')
+            lines.append(f'{prefix}_span_duration_seconds_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f"{prefix}_span_duration_seconds_sum{{{base}}} {total:.6f}")
+            lines.append(f"{prefix}_span_duration_seconds_count{{{base}}} {count}")
+
+        lines.append(f"# HELP {prefix}_llm_tokens_total 提供商返回的Token用量")
+        lines.append(f"# TYPE {prefix}_llm_tokens_total counter")
+        for (provider, agent), values in sorted(tokens.items()):
+            for kind, value in zip(('prompt', 'completion', 'cached'), values):
+                base = _format_labels({'provider': provider, 'agent': agent, 'kind': kind})
+                lines.append(f"{prefix}_llm_tokens_total{{{base}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """清空已记录的 span 与指标"""
+        with self._lock:
+            self._spans.clear()
+            self._durations.clear()
+            self._tokens.clear()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # OTLP/JSON 中 64 位整数以字符串表示
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otlp_value(v) for v in value]}}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    return {'key': key, 'value': _otlp_value(value)}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    item = {
+        'traceId': span.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': 1,  # SPAN_KIND_INTERNAL
+        'startTimeUnixNano': str(span.start_ns),
+        'endTimeUnixNano': str(span.end_ns or span.start_ns),
+        'attributes': [_otlp_attribute(k, v) for k, v in span.attributes.items() if v is not None],
+        # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+        'status': {'code': 2, 'message': span.status_message} if span.status == STATUS_ERROR else {'code': 1},
+    }
+    if span.parent is not None:
+        item['parentSpanId'] = span.parent.span_id
+    return item
+
+
+def resolve_export_path(path: str) -> Path:
+    """
+    将导出文件路径解析到 [tracing] export_dir 目录下
+
+    Args:
+        path: 相对于导出目录的文件路径
+
+    Returns:
+        解析后的绝对路径
+
+    Raises:
+        ValueError: 路径为绝对路径，或（包括经由符号链接）指向导出目录之外
+    """
+    export_dir = Path(config_manager.get('tracing', 'export_dir', ".cache/traces")).resolve()
+    if Path(path).is_absolute():
+        raise ValueError(f"导出路径必须是相对于 {export_dir} 的相对路径: {path}")
+    target = (export_dir / path).resolve()
+    if target == export_dir or not target.is_relative_to(export_dir):
+        raise ValueError(f"导出路径不能超出导出目录 {export_dir}: {path}")
+    return target
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    return ",".join(parts)
+
+
+# 全局追踪器
+tracer = Tracer()
+
+
+def span(name: str, **attributes: Any):
+    """便捷函数：在当前 span 下开启子 span"""
+    return tracer.span(name, **attributes)